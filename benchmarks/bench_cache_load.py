@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""Compares ResultCache load times with and without strict schema validation.
+
+Usage:
+    python benchmarks/bench_cache_load.py [ENTRIES]
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from decronym.result import ResultCache
+
+
+def make_cache(path, entries):
+    data = {
+        f"k{i}": [
+            {
+                "acronym": f"K{i}",
+                "full": f"Key number {i}",
+                "comment": "Generated for benchmarking",
+                "source": "benchmark",
+                "tags": ["bench", "generated"],
+            }
+        ]
+        for i in range(entries)
+    }
+    with open(path, "w") as f:
+        json.dump(data, f)
+
+
+def timed_load(path, strict):
+    start = time.perf_counter()
+    ResultCache(path, strict=strict)
+    return time.perf_counter() - start
+
+
+def main():
+    entries = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "cache.json")
+        make_cache(path, entries)
+
+        fast = timed_load(path, strict=False)
+        strict = timed_load(path, strict=True)
+
+    print(f"entries:  {entries}")
+    print(f"fast:     {fast:.3f}s")
+    print(f"strict:   {strict:.3f}s")
+    print(f"speedup:  {strict / fast:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
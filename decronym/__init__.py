@@ -22,11 +22,20 @@ from typing import (
 )
 import click
 import os
+import time
 from .lookup import *
 from .result import *
 from .config import Config
 from .filter import *
 from .util import *
+from .search import SearchIndex
+from .index import PrefixIndex
+from .output import FORMATTERS, get_formatter
+from .api import Decronym, Answer
+from .shard import MANIFEST_NAME, shard_dictionary
+
+# Upper bound of suggestions offered to shells and editors.
+COMPLETE_LIMIT = 50
 
 def callback_config(ctx, param, value):
     """Inject configuration from configuration file."""
@@ -46,15 +55,26 @@ def guess_type(input:str):
             return LookupType.TIMEDATE
         elif 'currency-iso' in input:
             return LookupType.ISO_CURRENCY
+        elif input.endswith(MANIFEST_NAME):
+            return LookupType.JSON_SHARDED
         else:
             return LookupType.JSON_URL
     elif os.path.isfile(input) and input.endswith(".json"):
         return LookupType.JSON_FILE
+    elif input == "system" or os.path.isfile(os.path.join(input, "tzdata.zi")):
+        return LookupType.TZDATA
     elif os.path.isdir(input):
         return LookupType.JSON_PATH
 
     return None
 
+def complete_acronyms(ctx, param, incomplete):
+    """Shell completion of acronyms, reads only the prefix index."""
+    index = PrefixIndex()
+    names = index.complete(incomplete, limit=COMPLETE_LIMIT)
+    index.close()
+    return names
+
 @click.group()
 @click.pass_context
 @click.option(
@@ -66,14 +86,20 @@ def guess_type(input:str):
     callback=callback_config,
     help=(f"Path to the config file to use."),
 )
-def cli(ctx, config):
+@click.option(
+    "--offline",
+    is_flag=True,
+    help=("Never use the network, answer only from caches and local sources."),
+)
+def cli(ctx, config, offline):
     """Decronym CLI"""
-    pass
+    if offline:
+        ctx.obj.set_override("offline", True)
 
 
 @cli.command()
 @click.pass_context
-@click.argument("acronyms", nargs=-1, required=True)
+@click.argument("acronyms", nargs=-1, required=True, shell_complete=complete_acronyms)
 @click.option(
     "--tag",
     "-t",
@@ -82,13 +108,142 @@ def cli(ctx, config):
     type=str,
     help=("Only show matches with given tags."),
 )
-def find(ctx, acronyms, tags):
+@click.option(
+    "--first",
+    is_flag=True,
+    help=("Stop at the cheapest sources that produce results."),
+)
+@click.option(
+    "--deadline",
+    type=str,
+    help=("Overall time limit, e.g. 800ms or 2s. Partial results are shown."),
+)
+@click.option(
+    "--limit",
+    "-n",
+    type=click.IntRange(min=1),
+    help=("Show only the best ranked N matches per acronym."),
+)
+@click.option(
+    "--unordered",
+    is_flag=True,
+    help=("Print each acronym as soon as it completes, not in argument order."),
+)
+@click.option(
+    "--format",
+    "format_",
+    type=click.Choice(list(FORMATTERS)),
+    default="pretty",
+    show_default=True,
+    help=("Output format, machine formats are written without styling."),
+)
+def find(ctx, acronyms, tags, first, deadline, limit, unordered, format_):
     """Searches for acronyms."""
+    start = time.time()
+    if deadline is None:
+        deadline = ctx.obj.get_option("deadline")
+    try:
+        deadline = start + parse_duration(deadline) if deadline is not None else None
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint="--deadline")
+
+    lookups = LookupAggregate(
+        LookupFactory.from_config(ctx.obj), formatter=get_formatter(format_)
+    )
+    # Each acronym is printed as soon as all of its sources are done.
+    lookups.request(
+        acronyms,
+        tags=tags,
+        first=first,
+        deadline=deadline,
+        limit=limit,
+        on_done=lookups.show,
+        ordered=not unordered,
+    )
+    lookups.formatter.close()
+
+@cli.command()
+@click.pass_context
+@click.argument("phrase", nargs=-1, required=True)
+@click.option(
+    "--limit",
+    "-n",
+    type=int,
+    default=10,
+    show_default=True,
+    help=("Maximum number of results to show."),
+)
+def search(ctx, phrase, limit):
+    """Finds acronyms by words of their expansion or comment."""
+    luts = LookupFactory.from_config(ctx.obj)
+    index = SearchIndex()
+    if not index.covers(luts):
+        index.build(luts)
+
+    hits = index.search(" ".join(phrase), limit=limit)
+    if not hits:
+        out_warn(f"No entries matching '{' '.join(phrase)}' found!")
+    for _, result in hits:
+        out_success(result.acronym)
+        print(result.pretty())
+
+@cli.command()
+@click.pass_context
+@click.argument("prefix", default="")
+@click.option(
+    "--limit",
+    "-n",
+    type=int,
+    default=COMPLETE_LIMIT,
+    show_default=True,
+    help=("Maximum number of completions to print."),
+)
+def complete(ctx, prefix, limit):
+    """Prints known acronyms starting with PREFIX, one per line."""
+    luts = LookupFactory.from_config(ctx.obj)
+    index = PrefixIndex()
+    if not index.covers(luts):
+        index.build(luts)
+    for name in index.complete(prefix, limit=limit):
+        click.echo(name)
+    index.close()
+
+@cli.command("compile")
+@click.pass_context
+def compile_(ctx):
+    """Rebuilds the merged, key and search indexes of all source caches."""
     lookups = LookupAggregate(LookupFactory.from_config(ctx.obj))
-    lookups.request(acronyms)
-    if tags:
-        lookups.filter_tags(tags)
-    lookups.show_results()
+    lookups.compile(force=True)
+    out_success(f"Index written to {lookups.index.path}")
+    out_success(f"Key index written to {lookups.keys.path}")
+    out_success(f"Search index written to {lookups.search.path}")
+
+@cli.command()
+@click.pass_context
+@click.argument(
+    "input",
+    type=click.Path(exists=True, dir_okay=False, readable=True, path_type=str),
+)
+@click.argument(
+    "outdir",
+    type=click.Path(file_okay=False, writable=True, path_type=str),
+)
+@click.option(
+    "--max-entries",
+    type=click.IntRange(min=1),
+    default=1000,
+    show_default=True,
+    help=("Largest number of keys in one shard."),
+)
+def shard(ctx, input, outdir, max_entries):
+    """Splits a JSON dictionary into prefix shards for a json_sharded source.
+
+    Serve OUTDIR over HTTP and add the URL of its manifest.json as a source.
+    """
+    manifest = shard_dictionary(input, outdir, max_entries)
+    out_success(
+        f"Wrote {len(manifest['shards'])} shards with {manifest['entries']} keys to {outdir}"
+    )
 
 @cli.command()
 @click.pass_context
@@ -131,6 +286,7 @@ def add(ctx, input, type_, pageid):
         raise click.UsageError(f"Page ID is required for Confluence source")
     elif type_ in (
                 LookupType.JSON_URL,
+                LookupType.JSON_SHARDED,
                 LookupType.TIMEDATE,
                 LookupType.ISO_CURRENCY,
                 LookupType.CONFLUENCE_TABLE,
@@ -141,7 +297,9 @@ def add(ctx, input, type_, pageid):
     extra ={}
     if type_ is LookupType.CONFLUENCE_TABLE:
         extra["pageid"] = pageid
-    elif type_ in (LookupType.JSON_FILE, LookupType.JSON_PATH):
+    elif type_ in (LookupType.JSON_FILE, LookupType.JSON_PATH) or (
+        type_ is LookupType.TZDATA and input != "system"
+    ):
         input = os.path.abspath(input)
         
     ctx.obj.add_source(type_, input, extra)
@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import threading
+import time
+from collections import defaultdict, namedtuple
+
+from .breaker import CircuitBreaker
+from .config import Config
+from .lookup import LookupFactory, record_outcome
+from .lookup.base import Lookup
+from .lookup.planner import QueryPlanner, LatencyStats
+from .rank import merge_sources, source_priority
+from .result import Result
+from . import throttle
+
+from typing import (
+    Any,
+    Callable,
+    Collection,
+    Dict,
+    Generator,
+    Generic,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Pattern,
+    Sequence,
+    Set,
+    Sized,
+    Tuple,
+    Type,
+    TypeVar,
+    Union,
+    cast,
+    TYPE_CHECKING,
+)
+
+# Answer for one requested key: matches carrying one of the requested tags,
+# the matches without any of them and the sources which did not answer, as
+# `LookupAggregate` reports them. `failed` holds those with unexpected errors,
+# `stale` those which answered offline from an outdated copy.
+Answer = namedtuple(
+    "Answer", "key results filtered failed timed_out unavailable uncached stale"
+)
+
+
+class Decronym(object):
+    """Asynchronous library interface.
+
+    Every source answers the requested keys it has cached from its cache and
+    all the others with one `Lookup.find_many` call, run on `executor` (the
+    event loop's default one if None). Calls to the same source are
+    serialised, different sources run concurrently. Like the CLI sources with
+    an open breaker only answer from their caches and the optional deadline
+    bounds every query. Sources which did not answer are reported per key.
+
+        answers = await Decronym().lookup_many(["DMA", "GMT"], tags=["computing"])
+    """
+
+    def __init__(
+        self,
+        config: Config = None,
+        luts: List[Lookup] = None,
+        executor=None,
+        stats: LatencyStats = None,
+        breaker: CircuitBreaker = None,
+    ):
+        if luts is None:
+            luts = LookupFactory.from_config(config if config is not None else Config())
+        self.config = config
+        self.luts = luts
+        self.executor = executor
+        self.stats = stats if stats is not None else LatencyStats()
+        self.planner = QueryPlanner(self.stats)
+        self.breaker = breaker if breaker is not None else CircuitBreaker()
+        self.locks = [threading.Lock() for _ in self.luts]
+        throttle.configure(self.luts)
+
+    def _find_many(
+        self, id: int, keys: List[str], deadline: Optional[float]
+    ) -> Tuple[Dict[str, List[Result]], List[str], Optional[Exception], float, bool]:
+        """Returns what the source found, the keys which were not cached,
+        the error looking those up failed with, how long that took and
+        whether it answered from an outdated copy.
+
+        Cached keys are answered whatever happens to the others.
+        """
+        lut = self.luts[id]
+        with self.locks[id]:
+            keys = [key for key in keys if lut.might_contain(key)]
+            cached = [key for key in keys if key.lower() in lut.cache]
+            missing = [key for key in keys if key.lower() not in lut.cache]
+            found = lut.find_many(cached) if cached else {}
+            if not missing:
+                return found, [], None, 0, False
+
+            start = time.perf_counter()
+            lut.start_query(deadline, self.breaker)
+            try:
+                found.update(lut.find_many(missing))
+                lut.cache.save()
+            except Exception as e:
+                return found, missing, e, time.perf_counter() - start, False
+        return found, missing, None, time.perf_counter() - start, lut.stale
+
+    async def lookup_many(
+        self,
+        keys: Iterable[str],
+        tags: Collection[str] = None,
+        deadline: float = None,
+    ) -> Dict[str, Answer]:
+        """Looks up every key in every source, returns an Answer per key.
+
+        `deadline` is a time.time() timestamp, sources which have not
+        answered by then are reported in `timed_out`.
+        """
+        keys = list(dict.fromkeys(keys))
+        loop = asyncio.get_running_loop()
+
+        # key -> report -> sources
+        reports = defaultdict(lambda: defaultdict(list))
+        ids = []
+        for id, lut in enumerate(self.luts):
+            if not self.planner.can_match(lut, tags):
+                continue
+            if deadline is not None and time.time() >= deadline:
+                for key in keys:
+                    reports[key]["timed_out"].append(lut.source)
+            else:
+                ids.append(id)
+        outcomes = await asyncio.gather(
+            *(
+                loop.run_in_executor(self.executor, self._find_many, id, keys, deadline)
+                for id in ids
+            )
+        )
+
+        found = {}
+        for id, (results, missing, error, elapsed, stale) in zip(ids, outcomes):
+            lut = self.luts[id]
+            found[id] = results
+            if not missing:
+                continue
+            report = record_outcome(self.breaker, self.stats, lut, error, elapsed, False)
+            if stale:
+                report = report or "stale"
+            if report is not None:
+                for key in missing:
+                    reports[key][report].append(lut.source)
+        self.stats.save()
+
+        order = sorted(found, key=lambda id: source_priority(self.luts, id), reverse=True)
+        tags = set(tags) if tags else None
+        answers = {}
+        for key in keys:
+            results, _ = merge_sources(
+                (id, found[id].get(key.lower(), [])) for id in order
+            )
+            filtered = []
+            if tags:
+                filtered = [r for r in results if tags.isdisjoint(r.tags)]
+                results = [r for r in results if not tags.isdisjoint(r.tags)]
+            report = reports[key]
+            answers[key] = Answer(
+                key,
+                results,
+                filtered,
+                report["failed"],
+                report["timed_out"],
+                report["unavailable"],
+                report["uncached"],
+                report["stale"],
+            )
+        return answers
+
+    async def lookup(
+        self, key: str, tags: Collection[str] = None, deadline: float = None
+    ) -> Answer:
+        return (await self.lookup_many([key], tags=tags, deadline=deadline))[key]
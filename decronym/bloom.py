@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import json
+import math
+import struct
+
+from .util import write_atomic
+
+from typing import (
+    Any,
+    Callable,
+    Collection,
+    Dict,
+    Generator,
+    Generic,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Pattern,
+    Sequence,
+    Set,
+    Sized,
+    Tuple,
+    Type,
+    TypeVar,
+    Union,
+    cast,
+    TYPE_CHECKING,
+)
+
+BLOOM_MAGIC = b"DCRB"
+BLOOM_VERSION = 1
+
+# magic, version, bit count, hash count, meta length
+_HEADER = struct.Struct("<4sIQIQ")
+
+
+class BloomFilter(object):
+    """Probabilistic set of keys.
+
+    `key in bloom` is False only if the key was never added, it can be True
+    for keys that were not added with a probability of roughly error_rate.
+    """
+
+    def __init__(self, bits: int, hashes: int, data: bytearray = None):
+        self.bits = max(bits, 8)
+        self.hashes = max(hashes, 1)
+        self.data = data if data is not None else bytearray((self.bits + 7) // 8)
+
+    @classmethod
+    def for_capacity(cls, capacity: int, error_rate: float = 0.01) -> "BloomFilter":
+        capacity = max(capacity, 1)
+        bits = math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))
+        hashes = round(bits / capacity * math.log(2))
+        return cls(bits, hashes)
+
+    @classmethod
+    def from_keys(cls, keys: Iterable[str], error_rate: float = 0.01) -> "BloomFilter":
+        keys = {key.casefold() for key in keys}
+        bloom = cls.for_capacity(len(keys), error_rate)
+        for key in keys:
+            bloom.add(key)
+        return bloom
+
+    def _positions(self, key: str) -> Iterator[int]:
+        # Double hashing, two 64 bit halves of one digest give all k positions.
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1, h2 = struct.unpack("<QQ", digest)
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % self.bits
+
+    def add(self, key: str):
+        for pos in self._positions(key):
+            self.data[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, key: str) -> bool:
+        data = self.data
+        return all(data[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+    def save(self, path: str, meta: Dict = None):
+        meta_raw = json.dumps(meta or {}, sort_keys=True).encode()
+        header = _HEADER.pack(
+            BLOOM_MAGIC, BLOOM_VERSION, self.bits, self.hashes, len(meta_raw)
+        )
+        write_atomic(path, [header, meta_raw, bytes(self.data)])
+
+    @classmethod
+    def load(cls, path: str) -> Tuple[Optional["BloomFilter"], Dict]:
+        """Reads a filter written by `save`, returns (None, {}) if unusable."""
+        try:
+            with open(path, "rb") as f:
+                raw = f.read()
+            magic, version, bits, hashes, meta_len = _HEADER.unpack_from(raw, 0)
+            if magic != BLOOM_MAGIC or version != BLOOM_VERSION:
+                return None, {}
+            start = _HEADER.size + meta_len
+            meta = json.loads(raw[_HEADER.size : start])
+            data = bytearray(raw[start:])
+            if len(data) != (bits + 7) // 8:
+                return None, {}
+        except (OSError, ValueError, struct.error):
+            return None, {}
+
+        return cls(bits, hashes, data), meta
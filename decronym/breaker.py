@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import time
+
+from .util import *
+
+from typing import (
+    Any,
+    Callable,
+    Collection,
+    Dict,
+    Generator,
+    Generic,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Pattern,
+    Sequence,
+    Set,
+    Sized,
+    Tuple,
+    Type,
+    TypeVar,
+    Union,
+    cast,
+    TYPE_CHECKING,
+)
+
+# Consecutive failures before a source is skipped.
+BREAKER_THRESHOLD = 3
+# Seconds a source is skipped for before it is probed again.
+BREAKER_COOLDOWN = 5 * 60
+
+
+class CircuitBreaker(object):
+    """Remembers failing sources across invocations.
+
+    After `threshold` consecutive failures the breaker for a source opens and
+    the source is skipped for `cooldown` seconds. Once the cool down is over a
+    single query is let through as a probe, success closes the breaker and a
+    failure opens it for another cool down.
+
+    State is kept in a small JSON file under the cache dir, updates are made
+    under a file lock so concurrent invocations share it.
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path or os.path.join(get_cache_dir(), "breaker.json")
+        self.state: Dict[str, Dict] = self._read()
+
+    def _read(self) -> Dict[str, Dict]:
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _update(self, uid: str, change: Callable[[Dict], Optional[Dict]]):
+        with locked(self.path):
+            self.state = self._read()
+            entry = change(dict(self.state.get(uid, {})))
+            if entry:
+                self.state[uid] = entry
+            else:
+                self.state.pop(uid, None)
+            write_atomic(self.path, [json.dumps(self.state, sort_keys=True).encode()])
+
+    def is_open(self, uid: str, threshold: int = BREAKER_THRESHOLD) -> bool:
+        return self.state.get(uid, {}).get("failures", 0) >= threshold
+
+    def allow(
+        self,
+        uid: str,
+        threshold: int = BREAKER_THRESHOLD,
+        cooldown: float = BREAKER_COOLDOWN,
+    ) -> bool:
+        """Whether the source should be queried now."""
+        if not self.is_open(uid, threshold):
+            return True
+
+        if time.time() - self.state[uid].get("opened", 0) < cooldown:
+            return False
+
+        # Half open, re-arm the cool down so only this query probes. Decided
+        # on the state read under the lock, other processes may have probed.
+        decision = []
+
+        def probe(entry):
+            if entry.get("failures", 0) < threshold:
+                decision.append(True)
+                return entry or None
+            if time.time() - entry.get("opened", 0) < cooldown:
+                decision.append(False)
+                return entry
+            entry["opened"] = time.time()
+            decision.append(True)
+            return entry
+
+        self._update(uid, probe)
+        return decision[0]
+
+    def record_success(self, uid: str):
+        if uid in self.state:
+            self._update(uid, lambda entry: None)
+
+    def record_failure(self, uid: str):
+        def fail(entry):
+            entry["failures"] = entry.get("failures", 0) + 1
+            entry["opened"] = time.time()
+            return entry
+
+        self._update(uid, fail)
@@ -58,6 +58,19 @@ JSON_CONFIG_SCHEMA = {
         },
         "tag_map" : {
             "type" : "object"
+        },
+        "strict" : {
+            "type" : "boolean"
+        },
+        "deadline" : {
+            "type" : ["string", "number"]
+        },
+        "offline" : {
+            "type" : "boolean"
+        },
+        "http_cache_size" : {
+            "type" : "integer",
+            "minimum" : 0
         }
     }
 }
@@ -96,6 +109,8 @@ class Config(object):
         self.config_ = None
         self.hash = None
         self.config_changed = False
+        # Command line settings, take precedence and are never saved.
+        self.overrides = {}
         self.path = select_config_file(path)
 
         # Check if any valid path has beeen given.
@@ -187,3 +202,11 @@ class Config(object):
 
     def get_tag_map(self):
         return self.config_.get("tag_map", {})
+
+    def get_option(self, name: str, default: Any = None) -> Any:
+        if name in self.overrides:
+            return self.overrides[name]
+        return self.config_.get(name, default)
+
+    def set_override(self, name: str, value: Any):
+        self.overrides[name] = value
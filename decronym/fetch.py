@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+import time
+import requests
+import urllib3
+from urllib3.response import HTTPResponse
+
+from . import throttle
+from .httpcache import HttpCache
+
+from typing import (
+    Any,
+    Callable,
+    Collection,
+    Dict,
+    Generator,
+    Generic,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Pattern,
+    Sequence,
+    Set,
+    Sized,
+    Tuple,
+    Type,
+    TypeVar,
+    Union,
+    cast,
+    TYPE_CHECKING,
+)
+
+# Upper bound for a single request, also applies when there is no deadline.
+REQUEST_TIMEOUT = 10.0
+# Throttled requests are retried this many times if Retry-After allows it.
+MAX_RETRIES = 2
+CHUNK_SIZE = 1 << 16
+
+
+class SourceError(Exception):
+    """A source could not answer a query."""
+
+
+class SourceTimeout(SourceError):
+    """The query deadline passed before the source answered."""
+
+
+class SourceUnavailable(SourceError):
+    """The source is down, overloaded or not responding."""
+
+
+class SourceSkipped(SourceUnavailable):
+    """The breaker of the source is open, it was not asked at all."""
+
+
+class SourceOffline(SourceError):
+    """Answering would need the network, which is disabled."""
+
+
+def remaining(deadline: Optional[float]) -> Optional[float]:
+    """Seconds left until `deadline` (a time.time() timestamp)."""
+    if deadline is None:
+        return None
+    return deadline - time.time()
+
+
+def request_timeout(deadline: Optional[float]) -> float:
+    left = remaining(deadline)
+    if left is None:
+        return REQUEST_TIMEOUT
+    return min(REQUEST_TIMEOUT, left)
+
+
+def iter_body(
+    r: requests.Response, deadline: Optional[float], chunk_size: int = CHUNK_SIZE
+) -> Iterator[bytes]:
+    """r.iter_content bounded by the query deadline.
+
+    The timeout of a request only bounds each socket read, a body trickling
+    in could otherwise take far longer than the deadline allows.
+
+    Raises:
+        SourceTimeout: If the deadline passed before the body was read.
+        SourceUnavailable: If the connection failed while reading.
+    """
+    raw = r.raw
+    if deadline is not None and isinstance(raw, HTTPResponse) and hasattr(raw, "read1"):
+        # Returns whatever has arrived instead of waiting for a full chunk,
+        # so the deadline is checked while the body trickles in.
+        chunks = iter(lambda: raw.read1(chunk_size, decode_content=True), b"")
+    else:
+        chunks = r.iter_content(chunk_size)
+
+    try:
+        for chunk in chunks:
+            left = remaining(deadline)
+            if left is not None and left <= 0:
+                r.close()
+                raise SourceTimeout(f"{r.url}: deadline exceeded reading the body")
+            yield chunk
+    except (requests.RequestException, urllib3.exceptions.HTTPError) as e:
+        raise SourceUnavailable(f"{r.url}: {e}")
+
+
+def _read_body(r: requests.Response, deadline: Optional[float]):
+    """Reads the body now, like requests.get without stream does."""
+    r._content = b"".join(iter_body(r, deadline))
+
+
+def get(
+    url: str,
+    deadline: Optional[float] = None,
+    offline: bool = False,
+    cache: HttpCache = None,
+    allow: Callable[[], bool] = None,
+    **kwargs
+) -> requests.Response:
+    """requests.get bounded by the query deadline.
+
+    Raises:
+        SourceOffline: If offline is set and there is no cached copy.
+        SourceSkipped: If `allow` returns False.
+        SourceTimeout: If the deadline passed before the source answered.
+        SourceUnavailable: If the source could not be reached, did not answer
+            within REQUEST_TIMEOUT, responded with a server error or asked
+            to be left alone for longer than throttle.MAX_RETRY_AFTER.
+
+    With a `cache`, fresh stored responses are returned without a request and
+    stale ones are revalidated with a conditional request. Offline, stale
+    copies are returned as they are, with `stale` set on the response. `allow` is asked only when the network
+    is needed, a source with an open breaker still answers from the cache.
+
+    The deadline also bounds reading the body, unless `stream` is set, then
+    callers read it with `iter_body`.
+
+    Requests to hosts with a limiter (see throttle.configure) wait for a slot
+    and a token first. Responses throttled with 429 or 503 pause the host
+    for the Retry-After period and are retried while the deadline allows, if
+    the period is at most throttle.MAX_RETRY_AFTER.
+    """
+    entry = cache.lookup(url) if cache is not None else None
+    if entry is not None:
+        fresh = entry.is_fresh()
+        if fresh or offline:
+            r = entry.response()
+            r.stale = not fresh
+            return r
+    if offline:
+        raise SourceOffline(f"{url}: offline")
+    if allow is not None and not allow():
+        raise SourceSkipped(f"{url}: skipped, the source has been failing")
+
+    stream = kwargs.pop("stream", False)
+    if cache is None:
+        r = _fetch(url, deadline, stream=True, **kwargs)
+        if not stream:
+            _read_body(r, deadline)
+        return r
+
+    headers = dict(kwargs.pop("headers", None) or {})
+    if entry is not None:
+        headers.update(entry.validators())
+
+    request_time = time.time()
+    r = _fetch(url, deadline, headers=headers, stream=True, **kwargs)
+    response_time = time.time()
+    if r.status_code == 304 and entry is not None:
+        return cache.refresh(entry, r, request_time, response_time).response()
+    if cache.storable(r):
+        return cache.store(
+            url, r, request_time, response_time, body=iter_body(r, deadline)
+        ).response()
+    if not stream:
+        _read_body(r, deadline)
+    return r
+
+
+def _fetch(url: str, deadline: Optional[float], **kwargs) -> requests.Response:
+    limiter = throttle.limiter_for(url)
+    for attempt in range(MAX_RETRIES + 1):
+        r = _send(url, deadline, limiter, **kwargs)
+        if r.status_code != 429 and r.status_code < 500:
+            return r
+
+        r.close()
+        if r.status_code in (429, 503) and limiter is not None:
+            delay = throttle.retry_after(r.headers.get("Retry-After"))
+            if delay is None and r.status_code == 429:
+                delay = throttle.DEFAULT_BACKOFF
+            if delay is not None:
+                # Every process waits before talking to the host again.
+                limiter.back_off(delay)
+                left = remaining(deadline)
+                if (
+                    attempt < MAX_RETRIES
+                    and delay <= throttle.MAX_RETRY_AFTER
+                    and (left is None or delay < left)
+                ):
+                    continue
+        raise SourceUnavailable(f"{url}: HTTP {r.status_code}")
+
+
+def _send(url: str, deadline: Optional[float], limiter, **kwargs) -> requests.Response:
+    if limiter is None:
+        return _request(url, deadline, **kwargs)
+
+    with limiter.slot(deadline) as allowed:
+        if not allowed:
+            blocked = limiter.blocked_for()
+            if blocked > throttle.MAX_RETRY_AFTER:
+                raise SourceUnavailable(f"{url}: host asked to retry in {blocked:.0f}s")
+            raise SourceTimeout(f"{url}: deadline exceeded waiting for rate limit")
+        return _request(url, deadline, **kwargs)
+
+
+def _request(url: str, deadline: Optional[float], **kwargs) -> requests.Response:
+    timeout = request_timeout(deadline)
+    if timeout <= 0:
+        raise SourceTimeout(f"{url}: deadline exceeded")
+
+    try:
+        return requests.get(url, timeout=timeout, **kwargs)
+    except requests.Timeout as e:
+        if timeout < REQUEST_TIMEOUT:
+            # Cut short by our own deadline, not the source's fault.
+            raise SourceTimeout(f"{url}: {e}")
+        raise SourceUnavailable(f"{url}: {e}")
+    except requests.ConnectionError as e:
+        raise SourceUnavailable(f"{url}: {e}")
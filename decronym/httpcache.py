@@ -0,0 +1,370 @@
+# -*- coding: utf-8 -*-
+import email.utils
+import hashlib
+import json
+import os
+import re
+import tempfile
+import time
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from .util import *
+
+from typing import (
+    Any,
+    Callable,
+    Collection,
+    Dict,
+    Generator,
+    Generic,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Pattern,
+    Sequence,
+    Set,
+    Sized,
+    Tuple,
+    Type,
+    TypeVar,
+    Union,
+    cast,
+    TYPE_CHECKING,
+)
+
+# Default cap of the stored bodies, least recently used entries go first.
+HTTP_CACHE_SIZE = 64 << 20
+CHUNK_SIZE = 1 << 16
+
+# Heuristic freshness (RFC 7234 4.2.2) is a tenth of the time since the
+# document last changed, but never more than a day.
+HEURISTIC_FRACTION = 0.1
+HEURISTIC_MAX = 24 * 60 * 60
+
+# Response headers kept with a stored body, bodies are stored decoded so
+# Content-Encoding is not among them.
+STORED_HEADERS = (
+    "Age",
+    "Cache-Control",
+    "Content-Type",
+    "Date",
+    "ETag",
+    "Expires",
+    "Last-Modified",
+    "Vary",
+)
+
+_DIRECTIVE_REGEX = re.compile(r'([\w-]+)(?:\s*=\s*(?:"([^"]*)"|([^,\s]*)))?')
+
+
+def parse_cache_control(value: Optional[str]) -> Dict[str, Optional[str]]:
+    directives = {}
+    for name, quoted, token in _DIRECTIVE_REGEX.findall(value or ""):
+        directives[name.lower()] = quoted or token or None
+    return directives
+
+
+def parse_http_date(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return email.utils.parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError, OverflowError):
+        return None
+
+
+def _seconds(value: Optional[str]) -> Optional[float]:
+    try:
+        return max(float(value), 0)
+    except (TypeError, ValueError):
+        return None
+
+
+class _Body(object):
+    """Stored body as a response's raw stream, closed once read to the end.
+    Temporary bodies are deleted once closed."""
+
+    def __init__(self, path: str, temporary: bool = False):
+        self.path = path
+        self.temporary = temporary
+        self.file = open(path, "rb")
+
+    def read(self, size: int = -1) -> bytes:
+        if self.file.closed:
+            return b""
+        data = self.file.read(size)
+        if not data:
+            self.close()
+        return data
+
+    def close(self):
+        self.file.close()
+        if self.temporary and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class CacheEntry(object):
+    """A stored response, its validators and its age bookkeeping.
+
+    Responses too large to keep are returned as temporary entries, their
+    body is deleted once it has been read.
+    """
+
+    def __init__(self, meta: Dict, body_path: str, temporary: bool = False):
+        self.meta = meta
+        self.body_path = body_path
+        self.temporary = temporary
+        self.headers = CaseInsensitiveDict(meta["headers"])
+
+    @property
+    def directives(self) -> Dict[str, Optional[str]]:
+        return parse_cache_control(self.headers.get("Cache-Control"))
+
+    def freshness_lifetime(self) -> float:
+        """RFC 7234 4.2.1, max-age, then Expires, then the heuristic."""
+        directives = self.directives
+        max_age = _seconds(directives.get("max-age"))
+        if max_age is not None:
+            return max_age
+
+        date = parse_http_date(self.headers.get("Date")) or self.meta["response_time"]
+        if "Expires" in self.headers:
+            expires = parse_http_date(self.headers["Expires"])
+            # Invalid dates, like "0", mean already expired.
+            return max(expires - date, 0) if expires is not None else 0
+
+        modified = parse_http_date(self.headers.get("Last-Modified"))
+        if modified is not None:
+            return min(max(date - modified, 0) * HEURISTIC_FRACTION, HEURISTIC_MAX)
+        return 0
+
+    def current_age(self, now: float = None) -> float:
+        """RFC 7234 4.2.3."""
+        now = now if now is not None else time.time()
+        request_time = self.meta["request_time"]
+        response_time = self.meta["response_time"]
+        date = parse_http_date(self.headers.get("Date")) or response_time
+
+        apparent_age = max(0, response_time - date)
+        age_value = _seconds(self.headers.get("Age")) or 0
+        corrected_age_value = age_value + (response_time - request_time)
+        corrected_initial_age = max(apparent_age, corrected_age_value)
+        return corrected_initial_age + (now - response_time)
+
+    def is_fresh(self, now: float = None) -> bool:
+        if "no-cache" in self.directives:
+            return False
+        return self.freshness_lifetime() > self.current_age(now)
+
+    def validators(self) -> Dict[str, str]:
+        """Headers of a conditional request revalidating this entry."""
+        headers = {}
+        if "ETag" in self.headers:
+            headers["If-None-Match"] = self.headers["ETag"]
+        if "Last-Modified" in self.headers:
+            headers["If-Modified-Since"] = self.headers["Last-Modified"]
+        return headers
+
+    def response(self) -> requests.Response:
+        """A response reading the stored body from disk, as it would stream."""
+        r = requests.Response()
+        r.status_code = self.meta["status"]
+        r.url = self.meta["url"]
+        r.headers = CaseInsensitiveDict(self.headers)
+        r.encoding = requests.utils.get_encoding_from_headers(r.headers)
+        r.raw = _Body(self.body_path, self.temporary)
+        r.reason = "OK"
+        return r
+
+
+class HttpCache(object):
+    """Private, on disk HTTP cache keyed by URL.
+
+    Bodies are stored once per content hash under `objects`, each URL has a
+    small JSON record under `entries` pointing at its body. Records are
+    touched whenever they are served, the least recently used ones are
+    dropped once the bodies outgrow `max_size`.
+    """
+
+    def __init__(self, path: str = None, max_size: int = HTTP_CACHE_SIZE):
+        self.path = path or os.path.join(get_cache_dir(), "http")
+        self.max_size = max_size
+
+    def _entry_path(self, url: str) -> str:
+        digest = hashlib.sha256(url.encode()).hexdigest()
+        return os.path.join(self.path, "entries", f"{digest}.json")
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.path, "objects", digest[:2], digest)
+
+    def lookup(self, url: str) -> Optional[CacheEntry]:
+        path = self._entry_path(url)
+        try:
+            with open(path) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        body_path = self._object_path(meta.get("body", ""))
+        if meta.get("url") != url or not os.path.isfile(body_path):
+            return None
+        # Recency for eviction.
+        os.utime(path)
+        return CacheEntry(meta, body_path)
+
+    def storable(self, r: requests.Response) -> bool:
+        """RFC 7234 3, only complete 200 responses the server allows storing,
+        and only bodies known to fit max_size."""
+        if r.status_code != 200:
+            return False
+        try:
+            if int(r.headers.get("Content-Length", "")) > self.max_size:
+                return False
+        except ValueError:
+            pass
+        if "no-store" in parse_cache_control(r.headers.get("Cache-Control")):
+            return False
+        return r.headers.get("Vary", "").strip() != "*"
+
+    def store(
+        self,
+        url: str,
+        r: requests.Response,
+        request_time: float,
+        response_time: float,
+        body: Iterable[bytes] = None,
+    ) -> CacheEntry:
+        """Streams the body of r, read from `body` if given, to disk and
+        records it for url. A body which outgrows max_size is not recorded,
+        it comes back as a temporary entry instead."""
+        objects = os.path.join(self.path, "objects")
+        os.makedirs(objects, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=objects, prefix=".tmp-")
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with os.fdopen(fd, "wb") as f:
+                # Stored decoded, Content-Encoding is not kept.
+                for chunk in body if body is not None else r.iter_content(CHUNK_SIZE):
+                    digest.update(chunk)
+                    size += len(chunk)
+                    f.write(chunk)
+            if size > self.max_size:
+                headers = {k: r.headers[k] for k in STORED_HEADERS if k in r.headers}
+                return CacheEntry(
+                    {"url": url, "status": r.status_code, "headers": headers},
+                    tmp,
+                    temporary=True,
+                )
+            body_path = self._object_path(digest.hexdigest())
+            os.makedirs(os.path.dirname(body_path), exist_ok=True)
+            os.replace(tmp, body_path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        finally:
+            r.close()
+
+        meta = {
+            "url": url,
+            "status": r.status_code,
+            "body": digest.hexdigest(),
+            "size": size,
+            "headers": {k: r.headers[k] for k in STORED_HEADERS if k in r.headers},
+            "request_time": request_time,
+            "response_time": response_time,
+        }
+        entry_path = self._entry_path(url)
+        write_atomic(entry_path, [json.dumps(meta).encode()])
+        self.evict(keep=entry_path)
+        return CacheEntry(meta, body_path)
+
+    def refresh(
+        self, entry: CacheEntry, r: requests.Response, request_time: float, response_time: float
+    ) -> CacheEntry:
+        """Updates a stored entry from a 304 Not Modified response (4.3.4)."""
+        r.close()
+        meta = dict(entry.meta)
+        headers = dict(entry.headers)
+        for k in STORED_HEADERS:
+            if k in r.headers:
+                headers[k] = r.headers[k]
+        meta.update(
+            headers=headers, request_time=request_time, response_time=response_time
+        )
+        write_atomic(self._entry_path(meta["url"]), [json.dumps(meta).encode()])
+        return CacheEntry(meta, entry.body_path)
+
+    def forget(self, url: str):
+        """Drops the entry for url and its body, for copies found to be bad."""
+        path = self._entry_path(url)
+        try:
+            with open(path) as f:
+                body = json.load(f).get("body")
+            os.remove(path)
+        except (OSError, ValueError):
+            return
+        if body:
+            try:
+                os.remove(self._object_path(body))
+            except OSError:
+                pass
+
+    def evict(self, keep: str = None):
+        """Drops least recently used entries until the bodies fit max_size,
+        then deletes bodies no entry refers to any more. The entry at `keep`,
+        the one just stored, is never dropped."""
+        entries_dir = os.path.join(self.path, "entries")
+        with locked(os.path.join(self.path, "evict")):
+            entries = []
+            for name in os.listdir(entries_dir):
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(entries_dir, name)
+                try:
+                    with open(path) as f:
+                        meta = json.load(f)
+                    entries.append((os.stat(path).st_mtime, path, meta["body"], meta["size"]))
+                except (OSError, ValueError, KeyError):
+                    continue
+
+            # Bodies shared by several URLs count once.
+            sizes = {body: size for _, _, body, size in entries}
+            total = sum(sizes.values())
+            if total <= self.max_size:
+                return
+
+            entries.sort()
+            refs: Dict[str, int] = {}
+            for _, _, body, _ in entries:
+                refs[body] = refs.get(body, 0) + 1
+            for _, path, body, size in entries:
+                if total <= self.max_size:
+                    break
+                if path == keep:
+                    continue
+                os.remove(path)
+                refs[body] -= 1
+                if not refs[body]:
+                    total -= size
+                    try:
+                        os.remove(self._object_path(body))
+                    except OSError:
+                        pass
+
+
+_shared: Dict[Tuple[str, int], HttpCache] = {}
+
+
+def shared(max_size: int = HTTP_CACHE_SIZE) -> Optional[HttpCache]:
+    """The cache in the default location, None if max_size is 0."""
+    if not max_size:
+        return None
+    key = (get_cache_dir(), max_size)
+    if key not in _shared:
+        _shared[key] = HttpCache(max_size=max_size)
+    return _shared[key]
@@ -0,0 +1,401 @@
+# -*- coding: utf-8 -*-
+import json
+import mmap
+import os
+import struct
+
+from .result import Result, read_journal
+from .util import *
+
+from typing import (
+    Any,
+    Callable,
+    Collection,
+    Dict,
+    Generator,
+    Generic,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Pattern,
+    Sequence,
+    Set,
+    Sized,
+    Tuple,
+    Type,
+    TypeVar,
+    Union,
+    cast,
+    TYPE_CHECKING,
+)
+
+TABLE_MAGIC = b"DCRT"
+TABLE_VERSION = 1
+
+# magic, version, entry count, meta length
+_HEADER = struct.Struct("<4sIIQ")
+# key offset, key length, value offset, value length
+_ENTRY = struct.Struct("<QIQI")
+_U16 = struct.Struct("<H")
+_U32 = struct.Struct("<I")
+
+TAG_SEPARATOR = "\x1f"
+
+
+def write_table(path: str, items: Iterable[Tuple[bytes, bytes]], meta: Dict = None):
+    """Writes an immutable sorted key/value table.
+
+    Layout: header, JSON meta blob, fixed size offset table, keys, values.
+    Keys must be unique, they are sorted bytewise before writing.
+    """
+    items = sorted(items, key=lambda item: item[0])
+    meta_raw = json.dumps(meta or {}, sort_keys=True).encode()
+
+    data_start = _HEADER.size + len(meta_raw) + _ENTRY.size * len(items)
+    entries = []
+    offset = data_start
+    for key, _ in items:
+        entries.append([offset, len(key)])
+        offset += len(key)
+    for entry, (_, value) in zip(entries, items):
+        entry += [offset, len(value)]
+        offset += len(value)
+
+    def chunks():
+        yield _HEADER.pack(TABLE_MAGIC, TABLE_VERSION, len(items), len(meta_raw))
+        yield meta_raw
+        for entry in entries:
+            yield _ENTRY.pack(*entry)
+        for key, _ in items:
+            yield key
+        for _, value in items:
+            yield value
+
+    write_atomic(path, chunks())
+
+
+class SortedTable(object):
+    """Read only, memory mapped view of a table written by `write_table`."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, self.count, meta_len = _HEADER.unpack_from(self.mm, 0)
+        if magic != TABLE_MAGIC or version != TABLE_VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a decronym table.")
+
+        self.meta = json.loads(self.mm[_HEADER.size : _HEADER.size + meta_len])
+        self.entries_start = _HEADER.size + meta_len
+
+    def close(self):
+        self.mm.close()
+
+    def __len__(self):
+        return self.count
+
+    def _entry(self, i: int):
+        return _ENTRY.unpack_from(self.mm, self.entries_start + i * _ENTRY.size)
+
+    def key(self, i: int) -> bytes:
+        key_off, key_len, _, _ = self._entry(i)
+        return self.mm[key_off : key_off + key_len]
+
+    def value(self, i: int) -> bytes:
+        _, _, val_off, val_len = self._entry(i)
+        return self.mm[val_off : val_off + val_len]
+
+    def bisect(self, key: bytes) -> int:
+        """Index of the first entry not smaller than `key`."""
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.key(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def get(self, key: bytes) -> Optional[bytes]:
+        i = self.bisect(key)
+        if i < self.count and self.key(i) == key:
+            return self.value(i)
+        return None
+
+    def prefixed(self, prefix: bytes) -> Iterator[int]:
+        """Yields indices of all entries starting with `prefix`."""
+        i = self.bisect(prefix)
+        while i < self.count and self.key(i).startswith(prefix):
+            yield i
+            i += 1
+
+
+def _pack_str(text: str) -> bytes:
+    raw = text.encode()
+    return _U32.pack(len(raw)) + raw
+
+
+def _unpack_str(data: bytes, offset: int) -> Tuple[str, int]:
+    (length,) = _U32.unpack_from(data, offset)
+    offset += _U32.size
+    return data[offset : offset + length].decode(), offset + length
+
+
+def pack_results(results: Iterable[Tuple[int, Result]]) -> bytes:
+    """Packs (source index, result) pairs into a single record."""
+    results = list(results)
+    out = [_U32.pack(len(results))]
+    for source_id, r in results:
+        out.append(_U16.pack(source_id))
+        out.append(_pack_str(r.acronym))
+        out.append(_pack_str(r.full))
+        out.append(_pack_str(r.comment or ""))
+        out.append(_pack_str(r.source or ""))
+        out.append(_pack_str(TAG_SEPARATOR.join(r.tags or [])))
+    return b"".join(out)
+
+
+def unpack_results(data: bytes) -> List[Tuple[int, Result]]:
+    (count,) = _U32.unpack_from(data, 0)
+    offset = _U32.size
+    results = []
+    for _ in range(count):
+        (source_id,) = _U16.unpack_from(data, offset)
+        offset += _U16.size
+        acronym, offset = _unpack_str(data, offset)
+        full, offset = _unpack_str(data, offset)
+        comment, offset = _unpack_str(data, offset)
+        source, offset = _unpack_str(data, offset)
+        tags, offset = _unpack_str(data, offset)
+        results.append(
+            (
+                source_id,
+                Result(
+                    acronym,
+                    full=full,
+                    comment=comment,
+                    source=source,
+                    tags=tags.split(TAG_SEPARATOR) if tags else [],
+                ),
+            )
+        )
+    return results
+
+
+def stat_fingerprint(path: str) -> List[int]:
+    try:
+        st = os.stat(path)
+        return [st.st_mtime_ns, st.st_size]
+    except OSError:
+        return [0, 0]
+
+
+class MappedIndex(object):
+    """Base of the indexes kept in a memory mapped `SortedTable`.
+
+    Every index records a fingerprint of the lookups it was built from, one
+    entry per lookup, so it can tell whether and for which of them it is
+    out of date.
+    """
+
+    FILENAME = ""
+
+    def __init__(self, path: str = None):
+        self.path = path or os.path.join(get_cache_dir(), self.FILENAME)
+        self.table = None
+
+    @staticmethod
+    def fingerprint(luts) -> List:
+        return [
+            [lut.uid(), lut.cache_fingerprint(), lut.source_fingerprint()]
+            for lut in luts
+        ]
+
+    def open(self) -> bool:
+        if self.table is None and os.path.isfile(self.path):
+            try:
+                self.table = SortedTable(self.path)
+            except (ValueError, OSError, struct.error):
+                self.table = None
+        return self.table is not None
+
+    def close(self):
+        if self.table is not None:
+            self.table.close()
+            self.table = None
+
+    def is_fresh(self, luts) -> bool:
+        if not self.open():
+            return False
+        return self.table.meta.get("fingerprint") == self.fingerprint(luts)
+
+    def fresh_sources(self, luts) -> Set[str]:
+        """Uids of the lookups that have not changed since the index was
+        built, their entries can be answered from the index."""
+        if not self.open():
+            return set()
+        stored = {entry[0]: entry for entry in self.table.meta.get("fingerprint", [])}
+        return {
+            entry[0] for entry in self.fingerprint(luts) if stored.get(entry[0]) == entry
+        }
+
+    def covers(self, luts) -> bool:
+        """True if the index was built from the given lookups, stale or not."""
+        if not self.open():
+            return False
+        return self.table.meta.get("sources") == [lut.uid() for lut in luts]
+
+
+class CompiledIndex(MappedIndex):
+    """Merged, memory mapped index of every source cache.
+
+    Keys are case folded acronyms, values are the cached results of every
+    source along with the id of the source they came from. It can tell which
+    sources changed since it was built. `decronym compile` builds it, finds
+    which add to a cache bring it up to date with `update`.
+    """
+
+    FILENAME = "index.bin"
+
+    def find(self, key: str) -> Dict[str, List[Result]]:
+        """Returns cached results for key grouped by source id."""
+        if not self.open():
+            return {}
+
+        raw = self.table.get(key.casefold().encode())
+        if raw is None:
+            return {}
+
+        sources = self.table.meta["sources"]
+        found = {}
+        for source_id, result in unpack_results(raw):
+            found.setdefault(sources[source_id], []).append(result)
+        return found
+
+    def update(self, luts):
+        """Merges the results appended to the cache journals of the given
+        lookups since the index was built.
+
+        Reads only the new journal lines, the rest of the index is copied as
+        it is. Caches rewritten in the meantime, by compaction, or a changed
+        set of lookups rebuild the whole index. Without an index nothing is
+        done, `decronym compile` creates it.
+        """
+        if not self.open():
+            return
+        if self.table.meta.get("sources") != [lut.uid() for lut in luts]:
+            self.compile(luts)
+            return
+
+        stored = {entry[0]: entry for entry in self.table.meta.get("fingerprint", [])}
+        fingerprint = []
+        added: Dict[bytes, List[Tuple[int, Result]]] = {}
+        for source_id, lut in enumerate(luts):
+            path = lut.cache_path()
+            # Writers append under the lock, the journal is read up to a
+            # line boundary.
+            with locked(path, exclusive=False):
+                entry = self.fingerprint([lut])[0]
+                old = stored.get(entry[0])
+                if old is not None and old[1] != entry[1]:
+                    # cache file, cache mtime and size, journal mtime and size
+                    if old[1][:2] != entry[1][:2] or entry[1][3] < old[1][3]:
+                        old = None
+                    else:
+                        for r in read_journal(
+                            f"{path}.journal", old[1][3], entry[1][3], lut.strict
+                        ):
+                            key = r.acronym.casefold().encode()
+                            added.setdefault(key, []).append((source_id, r))
+            if old is None:
+                self.compile(luts)
+                return
+            fingerprint.append(entry)
+
+        if fingerprint == self.table.meta.get("fingerprint"):
+            return
+
+        items = {self.table.key(i): self.table.value(i) for i in range(len(self.table))}
+        for key, new in added.items():
+            merged = unpack_results(items[key]) if key in items else []
+            seen = set(merged)
+            for pair in new:
+                if pair not in seen:
+                    seen.add(pair)
+                    merged.append(pair)
+            items[key] = pack_results(merged)
+
+        meta = dict(self.table.meta, fingerprint=fingerprint)
+        self.close()
+        write_table(self.path, items.items(), meta=meta)
+
+    def compile(self, luts):
+        """Rebuilds the index from the cache files of the given lookups."""
+        self.close()
+        sources = [lut.uid() for lut in luts]
+        fingerprint = self.fingerprint(luts)
+
+        merged = {}
+        for source_id, lut in enumerate(luts):
+            for key, items in lut.load_cache().items():
+                if items:
+                    merged.setdefault(key, []).extend((source_id, r) for r in items)
+
+        write_table(
+            self.path,
+            ((key.encode(), pack_results(items)) for key, items in merged.items()),
+            meta={"sources": sources, "fingerprint": fingerprint},
+        )
+
+
+class PrefixIndex(MappedIndex):
+    """Sorted, memory mapped set of every key known to the enabled sources.
+
+    Keys are case folded, values hold the acronym as it is usually written.
+    Completion only ever reads this file, `decronym complete` builds it
+    once and `decronym compile` refreshes it, ordinary finds never do.
+    """
+
+    FILENAME = "keys.bin"
+
+    def build(self, luts):
+        """Collects the cached and enumerable keys of the given lookups."""
+        self.close()
+        fingerprint = self.fingerprint(luts)
+
+        keys: Dict[str, str] = {}
+        for lut in luts:
+            for key, items in lut.load_cache().items():
+                if items:
+                    keys.setdefault(key.casefold(), items[0].acronym)
+            try:
+                known = lut.known_keys()
+                if known is not None:
+                    for key in known:
+                        keys.setdefault(key.casefold(), key)
+                else:
+                    for r in lut.local_results() or []:
+                        keys.setdefault(r.acronym.casefold(), r.acronym)
+            except (OSError, ValueError):
+                pass
+
+        write_table(
+            self.path,
+            ((key.encode(), name.encode()) for key, name in keys.items()),
+            meta={"sources": [lut.uid() for lut in luts], "fingerprint": fingerprint},
+        )
+
+    def complete(self, prefix: str, limit: int = None) -> List[str]:
+        """Known acronyms starting with prefix, in key order."""
+        if not self.open():
+            return []
+
+        names = []
+        for i in self.table.prefixed(prefix.casefold().encode()):
+            if limit is not None and len(names) >= limit:
+                break
+            names.append(self.table.value(i).decode())
+        return names
@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+import codecs
+import json
+import re
+
+from typing import (
+    Any,
+    Callable,
+    Collection,
+    Dict,
+    Generator,
+    Generic,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Pattern,
+    Sequence,
+    Set,
+    Sized,
+    Tuple,
+    Type,
+    TypeVar,
+    Union,
+    cast,
+    TYPE_CHECKING,
+)
+
+CHUNK_SIZE = 1 << 16
+
+WHITESPACE_REGEX = re.compile(r"[ \t\n\r]*")
+DELIMITERS = " \t\n\r,:]}"
+# Characters which can end a value, outside of and inside of strings.
+STRUCTURE_REGEX = re.compile(r'[\[\]{}"]')
+STRING_REGEX = re.compile(r'["\\]')
+SCALAR_END_REGEX = re.compile(r"[ \t\n\r,:\]}]")
+
+_decoder = json.JSONDecoder()
+
+
+class ValueEnd(object):
+    """Finds where a JSON value ends while its text arrives in pieces.
+
+    Only the structure is tracked (nesting depth, strings and escapes), each
+    piece is scanned once so finding the end of a value is linear in its size.
+    """
+
+    def __init__(self):
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.scalar = None
+
+    def feed(self, text: str, i: int = 0) -> Optional[int]:
+        """Index just past the end of the value in `text`, None if the value
+        continues in the next piece."""
+        if self.scalar is None:
+            self.scalar = text[i] not in '{["'
+        if self.scalar:
+            # Numbers and literals end at the first delimiter.
+            match = SCALAR_END_REGEX.search(text, i)
+            return match.start() if match else None
+
+        while i < len(text):
+            if self.escape:
+                self.escape = False
+                i += 1
+                continue
+
+            match = (STRING_REGEX if self.in_string else STRUCTURE_REGEX).search(text, i)
+            if match is None:
+                return None
+            i = match.end()
+            c = match.group()
+            if c == "\\":
+                self.escape = True
+            elif c == '"':
+                self.in_string = not self.in_string
+                if not self.in_string and self.depth == 0:
+                    return i
+            elif c in "[{":
+                self.depth += 1
+            else:
+                self.depth -= 1
+                if self.depth == 0:
+                    return i
+        return None
+
+
+class JsonObjectStream(object):
+    """Incrementally reads the members of a top level JSON object.
+
+    Chunks (str or bytes) are pulled from `chunks` only when the parser runs
+    out of input, so memory is bounded by the chunk size plus the largest
+    single member rather than the whole document.
+
+    Iterating yields (key, value) pairs in document order.
+    """
+
+    def __init__(self, chunks: Iterable[Union[str, bytes]], encoding: str = "utf-8"):
+        self.chunks = iter(chunks)
+        self.decoder = codecs.getincrementaldecoder(encoding)()
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def _read(self) -> str:
+        """Returns the next decoded chunk, '' at the end."""
+        if self.eof:
+            return ""
+
+        for chunk in self.chunks:
+            if isinstance(chunk, bytes):
+                chunk = self.decoder.decode(chunk)
+            if chunk:
+                return chunk
+
+        self.eof = True
+        return self.decoder.decode(b"", final=True)
+
+    def _fill(self) -> bool:
+        """Appends the next chunk to the buffer, returns False at the end."""
+        chunk = self._read()
+        self.buf += chunk
+        return bool(chunk)
+
+    def _compact(self):
+        if self.pos > CHUNK_SIZE:
+            self.buf = self.buf[self.pos :]
+            self.pos = 0
+
+    def _error(self, msg: str):
+        return json.JSONDecodeError(msg, self.buf, self.pos)
+
+    def _peek(self) -> str:
+        """Skips whitespace and returns the next character, '' at the end."""
+        while True:
+            self.pos = WHITESPACE_REGEX.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ""
+
+    def _expect(self, chars: str) -> str:
+        c = self._peek()
+        if not c or c not in chars:
+            raise self._error(f"Expecting one of {chars!r}")
+        self.pos += 1
+        return c
+
+    def _value(self) -> Any:
+        self._peek()
+        try:
+            value, end = _decoder.raw_decode(self.buf, self.pos)
+            # A value not followed by a delimiter might be a truncated
+            # number ("1" of "1.5"), only trust it once more input arrives.
+            if self.eof or (end < len(self.buf) and self.buf[end] in DELIMITERS):
+                self.pos = end
+                return value
+        except json.JSONDecodeError:
+            if self.eof:
+                raise
+
+        # The value continues past the buffer, collect chunks until its end
+        # has arrived and decode it once.
+        scanner = ValueEnd()
+        end = scanner.feed(self.buf, self.pos)
+        parts = [self.buf]
+        while end is None:
+            chunk = self._read()
+            if not chunk:
+                break
+            parts.append(chunk)
+            end = scanner.feed(chunk)
+        self.buf = "".join(parts)
+
+        value, self.pos = _decoder.raw_decode(self.buf, self.pos)
+        return value
+
+    def __iter__(self) -> Iterator[Tuple[str, Any]]:
+        self._expect("{")
+        if self._peek() == "}":
+            self.pos += 1
+            return
+
+        while True:
+            key = self._value()
+            if not isinstance(key, str):
+                raise self._error("Expecting property name")
+            self._expect(":")
+            yield key, self._value()
+            self._compact()
+
+            if self._expect(",}") == "}":
+                return
+
+
+def iter_file_chunks(path: str, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+def iter_json_items(chunks: Iterable[Union[str, bytes]]) -> Iterator[Tuple[str, Any]]:
+    """Yields (key, value) members of a JSON object streamed from chunks."""
+    return iter(JsonObjectStream(chunks))
+
+
+def iter_json_file(path: str) -> Iterator[Tuple[str, Any]]:
+    """Yields (key, value) members of the JSON object stored at path."""
+    return iter_json_items(iter_file_chunks(path))
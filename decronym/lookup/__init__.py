@@ -1,15 +1,34 @@
 # -*- coding: utf-8 -*-
 import multiprocessing as mp
+import queue
+import time
 from jsonschema import validate, ValidationError
-from collections import defaultdict
+from collections import defaultdict, namedtuple
 from typing import (
     List,
+    Optional,
 )
 
 from ..config import Config
 from ..result import *
 from ..util import *
+from ..index import CompiledIndex, PrefixIndex
+from ..search import SearchIndex
+from ..fetch import (
+    SourceError,
+    SourceTimeout,
+    SourceUnavailable,
+    SourceOffline,
+    SourceSkipped,
+    remaining,
+)
+from ..breaker import CircuitBreaker
+from ..rank import top_k, merge_sources, source_priority
+from ..output import Formatter, PrettyFormatter
+from .. import throttle
 from .base import Lookup, LookupType
+from .type import CostTier
+from .planner import QueryPlanner, LatencyStats
 from .jsonpath import LookupJsonPath
 from .jsondir import LookupJsonDir
 from .jsonremote import LookupRemote
@@ -17,6 +36,8 @@ from .timezone import LookupTimeAndDate
 from .currency import LookupCurrency
 from .confluence import LookupConfluenceTable
 from .wikipedia import LookupWikipedia
+from .tzdata import LookupTzData
+from .jsonsharded import LookupShardedRemote
 
 
 _type_to_lookup = {
@@ -27,6 +48,8 @@ _type_to_lookup = {
     LookupType.ISO_CURRENCY: LookupCurrency,
     LookupType.CONFLUENCE_TABLE: LookupConfluenceTable,
     LookupType.WIKIPEDIA: LookupWikipedia,
+    LookupType.TZDATA: LookupTzData,
+    LookupType.JSON_SHARDED: LookupShardedRemote,
 }
 
 
@@ -39,69 +62,432 @@ class LookupFactory(object):
 
     @classmethod
     def from_config(cls, config: Config):
+        """Creates lookups for the enabled sources, caches are loaded lazily."""
         return [
             cls.create(type, source, enabled, extra, config)
             for type, source, enabled, extra in config.get_sources()
+            if enabled
         ]
 
 
-def _acronym_find_helper(lut, input):
-    return (input, lut.find(input))
+# Result of looking up one key in one source, `id` is the source's position
+# in LookupAggregate.luts. `cached` is set if the source answered from its
+# cache without querying its data, `stale` if it answered offline from an
+# outdated copy of its data.
+Outcome = namedtuple("Outcome", "id key results filtered elapsed error cached stale")
+
+
+def _acronym_lookup_helper(id, lut, input, tags=None):
+    """Finds exact matches of input, split by whether they carry one of `tags`."""
+    start = time.perf_counter()
+    cached = False
+    try:
+        lut.use_worker_cache()
+        cached = input.lower() in lut.cache
+        results, filtered = lut.find_tagged(input, tags)
+        error = None
+        # Saved before answering, the pool is terminated as soon as every
+        # key is answered.
+        lut.cache.save()
+    except Exception as e:
+        results, filtered, error = [], [], e
+    return Outcome(
+        id,
+        input,
+        results,
+        filtered,
+        time.perf_counter() - start,
+        error,
+        cached,
+        lut.stale and error is None,
+    )
 
 
-def _acronym_similar_helper(lut, input):
-    return (input, lut.find_similar(input))
+def record_outcome(
+    breaker: CircuitBreaker, stats: LatencyStats, lut: Lookup, error, elapsed, cached
+) -> Optional[str]:
+    """Records how a query of lut went in its breaker and latency stats.
+
+    Returns how a source which did not answer is reported, "timed_out",
+    "uncached" (offline and nothing cached), "unavailable" or "failed" for
+    any other error, None if it answered.
+    """
+    if isinstance(error, SourceTimeout):
+        return "timed_out"
+    if isinstance(error, SourceOffline):
+        return "uncached"
+    if isinstance(error, SourceSkipped):
+        # Not asked, the breaker is open already.
+        return "unavailable"
+    if isinstance(error, SourceUnavailable):
+        breaker.record_failure(lut.uid())
+        return "unavailable"
+    if error is not None:
+        return "failed"
+    if not cached:
+        # Cache hits say nothing about how expensive or how healthy the
+        # source is, a cached answer must not close an open breaker.
+        stats.record(lut.uid(), elapsed)
+        breaker.record_success(lut.uid())
+    return None
 
 
 class LookupAggregate(object):
-    def __init__(self, luts: List[Lookup]):
+    def __init__(
+        self,
+        luts: List[Lookup],
+        index: CompiledIndex = None,
+        stats: LatencyStats = None,
+        breaker: CircuitBreaker = None,
+        keys: PrefixIndex = None,
+        search: SearchIndex = None,
+        formatter: Formatter = None,
+    ):
         self.luts = luts
         self.matches = defaultdict(list)
         self.filtered = defaultdict(list)
         self.similar = defaultdict(list)
+        # Sources never asked for a key, and sources which had nothing for
+        # it. Suggestions from them are computed only if the key ends up with
+        # no matches at all.
+        self.skipped = defaultdict(list)
+        self.missed = defaultdict(list)
+        # Sources which did not answer a key before the deadline.
+        self.timed_out = defaultdict(list)
+        # Sources which failed, or were not fetched from because they have
+        # been failing.
+        self.unavailable = defaultdict(list)
+        # Sources which would have needed the network in offline mode, and
+        # those which answered from an outdated copy instead.
+        self.uncached = defaultdict(list)
+        self.stale = defaultdict(list)
         self.requests = []
+        self.index = index if index is not None else CompiledIndex()
+        self.keys = keys if keys is not None else PrefixIndex()
+        self.search = search if search is not None else SearchIndex()
+        self.stats = stats if stats is not None else LatencyStats()
+        self.planner = QueryPlanner(self.stats)
+        self.breaker = breaker if breaker is not None else CircuitBreaker()
+        self.formatter = formatter if formatter is not None else PrettyFormatter()
+        # Matches per key and source id, merged into `matches` by `merge`.
+        self.found = defaultdict(lambda: defaultdict(list))
+        # Id of the source each merged match came from, used for ranking.
+        self.origin = defaultdict(dict)
+        self.tags = None
+        self.limit = None
+        self.deadline = None
+        self.inflight = set()
+        # Tasks of each key not answered yet, a key is complete at zero.
+        self.pending = defaultdict(int)
+        self.complete = set()
+        # Called with each key once complete, see `request`.
+        self.on_done = None
+        self.ordered = True
+        # Position in `requests` up to which keys were passed to on_done.
+        self.emitted = 0
+        # Set once a source answered from its data, and so may have added
+        # to its cache.
+        self.wrote = False
+
+    def append_results(self, outcome: Outcome):
+        self.inflight.discard((outcome.id, outcome.key))
+        lut = self.luts[outcome.id]
+        report = record_outcome(
+            self.breaker, self.stats, lut, outcome.error, outcome.elapsed, outcome.cached
+        )
+        if report == "failed":
+            out_warn(f"{lut.source} failed for '{outcome.key}': {outcome.error}")
+        elif report is not None:
+            getattr(self, report)[outcome.key].append(lut)
+        elif not outcome.cached:
+            self.wrote = True
+        if outcome.stale:
+            self.stale[outcome.key].append(lut)
+
+        if outcome.error is None and not outcome.results and not outcome.filtered:
+            self.missed[outcome.key].append(lut)
+        self.add_matches(outcome.key, outcome.results, id=outcome.id)
+        self.filtered[outcome.key] += outcome.filtered
+        self.resolve(outcome.key)
+
+    def resolve(self, key, count=1):
+        """Marks tasks of key as answered, dropped or timed out."""
+        self.pending[key] -= count
+        if self.pending[key] <= 0:
+            self.finish(key)
+
+    def finish(self, key):
+        """Merges the matches of a complete key and hands it to on_done, in
+        request order unless `ordered` is False."""
+        if key in self.complete:
+            return
+        self.complete.add(key)
+        self.merge(key)
+        if self.on_done is None:
+            return
+
+        if not self.ordered:
+            self.on_done(key)
+            return
+        while self.emitted < len(self.requests):
+            key = self.requests[self.emitted]
+            if key not in self.complete:
+                break
+            self.emitted += 1
+            self.on_done(key)
 
-    def append_match(self, results):
-        for key, r in results:
-            self.matches[key] += r
+    def expired(self) -> bool:
+        return self.deadline is not None and time.time() >= self.deadline
 
-    def append_similar(self, results):
-        for key, r in results:
-            self.similar[key] += r
+    def submit(self, pool, finished: queue.Queue, task, tags=None):
+        id, lut, key = task
+        lut.start_query(self.deadline, self.breaker)
+        self.inflight.add((id, key))
+        pool.apply_async(
+            _acronym_lookup_helper,
+            (id, lut, key, tags),
+            callback=finished.put,
+            error_callback=lambda e: finished.put(
+                Outcome(id, key, [], [], 0, e, False, False)
+            ),
+        )
+
+    def collect(self, finished: queue.Queue, satisfied=None):
+        """Consumes finished tasks until none are in flight, `satisfied()`
+        returns True or the deadline passes."""
+        while self.inflight:
+            if satisfied is not None and satisfied():
+                break
+            timeout = remaining(self.deadline)
+            try:
+                outcome = finished.get(timeout=max(timeout, 0) if timeout is not None else None)
+            except queue.Empty:
+                break
+            self.append_results(outcome)
+
+    def indexed_luts(self):
+        return [lut for lut in self.luts if lut.is_enabled()]
+
+    def request(
+        self,
+        acronyms,
+        tags=None,
+        first=False,
+        deadline=None,
+        limit=None,
+        on_done=None,
+        ordered=True,
+    ):
+        """Looks up acronyms in every source.
+
+        Sources are queried cheapest tier first. With `first` set a key is not
+        passed on to more expensive tiers once a tier has answered it, and
+        tasks still in flight are cancelled as soon as every key is answered.
+        Sources declaring tags disjoint from `tags` are not queried, the
+        others only return results carrying one of `tags` and record the rest
+        in `filtered`.
 
-    def request(self, acronyms):
+        `deadline` (a time.time() timestamp) bounds the whole request, sources
+        which have not answered by then are recorded in `timed_out`.
+
+        Matches are ranked, with `limit` set only the best ranked `limit` of
+        each key are shown. Sources always return, and cache, all of theirs.
+
+        `on_done(key)` is called as soon as every source queried for a key
+        has answered or timed out, in the order of `acronyms` or, with
+        `ordered` False, in the order the keys complete.
+        """
         self.requests += acronyms
+        self.deadline = deadline
+        self.tags = tags
+        self.limit = limit
+        self.on_done = on_done
+        self.ordered = ordered
+
+        # Answer what we can from the compiled index, only sources which have
+        # nothing cached for a key, or whose cache changed since the index was
+        # compiled, need to be asked directly.
+        fresh = self.index.fresh_sources(self.indexed_luts())
+        ids = {lut.uid(): id for id, lut in enumerate(self.luts)}
+        hits = {}
+        if fresh:
+            for a in acronyms:
+                hits[a] = {
+                    uid: items
+                    for uid, items in self.index.find(a).items()
+                    if uid in fresh
+                }
+                for uid, items in hits[a].items():
+                    self.add_matches(a, items, tags, id=ids.get(uid))
+
+        tasks = []
+        for id, lut in enumerate(self.luts):
+            for a in acronyms:
+                if lut.uid() in hits.get(a, {}):
+                    continue
+                if lut.might_contain(a):
+                    tasks.append((id, lut, a))
+                else:
+                    self.skipped[a].append(lut)
+
+        tiers = self.planner.plan(tasks, tags)
+        for tier in tiers:
+            for _, _, key in tier:
+                self.pending[key] += 1
+        for a in acronyms:
+            if not self.pending[a]:
+                self.finish(a)
 
-        with mp.Pool() as pool:
-            args = [(lut, a) for lut in self.luts for a in acronyms]
-            pool.starmap_async(_acronym_find_helper, args, callback=self.append_match)
-            pool.starmap_async(
-                _acronym_similar_helper, args, callback=self.append_similar
+        def satisfied():
+            return all(self.matches[a] for a in acronyms)
+
+        # Workers share one rate limit and in-flight cap per remote host.
+        limiters = throttle.configure(self.luts)
+        with mp.Pool(initializer=throttle.install, initargs=(limiters,)) as pool:
+            finished = queue.Queue()
+            for tier in tiers:
+                for task in tier:
+                    id, lut, key = task
+                    if first and self.matches[key]:
+                        self.resolve(key)
+                    elif self.expired():
+                        self.timed_out[key].append(lut)
+                        self.resolve(key)
+                    else:
+                        self.submit(pool, finished, task, tags)
+                if first:
+                    self.collect(finished, satisfied)
+
+            self.collect(finished, satisfied if first else None)
+            if self.inflight:
+                if self.expired():
+                    for id, key in self.inflight:
+                        self.timed_out[key].append(self.luts[id])
+                # Answered or out of time, drop the requests still in flight.
+                pool.terminate()
+                throttle.renew(limiters)
+                self.inflight = set()
+            else:
+                pool.close()
+                pool.join()
+
+        for a in acronyms:
+            self.finish(a)
+        self.stats.save()
+        if self.wrote:
+            # Keep newly cached keys answerable from the index.
+            self.index.update(self.indexed_luts())
+
+    def compile(self, force=False):
+        """Rebuilds the compiled, prefix and search indexes if any source has
+        changed.
+
+        This reads every source cache, it is only run by `decronym compile`.
+        """
+        indexed = self.indexed_luts()
+        if force or not self.index.is_fresh(indexed):
+            self.index.compile(indexed)
+        if force or not self.keys.is_fresh(indexed):
+            self.keys.build(indexed)
+        if force or not self.search.is_fresh(indexed):
+            self.search.build(indexed)
+
+    def add_matches(self, key, items, tags=None, id=None):
+        """Records results for key, those without any of `tags` as filtered."""
+        if tags:
+            tags = set(tags)
+            matched = []
+            for item in items:
+                if tags.isdisjoint(item.tags):
+                    self.filtered[key].append(item)
+                else:
+                    matched.append(item)
+            items = matched
+        self.matches[key] += items
+        self.found[key][id] += items
+
+    def merge(self, key=None):
+        """Collapses equal matches of different sources, keeping the order of
+        the source priorities and combining provenance and tags."""
+        for key in [key] if key is not None else list(self.found):
+            by_source = self.found[key]
+            order = sorted(by_source, key=self.priority, reverse=True)
+            self.matches[key], self.origin[key] = merge_sources(
+                (id, by_source[id]) for id in order
             )
-            pool.close()
-            pool.join()
 
     def filter_tags(self, tags):
-        flat_list = [item for list in self.matches.values() for item in list]
-        filtered = [r for r in flat_list if set(r.tags).isdisjoint(tags)]
-        for item in filtered:
-            self.filtered[item.acronym].append(item)
-            if item in self.matches[item.acronym]:
-                self.matches[item.acronym].remove(item)
+        """Moves matches without any of `tags` to `filtered`."""
+        found, self.found = self.found, defaultdict(lambda: defaultdict(list))
+        self.matches = defaultdict(list)
+        for key, by_source in found.items():
+            for id, items in by_source.items():
+                self.add_matches(key, items, tags, id=id)
+        self.merge()
+
+    def priority(self, id) -> float:
+        return source_priority(self.luts, id)
+
+    def ranked(self, key) -> List[Result]:
+        """Matches of key best first, only the best `limit` of them if a
+        limit is set."""
+        matched = self.matches[key]
+        origin = self.origin[key]
+        return top_k(
+            matched,
+            self.limit if self.limit is not None else len(matched),
+            priority=lambda r: self.priority(origin.get(r)),
+            tags=self.tags,
+        )
+
+    def suggestions(self, key):
+        """Similar keys from the sources which had nothing for key, computed
+        once and only when no source has a match."""
+        if self.matches[key] or self.filtered[key]:
+            return []
+        for lut in self.skipped.pop(key, []) + self.missed.pop(key, []):
+            self.similar[key] += lut.find_similar(key)
+        return self.similar[key]
 
     def show_results(self):
         for requested in self.requests:
-            matched = self.matches[requested]
-            filtered = self.filtered[requested]
-            similar = self.similar[requested]
-            if matched:
-                out_success(requested)
-                for match in matched:
-                    print(match.pretty())
-            elif filtered:
-                out_warn("Some entries filtered, try running without filters?")
-            else:
-                out_warn(f"No entires for '{requested}' found!")
-                if similar:
-                    similar_formatted = " ".join([f"{s}" for s in set(similar)])
-                    out(f"Suggested: {similar_formatted}")
+            self.show(requested)
+        self.formatter.close()
+
+    def show(self, requested):
+        """Prints the matches and notes of one requested key."""
+        matched = self.ranked(requested)
+        filtered = self.filtered[requested]
+        self.formatter.write(requested, matched)
+        if matched:
+            hidden = len(self.matches[requested]) - len(matched)
+            if hidden > 0:
+                out(f"{hidden} more, raise --limit to see them")
+        elif filtered:
+            out_warn("Some entries filtered, try running without filters?")
+        else:
+            out_warn(f"No entires for '{requested}' found!")
+            similar = self.suggestions(requested)
+            if similar:
+                similar_formatted = " ".join([f"{s}" for s in set(similar)])
+                out(f"Suggested: {similar_formatted}")
+
+        timed_out = self.timed_out[requested]
+        if timed_out:
+            sources = ", ".join(sorted({lut.source for lut in timed_out}))
+            out_warn(f"Timed out: {sources}")
+
+        unavailable = self.unavailable[requested]
+        if unavailable:
+            sources = ", ".join(sorted({lut.source for lut in unavailable}))
+            out_warn(f"Unavailable: {sources}")
+
+        uncached = self.uncached[requested]
+        if uncached:
+            sources = ", ".join(sorted({lut.source for lut in uncached}))
+            out_warn(f"Not cached (offline): {sources}")
+
+        stale = self.stale[requested]
+        if stale:
+            sources = ", ".join(sorted({lut.source for lut in stale}))
+            out_warn(f"Stale (offline): {sources}")
@@ -1,32 +1,210 @@
 # -*- coding: utf-8 -*-
 
 import difflib
+import time
 
-from .type import LookupType
+from .type import LookupType, CostTier
 from enum import Enum, auto
 from ..util import *
 from ..result import *
 from ..config import Config
+from ..index import stat_fingerprint
+from ..bloom import BloomFilter
+from .. import fetch
+from .. import httpcache
+from ..fetch import SourceError, SourceTimeout, SourceUnavailable, SourceOffline, SourceSkipped
+from ..breaker import CircuitBreaker, BREAKER_THRESHOLD, BREAKER_COOLDOWN
+
+# Membership filters of sources without a fingerprint expire after a day.
+BLOOM_MAX_AGE = 24 * 60 * 60
+
+# Caches loaded by a pool worker, see Lookup.use_worker_cache.
+_worker_caches: Dict[str, ResultCache] = {}
 
 class Lookup(object):
+    # Default cost of a query, see QueryPlanner.
+    cost_tier = CostTier.REMOTE
+    # Tags every result of the source carries, None if they vary.
+    static_tags: Optional[Collection[str]] = None
+
     def __init__(self, source:str, enabled: bool = True, config:Config=None, extra:Dict=None):
         # Common between all types of lookup
         self.source = source
         self.valid = None
         self.enabled = enabled
-        self.cache = ResultCache(self.cache_path())
+        self.extra = extra or {}
         self.config = config
+        self.strict = config.get_option("strict", False) if config else False
+        # Only answer from caches and local data.
+        self.offline = config.get_option("offline", False) if config else False
+        # Absolute time.time() by which queries should be answered.
+        self.deadline = None
+        # Gates network fetches of a query, see `start_query`.
+        self.breaker: Optional[CircuitBreaker] = None
+        self._admitted: Optional[bool] = None
+        # Set once the query was answered from an outdated HTTP cache copy,
+        # offline there is no way to revalidate it.
+        self.stale = False
+        # Loaded on first access, see `cache` and `membership`.
+        self._cache = None
+        self._bloom = None
+        self._bloom_loaded = False
+
+    def get(self, url: str, **kwargs):
+        """ Fetches url within the query deadline, see fetch.get. """
+        r = fetch.get(
+            url,
+            deadline=self.deadline,
+            offline=self.offline,
+            cache=self.http_cache(),
+            allow=self.allow_network,
+            **kwargs,
+        )
+        if getattr(r, "stale", False):
+            self.stale = True
+        return r
+
+    def start_query(self, deadline: Optional[float] = None, breaker: CircuitBreaker = None):
+        """ Sets the deadline and the breaker of the next query. """
+        self.deadline = deadline
+        self.breaker = breaker
+        self._admitted = None
+        self.stale = False
+
+    def allow_network(self) -> bool:
+        """ Whether the breaker lets the query reach the network.
+
+        Asked only once the cache could not answer, and once per query, so a
+        half open probe may fetch more than one url.
+        """
+        if self.breaker is None:
+            return True
+        if self._admitted is None:
+            self._admitted = self.breaker.allow(
+                self.uid(),
+                threshold=self.extra.get("breaker_threshold", BREAKER_THRESHOLD),
+                cooldown=self.extra.get("breaker_cooldown", BREAKER_COOLDOWN),
+            )
+        return self._admitted
+
+    def http_cache(self) -> Optional[httpcache.HttpCache]:
+        """ Shared HTTP cache, unless "http_cache" is false in extra. """
+        if not self.extra.get("http_cache", True):
+            return None
+        size = httpcache.HTTP_CACHE_SIZE
+        if self.config is not None:
+            size = self.config.get_option("http_cache_size", size)
+        return httpcache.shared(size)
 
     def validate(self):
         out_warn(f"{self}.validate() not implemented, validate will set to True by default.")
         self.valid = True
 
+    def uid(self) -> str:
+        return hashlib.md5(self.source.encode("utf-8")).hexdigest()
+
     def cache_path(self):
-        hash_object = hashlib.md5(self.source.encode("utf-8"))
         dir = get_cache_dir()
-        filename = f"{hash_object.hexdigest()}.json"
+        filename = f"{self.uid()}.json"
         return os.path.join(dir, filename)
 
+    @property
+    def cache(self) -> ResultCache:
+        if self._cache is None:
+            self._cache = ResultCache(self.cache_path(), strict=self.strict)
+        return self._cache
+
+    def use_worker_cache(self):
+        """ Shares one cache per source between the tasks of a pool worker.
+
+        Lookups are sent to workers without their cache, without this every
+        task would read the whole cache file again.
+        """
+        path = self.cache_path()
+        cache = _worker_caches.get(path)
+        if cache is None or cache.strict != self.strict:
+            cache = _worker_caches[path] = ResultCache(path, strict=self.strict)
+        self._cache = cache
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_cache"] = None
+        return state
+
+    def cache_fingerprint(self) -> List[int]:
+        path = self.cache_path()
+        return stat_fingerprint(path) + stat_fingerprint(f"{path}.journal")
+
+    def load_cache(self) -> ResultCache:
+        """ Reads the cache file from disk, ignoring the in memory copy. """
+        return ResultCache(self.cache_path(), strict=self.strict)
+
+    def known_keys(self) -> Optional[Iterable[str]]:
+        """ Every key the source can answer, None if it cannot be listed. """
+        return None
+
+    def local_results(self) -> Optional[Iterable[Result]]:
+        """ Every result available without a network request, None if the
+        source can only answer queries. """
+        return None
+
+    def source_fingerprint(self) -> Optional[List]:
+        """ Changes whenever the source data changes, None if unknown. """
+        return None
+
+    def bloom_path(self):
+        return os.path.join(get_cache_dir(), f"{self.uid()}.bloom")
+
+    def save_membership(self, keys: Iterable[str], fingerprint: List = None) -> BloomFilter:
+        self._bloom = BloomFilter.from_keys(keys)
+        self._bloom_loaded = True
+        self._bloom.save(
+            self.bloom_path(), meta={"fingerprint": fingerprint, "built": time.time()}
+        )
+        return self._bloom
+
+    def membership(self) -> Optional[BloomFilter]:
+        """ Bloom filter over every key of the source, if it is known.
+
+        The filter is persisted next to the cache and rebuilt when the
+        source fingerprint changes.
+        """
+        if self._bloom_loaded:
+            return self._bloom
+        self._bloom_loaded = True
+
+        fingerprint = self.source_fingerprint()
+        bloom, meta = BloomFilter.load(self.bloom_path())
+        if bloom is not None:
+            if fingerprint is not None and meta.get("fingerprint") == fingerprint:
+                self._bloom = bloom
+            elif fingerprint is None and meta.get("fingerprint") is None:
+                max_age = self.extra.get("bloom_max_age", BLOOM_MAX_AGE)
+                if time.time() - meta.get("built", 0) < max_age:
+                    self._bloom = bloom
+
+        if self._bloom is None and fingerprint is not None:
+            try:
+                keys = self.known_keys()
+            except (OSError, ValueError):
+                keys = None
+            if keys is not None:
+                self.save_membership(keys, fingerprint)
+
+        return self._bloom
+
+    def might_contain(self, key: str) -> bool:
+        """ False only if the source definitely has no entry for key. """
+        bloom = self.membership()
+        return bloom is None or key.casefold() in bloom
+
+    def declared_tags(self) -> Optional[Set[str]]:
+        """ Tags every result of this source carries one of, None if unknown. """
+        tags = self.extra.get("tags")
+        if tags is not None:
+            return set(tags)
+        return set(self.static_tags) if self.static_tags is not None else None
+
     def to_dict(self) -> Dict:
         return {
             "enabled":self.enabled,
@@ -48,6 +226,38 @@ class Lookup(object):
         self.valid = False
         return []
 
+    def find_direct_many(self, keys: Iterable[str]) -> Dict[str, List[Result]]:
+        """ Results for several keys at once, keyed by the case folded key.
+
+        Sources which can answer many keys from one fetch or parse override
+        this, by default `find_direct` is called for each key.
+        """
+        return {key.casefold(): list(self.find_direct(key)) for key in keys}
+
+    def usable(self) -> bool:
+        """ True if the lookup is enabled and its configuration is valid,
+        invalid ones are reported and skipped. """
+        if not self.is_valid():
+            out_warn(f"{self} is not valid, skipping")
+            return False
+        return self.is_enabled()
+
+    def find_many(self, keys: Iterable[str]) -> Dict[str, List[Result]]:
+        """ Like `find` for several keys, the keys missing from the cache are
+        looked up with a single `find_direct_many` call. """
+        keys = list(dict.fromkeys(key.lower() for key in keys))
+        if not self.usable():
+            return {key: [] for key in keys}
+
+        found = {key: self.cache[key] for key in keys if key in self.cache}
+        missing = [key for key in keys if key not in found]
+        if missing:
+            direct = self.find_direct_many(missing)
+            for key in missing:
+                found[key] = list(direct.get(key.casefold(), []))
+                self.cache.add(found[key])
+        return found
+
     def find(self, key: str, exact:bool=True, similar:bool=False) -> List[Result]:
 
         # ensure key is lower case
@@ -56,12 +266,7 @@ class Lookup(object):
         if not exact and not similar:
             out_warn(f"{self} Neither exact not similar flags are set, no results will be returned.")
 
-        # Configuration is invalid skipping 
-        if not self.is_valid():
-            out_warn(f"{self} is not valid, skipping")
-            return []
-
-        if not self.is_enabled():
+        if not self.usable():
             return []
 
         results = []
@@ -81,6 +286,19 @@ class Lookup(object):
 
         return results
 
+    def find_tagged(self, key: str, tags: Collection[str] = None) -> Tuple[List[Result], List[Result]]:
+        """ Splits the results for key into those carrying one of `tags`
+        and those filtered out. """
+        results = self.find(key)
+        if not tags:
+            return results, []
+
+        tags = set(tags)
+        matched, filtered = [], []
+        for r in results:
+            (filtered if tags.isdisjoint(r.tags) else matched).append(r)
+        return matched, filtered
+
     def find_similar(self, key: str):
         return self.find(key, exact=False, similar=True)
 
@@ -33,11 +33,13 @@ from typing import (
 )
 
 class LookupConfluenceTable(Lookup):
+    static_tags = frozenset({"confluence"})
+
     def __init__(self, source:str, enabled: bool = True, config:Config=None, extra:Dict=None):
         # Expects a confluence table in the followinng format:
         # |	ACRONYM | FULL | COMMENT
         request_url = f"{source}/rest/api/content/{extra['page_id']}?expand=body.storage"
-        super().__init__(source=request_url,enabled=enabled, config=config)
+        super().__init__(source=request_url, enabled=enabled, config=config, extra=extra)
 
     def validate(self):
         self.valid = is_url_valid(self.source)
@@ -45,7 +47,7 @@ class LookupConfluenceTable(Lookup):
     def load_direct(self):
         username = input("user: ")
         password = getpass.getpass("password: ")
-        r = requests.get(self.source, auth=(username, password))
+        r = self.get(self.source, auth=(username, password))
         if r.status_code != 200:
             # failed to fetch xml.
             return
@@ -31,30 +31,37 @@ from typing import (
 )
 
 class LookupCurrency(Lookup):
+    static_tags = frozenset({"currency", "iso"})
+
     def validate(self):
         self.valid = is_url_valid(self.source)
 
     def find_direct(self, 
                     key: str, 
                     update_cache:bool=False) -> List[Result]:
+        return self.find_direct_many([key])[key.casefold()]
+
+    def find_direct_many(self, keys: Iterable[str]) -> Dict[str, List[Result]]:
+        wanted = {key.casefold() for key in keys}
+        results = {key: [] for key in wanted}
 
-        r = requests.get(f"{self.source}")
+        r = self.get(f"{self.source}")
         if r.status_code != 200:
             # failed to fetch xml.
-            return
+            return results
 
         soup = BeautifulSoup(r.text.encode("UTF-8"), "xml")
 
-        results = []
-        for tag in soup.find_all(lambda tag: tag.name == "CcyNtry" and tag.find("Ccy") and tag.find("Ccy").text.lower() == key):
+        # One pass over the table answers every key.
+        for tag in soup.find_all(lambda tag: tag.name == "CcyNtry" and tag.find("Ccy") and tag.find("Ccy").text.lower() in wanted):
             acronym = tag.find("Ccy")
             key = acronym.text.lower()
             full = tag.find("CcyNm")
-            results.append( Result(
+            results[key].append( Result(
                         acronym.text,
                         full=full.text,
                         source=self.source,
                         tags=["currency","iso"]
                     ))
 
-        return set(results)
\ No newline at end of file
+        return {key: list(dict.fromkeys(items)) for key, items in results.items()}
\ No newline at end of file
@@ -1,9 +1,10 @@
 # -*- coding: utf-8 -*-
 from .base import Lookup
-from .type import LookupType
-from ..result import Result
+from .type import LookupType, CostTier
+from ..result import Result, decode_results
+from ..jsonstream import iter_json_file
+from ..index import stat_fingerprint
 import click
-import json
 import os
 
 from typing import (
@@ -30,30 +31,53 @@ from typing import (
 )
 
 class LookupJsonDir(Lookup):
+    cost_tier = CostTier.LOCAL_DIR
+
     def validate(self):
         self.valid = os.path.isdir(self.source)
 
-    def find_direct(self, key: str) -> List[Result]:
-        key = key.casefold()
-        results = []
+    def files(self) -> List[str]:
+        paths = []
         for dir, _, files in os.walk(os.path.abspath(self.source)):
             for file in files:
-                if not file.endswith('.json'):
-                    continue
-
-                fullpath = os.path.join(dir, file)
-                
-                with click.open_file(fullpath) as f:
-                    json_data = json.load(f)
-                    # TODO: add validation to check if contents will work
-
-                if key in json_data:
-                    temp_results = Result.schema().load(json_data[key], many=True)
-                    for r in temp_results:
-                        r.source = fullpath
-                    results += temp_results
-        
-        return set(results)
+                if file.endswith('.json'):
+                    paths.append(os.path.join(dir, file))
+        return sorted(paths)
+
+    def known_keys(self) -> Iterable[str]:
+        return [entry for path in self.files() for entry, _ in iter_json_file(path)]
+
+    def local_results(self) -> Iterator[Result]:
+        for path in self.files():
+            for _, items in iter_json_file(path):
+                for r in decode_results(items, self.strict):
+                    r.source = path
+                    yield r
+
+    def source_fingerprint(self) -> List:
+        return [[path] + stat_fingerprint(path) for path in self.files()]
+
+    def find_direct(self, key: str) -> List[Result]:
+        return self.find_direct_many([key])[key.casefold()]
+
+    def find_direct_many(self, keys: Iterable[str]) -> Dict[str, List[Result]]:
+        wanted = {key.casefold() for key in keys}
+        results = {key: [] for key in wanted}
+        for fullpath in self.files():
+            # TODO: add validation to check if contents will work
+            found = {}
+            for entry, value in iter_json_file(fullpath):
+                if entry in wanted:
+                    found[entry] = value
+
+            for key, items in found.items():
+                temp_results = decode_results(items, self.strict)
+                for r in temp_results:
+                    r.source = fullpath
+                results[key] += temp_results
+
+        # Equal results from several files are kept once.
+        return {key: list(dict.fromkeys(items)) for key, items in results.items()}
 
 
     def to_dict(self) -> Dict:
@@ -1,9 +1,10 @@
 # -*- coding: utf-8 -*-
 from .base import Lookup
-from .type import LookupType
-from ..result import Result
+from .type import LookupType, CostTier
+from ..result import Result, decode_results
+from ..jsonstream import iter_json_file
+from ..index import stat_fingerprint
 import click
-import json
 import os
 
 from typing import (
@@ -29,23 +30,43 @@ from typing import (
     TYPE_CHECKING,
 )
 class LookupJsonPath(Lookup):
+    cost_tier = CostTier.LOCAL_FILE
+
     def validate(self):
         self.valid = os.path.isfile(self.source) and self.source.endswith(".json")
 
     def find_direct(self, key: str) -> List[Result]:
-        key = key.casefold()
+        return self.find_direct_many([key])[key.casefold()]
+
+    def find_direct_many(self, keys: Iterable[str]) -> Dict[str, List[Result]]:
+        wanted = {key.casefold() for key in keys}
 
-        with click.open_file(self.source) as f:
-            json_data = json.load(f)
-        
-        if key not in json_data:
-            return []
+        # Stream the file once so only the matching entries are ever held in
+        # memory, like json.load the last duplicate key wins.
+        found = {}
+        for entry, value in iter_json_file(self.source):
+            if entry in wanted:
+                found[entry] = value
 
-        results = Result.schema().load(json_data[key], many=True)
-        for r in results:
-            r.source = self.source
+        results = {key: [] for key in wanted}
+        for key, items in found.items():
+            results[key] = decode_results(items, self.strict)
+            for r in results[key]:
+                r.source = self.source
         return results
-        
+
+    def known_keys(self) -> Iterable[str]:
+        return [entry for entry, _ in iter_json_file(self.source)]
+
+    def local_results(self) -> Iterator[Result]:
+        for _, items in iter_json_file(self.source):
+            for r in decode_results(items, self.strict):
+                r.source = self.source
+                yield r
+
+    def source_fingerprint(self) -> List:
+        return stat_fingerprint(self.source)
+
     def to_dict(self) -> Dict:
         base = super().to_dict()
         print(base)
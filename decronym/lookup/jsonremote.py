@@ -1,10 +1,11 @@
 # -*- coding: utf-8 -*-
 from .base import Lookup
 from .type import LookupType
-from ..result import Result
+from ..result import Result, decode_results
 from ..util import *
+from ..fetch import SourceError, iter_body
+from ..jsonstream import iter_json_items
 import requests
-import json
 
 from typing import (
     Any,
@@ -34,26 +35,47 @@ class LookupRemote(Lookup):
         self.valid = is_url_valid(self.source)
         
     def find_direct(self, key: str) -> List[Result]:
+        return self.find_direct_many([key])[key.casefold()]
+
+    def find_direct_many(self, keys: Iterable[str]) -> Dict[str, List[Result]]:
+        # With "ingest" set in extra, the whole document is added to the cache
+        # so that other keys are answered without fetching it again.
+        ingest = self.extra.get("ingest", False)
+        wanted = {key.casefold() for key in keys}
+        results = {key: [] for key in wanted}
         try:
-            r = requests.get(self.source)
-            if r.status_code != 200:
-                out_warn(
-                    f"URL ({self.source}) unreachable (code:{r.status_code}) - skipping."
-                )
-                return []
-
-            results = []
-            json_data = json.loads(r.text)
-            for entry, items in json_data.items():
-                if entry.casefold() != key.casefold():
-                    continue
-                results += Result.schema().load(items, many=True)
-
-            for r in results:
-                r.source = self.source
+            with self.get(self.source, stream=True) as r:
+                if r.status_code != 200:
+                    out_warn(
+                        f"URL ({self.source}) unreachable (code:{r.status_code}) - skipping."
+                    )
+                    return results
+
+                # Parse the body as it arrives instead of buffering it.
+                known = []
+                for entry, items in iter_json_items(iter_body(r, self.deadline)):
+                    known.append(entry)
+                    key = entry.casefold()
+                    matched = key in wanted
+                    if not matched and not ingest:
+                        continue
+
+                    decoded = decode_results(items, self.strict)
+                    for item in decoded:
+                        item.source = self.source
+                    if ingest:
+                        self.cache.ingest([(entry, decoded)])
+                    if matched:
+                        results[key] += decoded
+
+            if ingest:
+                # Every key is known now, misses can be skipped until it expires.
+                self.save_membership(known)
             return results
 
+        except SourceError:
+            raise
         except Exception as e:
             out_warn(f"Failed to get json from URL ({self.source}) {e}")
-            return []
+            return {key: [] for key in wanted}
 
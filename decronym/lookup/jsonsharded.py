@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import json
+from collections import defaultdict
+from urllib.parse import quote, urljoin
+
+from .base import Lookup
+from .type import LookupType
+from ..result import Result, decode_results
+from ..util import *
+from ..fetch import SourceError, SourceUnavailable, iter_body
+from ..jsonstream import iter_json_items
+from ..shard import MANIFEST_VERSION, shard_prefix
+
+from typing import (
+    Any,
+    Callable,
+    Collection,
+    Dict,
+    Generator,
+    Generic,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Pattern,
+    Sequence,
+    Set,
+    Sized,
+    Tuple,
+    Type,
+    TypeVar,
+    Union,
+    cast,
+    TYPE_CHECKING,
+)
+
+
+class ShardMismatch(SourceUnavailable):
+    """A shard did not match the hash the manifest lists for it."""
+
+
+class LookupShardedRemote(Lookup):
+    """Remote dictionary split into prefix shards, see decronym.shard.
+
+    Source is the URL of the manifest, which lists every shard with its
+    prefix, path (relative to the manifest) and sha256. Only the shards
+    holding the requested keys are downloaded, each is verified against its
+    hash and all of its entries are added to the cache.
+
+    The manifest is read once per lookup, how long a copy is reused is up to
+    the HTTP cache and the server's cache headers.
+    """
+
+    def validate(self):
+        self.valid = is_url_valid(self.source)
+
+    def manifest(self) -> Dict:
+        with self.get(self.source) as r:
+            if r.status_code != 200:
+                raise SourceUnavailable(f"{self.source}: HTTP {r.status_code}")
+            manifest = json.loads(r.content)
+        if manifest.get("version") != MANIFEST_VERSION:
+            raise SourceUnavailable(f"{self.source}: unsupported manifest")
+        return manifest
+
+    def shard_url(self, shard: Dict) -> str:
+        return urljoin(self.source, quote(shard["path"]))
+
+    def fetch_shard(self, shard: Dict) -> List[Tuple[str, List[Result]]]:
+        """Returns the decoded entries of a shard once its hash checks out.
+
+        A copy from the HTTP cache which does not match, for instance one
+        cached before the dictionary was updated, is dropped and fetched
+        again once.
+        """
+        try:
+            return self._fetch_shard(shard)
+        except ShardMismatch:
+            cache = self.http_cache()
+            if cache is None:
+                raise
+            cache.forget(self.shard_url(shard))
+        try:
+            return self._fetch_shard(shard)
+        except ShardMismatch:
+            cache.forget(self.shard_url(shard))
+            raise
+
+    def _fetch_shard(self, shard: Dict) -> List[Tuple[str, List[Result]]]:
+        url = self.shard_url(shard)
+        digest = hashlib.sha256()
+
+        def chunks(r):
+            for chunk in iter_body(r, self.deadline):
+                digest.update(chunk)
+                yield chunk
+
+        with self.get(url, stream=True) as r:
+            if r.status_code != 200:
+                raise SourceUnavailable(f"{url}: HTTP {r.status_code}")
+            entries = []
+            for entry, items in iter_json_items(chunks(r)):
+                decoded = decode_results(items, self.strict)
+                for item in decoded:
+                    item.source = self.source
+                entries.append((entry, decoded))
+
+        if digest.hexdigest() != shard["sha256"]:
+            raise ShardMismatch(f"{url}: hash mismatch")
+        return entries
+
+    def find_direct(self, key: str) -> List[Result]:
+        return self.find_direct_many([key])[key.casefold()]
+
+    def find_direct_many(self, keys: Iterable[str]) -> Dict[str, List[Result]]:
+        wanted = {key.casefold() for key in keys}
+        results = {key: [] for key in wanted}
+        try:
+            shards = self.manifest()["shards"]
+            needed = defaultdict(set)
+            for key in wanted:
+                prefix = shard_prefix(shards, key)
+                if prefix is not None:
+                    needed[prefix].add(key)
+
+            for prefix, shard_keys in needed.items():
+                entries = self.fetch_shard(shards[prefix])
+                # The shard is small, keep all of it for the keys next to ours.
+                self.cache.ingest(entries)
+                for entry, decoded in entries:
+                    if entry.casefold() in shard_keys:
+                        results[entry.casefold()] += decoded
+            return results
+
+        except SourceError:
+            raise
+        except Exception as e:
+            out_warn(f"Failed to get shards from URL ({self.source}) {e}")
+            return results
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+from collections import defaultdict
+
+from .base import Lookup
+from .type import CostTier
+from ..util import *
+
+from typing import (
+    Any,
+    Callable,
+    Collection,
+    Dict,
+    Generator,
+    Generic,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Pattern,
+    Sequence,
+    Set,
+    Sized,
+    Tuple,
+    Type,
+    TypeVar,
+    Union,
+    cast,
+    TYPE_CHECKING,
+)
+
+# Weight of the newest sample in the moving average.
+LATENCY_ALPHA = 0.3
+
+
+class LatencyStats(object):
+    """Moving average of how long each source takes to answer a key."""
+
+    def __init__(self, path: str = None):
+        self.path = path or os.path.join(get_cache_dir(), "latency.json")
+        self.latency: Dict[str, float] = {}
+        self.changed = False
+        try:
+            with open(self.path) as f:
+                self.latency = json.load(f)
+        except (OSError, ValueError):
+            self.latency = {}
+
+    def get(self, uid: str) -> Optional[float]:
+        return self.latency.get(uid)
+
+    def record(self, uid: str, seconds: float):
+        previous = self.latency.get(uid)
+        if previous is None:
+            self.latency[uid] = seconds
+        else:
+            self.latency[uid] = LATENCY_ALPHA * seconds + (1 - LATENCY_ALPHA) * previous
+        self.changed = True
+
+    def save(self):
+        if not self.changed:
+            return
+
+        with locked(self.path):
+            # Keep samples other processes recorded for sources we did not use.
+            try:
+                with open(self.path) as f:
+                    latency = json.load(f)
+            except (OSError, ValueError):
+                latency = {}
+            latency.update(self.latency)
+            write_atomic(self.path, [json.dumps(latency, sort_keys=True).encode()])
+        self.changed = False
+
+
+class QueryPlanner(object):
+    """Groups (lookup, key) tasks into cost tiers.
+
+    A source's tier is taken from `tier` in its extra config, otherwise from
+    its measured latency, otherwise from its type default. Sources which
+    declare tags disjoint from the requested ones are dropped.
+    """
+
+    def __init__(self, stats: LatencyStats = None):
+        self.stats = stats
+        # Sources already warned about an unknown tier.
+        self.warned: Set[str] = set()
+
+    def tier(self, lut: Lookup) -> CostTier:
+        configured = lut.extra.get("tier")
+        if configured is not None:
+            try:
+                return CostTier.parse(configured)
+            except (KeyError, TypeError, ValueError):
+                if lut.source not in self.warned:
+                    self.warned.add(lut.source)
+                    out_warn(f"{lut.source}: unknown tier '{configured}', ignored.")
+
+        measured = self.stats.get(lut.uid()) if self.stats else None
+        if measured is not None:
+            return CostTier.from_latency(measured)
+
+        return lut.cost_tier
+
+    def can_match(self, lut: Lookup, tags: Optional[Collection[str]]) -> bool:
+        if not tags:
+            return True
+        declared = lut.declared_tags()
+        return declared is None or not declared.isdisjoint(tags)
+
+    def plan(
+        self, tasks: Iterable[Tuple[int, Lookup, str]], tags: Collection[str] = None
+    ) -> List[List[Tuple[int, Lookup, str]]]:
+        """Returns the tasks worth running, grouped by tier, cheapest first."""
+        tiers = defaultdict(list)
+        for task in tasks:
+            lut = task[1]
+            if self.can_match(lut, tags):
+                tiers[self.tier(lut)].append(task)
+        return [tiers[tier] for tier in sorted(tiers)]
@@ -30,13 +30,15 @@ from typing import (
 )
 
 class LookupTimeAndDate(Lookup):
+    static_tags = frozenset({"timezone"})
+
     def validate(self):
         self.valid = is_url_valid(self.source)
 
     def find_direct(self, key: str) -> List[Result]:
         key = key.casefold()
 
-        r = requests.get(f"{self.source}{key}")
+        r = self.get(f"{self.source}{key}")
         if r.status_code != 200:
             return []
 
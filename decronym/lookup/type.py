@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
 
-from enum import Enum
+from enum import Enum, IntEnum
 
 class LookupType(Enum):
     JSON_FILE = "json_file"
@@ -10,6 +10,33 @@ class LookupType(Enum):
     ISO_CURRENCY = "iso_currency"
     CONFLUENCE_TABLE = "confluence_table"
     WIKIPEDIA = "wikipedia"
+    TZDATA = "tzdata"
+    JSON_SHARDED = "json_sharded"
 
     def __deepcopy__(self, _):
         return self.value
+
+
+class CostTier(IntEnum):
+    """Rough cost of asking a source, cheaper tiers are queried first."""
+
+    MEMORY = 0
+    LOCAL_FILE = 1
+    LOCAL_DIR = 2
+    REMOTE = 3
+
+    @classmethod
+    def parse(cls, value) -> "CostTier":
+        if isinstance(value, str):
+            return cls[value.upper()]
+        return cls(value)
+
+    @classmethod
+    def from_latency(cls, seconds: float) -> "CostTier":
+        if seconds < 0.001:
+            return cls.MEMORY
+        if seconds < 0.02:
+            return cls.LOCAL_FILE
+        if seconds < 0.2:
+            return cls.LOCAL_DIR
+        return cls.REMOTE
@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+from .base import Lookup
+from .type import LookupType, CostTier
+from .timezone import LookupTimeAndDate
+from ..result import Result, decode_results, encode_result
+from ..index import stat_fingerprint
+from ..fetch import SourceError
+from ..util import *
+from pkg_resources import resource_filename
+import datetime
+import json
+import os
+
+try:
+    import zoneinfo
+except ImportError:  # Python < 3.9
+    zoneinfo = None
+
+from typing import (
+    Any,
+    Callable,
+    Collection,
+    Dict,
+    Generator,
+    Generic,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Pattern,
+    Sequence,
+    Set,
+    Sized,
+    Tuple,
+    Type,
+    TypeVar,
+    Union,
+    cast,
+    TYPE_CHECKING,
+)
+
+# Bump when the layout of the generated index changes.
+TZ_INDEX_VERSION = 2
+# Abbreviations are sampled in January and July of every year since.
+TZ_FIRST_YEAR = 2000
+# Zone names listed in the comment of a result.
+TZ_MAX_ZONES = 5
+
+
+def tz_abbreviation_table() -> Dict[str, List[str]]:
+    """Curated abbreviation to full name table shipped with the package."""
+    with open(resource_filename("decronym", "tz_abbreviations.json")) as f:
+        return json.load(f)
+
+
+def tz_abbreviations(tzpath: str) -> Dict[str, Set[str]]:
+    """Maps every alphabetic abbreviation in the tz database to its zones."""
+    now = datetime.datetime.now(datetime.timezone.utc)
+    samples = [
+        datetime.datetime(year, month, 15, tzinfo=datetime.timezone.utc)
+        for year in range(TZ_FIRST_YEAR, now.year + 1)
+        for month in (1, 7)
+    ]
+
+    abbreviations = {}
+    for dir, dirs, files in os.walk(tzpath):
+        if os.path.relpath(dir, tzpath).split(os.sep)[0] in ("posix", "right"):
+            dirs[:] = []
+            continue
+
+        for file in files:
+            fullpath = os.path.join(dir, file)
+            name = os.path.relpath(fullpath, tzpath)
+            try:
+                with open(fullpath, "rb") as f:
+                    if f.read(4) != b"TZif":
+                        continue
+                    f.seek(0)
+                    zone = zoneinfo.ZoneInfo.from_file(f, key=name)
+            except (OSError, ValueError):
+                continue
+
+            for sample in samples:
+                abbreviation = sample.astimezone(zone).tzname()
+                # Skip numeric abbreviations such as "+03".
+                if abbreviation and abbreviation[0].isalpha():
+                    abbreviations.setdefault(abbreviation, set()).add(name)
+
+    return abbreviations
+
+
+class LookupTzData(Lookup):
+    """Time zone abbreviations derived from the system tz database.
+
+    The abbreviation index is built on first use and stored next to the
+    cache, it is rebuilt whenever the tz database changes. Source is a
+    zoneinfo directory or "system" for the first one on zoneinfo.TZPATH.
+    Only abbreviations with a curated full name are indexed, the tz database
+    lists their zones. Abbreviations missing from the index, or every one of
+    them where zoneinfo is not available (Python < 3.9), are looked up on the
+    timeanddate.com style URL given as "fallback" in extra, if any.
+    """
+
+    cost_tier = CostTier.LOCAL_FILE
+    static_tags = frozenset({"timezone"})
+
+    def __init__(self, source: str, enabled: bool = True, config=None, extra: Dict = None):
+        super().__init__(source=source, enabled=enabled, config=config, extra=extra)
+        self.index_ = None
+
+    def tzpath(self) -> Optional[str]:
+        if self.source != "system":
+            return self.source
+        if zoneinfo is None:
+            return None
+        for candidate in zoneinfo.TZPATH:
+            if os.path.isdir(candidate):
+                return candidate
+        return None
+
+    def indexable(self) -> bool:
+        tzpath = self.tzpath()
+        return zoneinfo is not None and tzpath is not None and os.path.isdir(tzpath)
+
+    def validate(self):
+        self.valid = self.indexable() or bool(self.extra.get("fallback"))
+
+    def index_path(self) -> str:
+        return os.path.join(get_cache_dir(), f"{self.uid()}.tz.json")
+
+    def index_fingerprint(self) -> List:
+        tzpath = self.tzpath() or ""
+        version = os.path.join(tzpath, "tzdata.zi")
+        return (
+            [TZ_INDEX_VERSION]
+            + stat_fingerprint(version if os.path.isfile(version) else tzpath)
+            + stat_fingerprint(resource_filename("decronym", "tz_abbreviations.json"))
+        )
+
+    def build_index(self) -> Dict[str, List[Result]]:
+        table = tz_abbreviation_table()
+        zones = tz_abbreviations(self.tzpath())
+
+        index = {}
+        for abbreviation in sorted(table):
+            # Prefer region/city names over legacy aliases such as "GB".
+            names = sorted(zones.get(abbreviation, ()), key=lambda n: ("/" not in n, n))
+            comment = ""
+            if names:
+                comment = f"Used by {', '.join(names[:TZ_MAX_ZONES])}"
+                if len(names) > TZ_MAX_ZONES:
+                    comment += f" and {len(names) - TZ_MAX_ZONES} more"
+
+            index[abbreviation.casefold()] = [
+                Result(
+                    acronym=abbreviation,
+                    full=full,
+                    source=self.source,
+                    comment=comment,
+                    tags=["timezone"],
+                )
+                for full in table[abbreviation]
+            ]
+        return index
+
+    def index(self) -> Dict[str, List[Result]]:
+        if self.index_ is not None:
+            return self.index_
+        if not self.indexable():
+            self.index_ = {}
+            return self.index_
+
+        fingerprint = self.index_fingerprint()
+        try:
+            with open(self.index_path()) as f:
+                stored = json.load(f)
+            if stored["fingerprint"] == fingerprint:
+                self.index_ = {
+                    key: decode_results(items) for key, items in stored["index"].items()
+                }
+                return self.index_
+        except (OSError, ValueError, KeyError):
+            pass
+
+        self.index_ = self.build_index()
+        encoded = json.dumps(
+            {
+                "fingerprint": fingerprint,
+                "index": {
+                    key: [encode_result(r) for r in items]
+                    for key, items in self.index_.items()
+                },
+            }
+        ).encode()
+        write_atomic(self.index_path(), [encoded])
+        return self.index_
+
+    def source_fingerprint(self) -> Optional[List]:
+        # With a fallback the index does not know every answerable key.
+        if self.extra.get("fallback"):
+            return None
+        return self.index_fingerprint()
+
+    def known_keys(self) -> Optional[Iterable[str]]:
+        if self.extra.get("fallback"):
+            return None
+        return self.index().keys()
+
+    def local_results(self) -> Iterator[Result]:
+        for items in self.index().values():
+            yield from items
+
+    def find_direct(self, key: str) -> List[Result]:
+        return self.find_direct_many([key])[key.casefold()]
+
+    def find_direct_many(self, keys: Iterable[str]) -> Dict[str, List[Result]]:
+        index = self.index()
+        results = {key.casefold(): list(index.get(key.casefold(), [])) for key in keys}
+        missing = [key for key, items in results.items() if not items]
+        if not missing or not self.extra.get("fallback"):
+            return results
+
+        fallback = LookupTimeAndDate(self.extra["fallback"], config=self.config)
+        fallback.deadline = self.deadline
+        try:
+            results.update(fallback.find_direct_many(missing))
+        except SourceError as e:
+            if len(missing) == len(results):
+                raise
+            # The abbreviations found in the index still stand.
+            out_warn(f"{self.source}: fallback {fallback.source} failed, {e}")
+        return results
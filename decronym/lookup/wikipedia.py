@@ -34,12 +34,20 @@ from typing import (
 
 
 class LookupWikipedia(Lookup):
+    static_tags = frozenset({"wiki"})
+
+    def declared_tags(self) -> Optional[Set[str]]:
+        tags = super().declared_tags()
+        if tags is not None and self.config is not None and "tags" not in self.extra:
+            tags |= set(self.config.get_tag_map().values())
+        return tags
+
     def validate(self):
         self.valid = is_url_valid(self.source)
 
     def find_direct(self, key: str):
         key = key.casefold()
-        r = requests.get(f"{self.source}{key.upper()}")
+        r = self.get(f"{self.source}{key.upper()}")
         if r.status_code != 200:
             return []
 
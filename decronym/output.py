@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+import json
+import sys
+
+from .result import Result, encode_result
+from .util import *
+
+from typing import (
+    Any,
+    Callable,
+    Collection,
+    Dict,
+    Generator,
+    Generic,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Pattern,
+    Sequence,
+    Set,
+    Sized,
+    Tuple,
+    Type,
+    TypeVar,
+    Union,
+    cast,
+    TYPE_CHECKING,
+)
+
+_encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+
+
+class Formatter(object):
+    """Writes the matches of each requested key to a stream.
+
+    `write` is called for every requested key, with an empty list if the key
+    has no matches.
+
+    Everything produced for one key is joined and written with a single
+    call, the stream is flushed per key so results still appear as soon as a
+    key completes.
+    """
+
+    def __init__(self, stream=None):
+        self.stream = stream if stream is not None else sys.stdout
+
+    def format(self, key: str, results: List[Result]) -> Iterable[str]:
+        raise NotImplementedError
+
+    def write(self, key: str, results: List[Result]):
+        self.stream.write("".join(self.format(key, results)))
+        self.stream.flush()
+
+    def close(self):
+        self.stream.flush()
+
+
+class PrettyFormatter(Formatter):
+    """Styled output for terminals, the key itself goes to stderr."""
+
+    def write(self, key: str, results: List[Result]):
+        if results:
+            out_success(key)
+            super().write(key, results)
+
+    def format(self, key: str, results: List[Result]) -> Iterable[str]:
+        for r in results:
+            yield r.pretty()
+            yield "\n"
+
+
+class NdjsonFormatter(Formatter):
+    """One JSON object per result and line, with the requested key as "query"."""
+
+    def format(self, key: str, results: List[Result]) -> Iterable[str]:
+        for r in results:
+            item = {"query": key}
+            item.update(encode_result(r))
+            yield _encoder.encode(item)
+            yield "\n"
+
+
+class JsonFormatter(Formatter):
+    """A single JSON object mapping every key to its results."""
+
+    def __init__(self, stream=None):
+        super().__init__(stream)
+        self.started = False
+
+    def format(self, key: str, results: List[Result]) -> Iterable[str]:
+        yield "," if self.started else "{"
+        self.started = True
+        yield _encoder.encode(key)
+        yield ":"
+        yield _encoder.encode([encode_result(r) for r in results])
+
+    def close(self):
+        self.stream.write("}\n" if self.started else "{}\n")
+        super().close()
+
+
+def _tsv_field(text: str) -> str:
+    return text.replace("\t", " ").replace("\n", " ") if text else ""
+
+
+class TsvFormatter(Formatter):
+    """Tab separated query, acronym, full, comment, source and tags."""
+
+    def format(self, key: str, results: List[Result]) -> Iterable[str]:
+        for r in results:
+            yield "\t".join(
+                (
+                    _tsv_field(key),
+                    _tsv_field(r.acronym),
+                    _tsv_field(r.full),
+                    _tsv_field(r.comment),
+                    _tsv_field(r.source),
+                    _tsv_field(",".join(r.tags or ())),
+                )
+            )
+            yield "\n"
+
+
+FORMATTERS = {
+    "pretty": PrettyFormatter,
+    "json": JsonFormatter,
+    "ndjson": NdjsonFormatter,
+    "tsv": TsvFormatter,
+}
+
+
+def get_formatter(name: str, stream=None) -> Formatter:
+    return FORMATTERS[name](stream)
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+import dataclasses
+import heapq
+
+from .result import Result
+from .util import *
+
+from typing import (
+    Any,
+    Callable,
+    Collection,
+    Dict,
+    Generator,
+    Generic,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Pattern,
+    Sequence,
+    Set,
+    Sized,
+    Tuple,
+    Type,
+    TypeVar,
+    Union,
+    cast,
+    TYPE_CHECKING,
+)
+
+# Score added per level of source priority and per matching tag.
+PRIORITY_WEIGHT = 1.0
+TAG_WEIGHT = 2.0
+
+
+def source_priority(luts: Sequence, id: Optional[int]) -> float:
+    """Sources listed first in the config rank higher, unless `priority` is
+    set in their extra config."""
+    if id is None:
+        return 0
+    return luts[id].extra.get("priority", len(luts) - id)
+
+
+SOURCE_SEPARATOR = ", "
+
+
+def merge_sources(
+    groups: Iterable[Tuple[Any, Iterable[Result]]]
+) -> Tuple[List[Result], Dict[Result, Any]]:
+    """Collapses equal results found by several sources.
+
+    `groups` are (source id, results) pairs in priority order. Each distinct
+    result is kept once, at the position of its first occurrence, with the
+    sources and tags of all its copies. Returns the merged results and the
+    id of the source each one was first found in.
+    """
+    merged: Dict[Result, Result] = {}
+    origin: Dict[Result, Any] = {}
+    sources: Dict[Result, Dict[str, None]] = {}
+    tags: Dict[Result, Dict[str, None]] = {}
+    for id, results in groups:
+        for r in results:
+            if r not in merged:
+                merged[r] = r
+                origin[r] = id
+                sources[r] = {}
+                tags[r] = {}
+            if r.source:
+                sources[r][r.source] = None
+            tags[r].update(dict.fromkeys(r.tags or ()))
+
+    out = []
+    for r in merged.values():
+        source = SOURCE_SEPARATOR.join(sources[r])
+        tag_list = list(tags[r])
+        if source != (r.source or "") or tag_list != list(r.tags or ()):
+            r = dataclasses.replace(r, source=source, tags=tag_list)
+        out.append(r)
+    return out, origin
+
+
+def score(
+    result: Result,
+    priority: float = 0,
+    tags: Collection[str] = None,
+) -> float:
+    value = PRIORITY_WEIGHT * priority
+    if tags:
+        value += TAG_WEIGHT * len(set(result.tags or ()) & set(tags))
+    return value
+
+
+def top_k(
+    results: Sequence[Result],
+    k: int,
+    priority: Callable[[Result], float] = None,
+    tags: Collection[str] = None,
+) -> List[Result]:
+    """The k best scored results, ties keep their original order."""
+    scored = (
+        (score(r, priority(r) if priority else 0, tags), -i, r)
+        for i, r in enumerate(results)
+    )
+    return [r for _, _, r in heapq.nlargest(k, scored, key=lambda item: item[:2])]
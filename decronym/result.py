@@ -1,13 +1,19 @@
 # -*- coding: utf-8 -*-
 import hashlib
 import os
+import sys
 from jsonschema import validate, ValidationError
+from jsonschema.validators import validator_for
 from dataclasses import dataclass, field
 import dataclasses, json
 from dataclasses_json import dataclass_json
+import marshmallow
 import click
 from lxml import etree
+import itertools
 import textwrap
+from .jsonstream import iter_json_file
+from .util import locked, write_atomic
 from typing import (
     Any,
     Callable,
@@ -55,6 +61,16 @@ CACHE_JSON_SCHEMA = {
 }
 
 
+_validator = None
+
+
+def _cache_validator():
+    global _validator
+    if _validator is None:
+        _validator = validator_for(CACHE_JSON_SCHEMA)(CACHE_JSON_SCHEMA)
+    return _validator
+
+
 @dataclass_json
 @dataclass(unsafe_hash=True)
 class Result(object):
@@ -65,13 +81,15 @@ class Result(object):
     tags: List[str] = field(default_factory=list, compare=False)
 
     def pretty(self):
-        out = "\t"
-        for letter in self.full:
-            if letter.isupper():
-                out += click.style(letter, bold=True, fg="green")
+        # One style call per run of upper or lower case letters.
+        parts = ["\t"]
+        for upper, run in itertools.groupby(self.full, str.isupper):
+            if upper:
+                parts.append(click.style("".join(run), bold=True, fg="green"))
             else:
-                out += click.style(letter, bold=True)
-        out += "\n"
+                parts.append(click.style("".join(run), bold=True))
+        parts.append("\n")
+        out = "".join(parts)
 
         if self.comment:
             lines = textwrap.wrap(self.comment)
@@ -87,6 +105,137 @@ class Result(object):
 
         return out
 
+    def compact(self) -> "CompactResult":
+        return CompactResult.from_result(self)
+
+
+_tag_tuples: Dict[Tuple[str, ...], Tuple[str, ...]] = {}
+
+
+def intern_tags(tags: Iterable[str]) -> Tuple[str, ...]:
+    """Returns a shared tuple for the given tags.
+
+    Results with the same tags all reference one tuple (of interned strings)
+    instead of carrying a list each.
+    """
+    key = tuple(sys.intern(tag) for tag in tags)
+    return _tag_tuples.setdefault(key, key)
+
+
+class CompactResult(object):
+    """Memory friendly, immutable counterpart of Result.
+
+    Uses slots instead of a per instance dict, interns the source string and
+    shares tag tuples between instances. Equality and hashing follow Result,
+    only acronym, full and comment are compared, so the two can be mixed in
+    sets and dedupe against each other.
+    """
+
+    __slots__ = ("acronym", "full", "comment", "source", "tags")
+
+    def __init__(
+        self,
+        acronym: str,
+        full: str,
+        comment: str = "",
+        source: str = "",
+        tags: Iterable[str] = (),
+    ):
+        init = object.__setattr__
+        init(self, "acronym", acronym)
+        init(self, "full", full)
+        init(self, "comment", comment)
+        init(self, "source", sys.intern(source))
+        init(self, "tags", intern_tags(tags))
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __reduce__(self):
+        return (
+            CompactResult,
+            (self.acronym, self.full, self.comment, self.source, self.tags),
+        )
+
+    def _key(self):
+        return (self.acronym, self.full, self.comment)
+
+    def __eq__(self, other):
+        if isinstance(other, (CompactResult, Result)):
+            return self._key() == (other.acronym, other.full, other.comment)
+        return NotImplemented
+
+    def __hash__(self):
+        # Same as the dataclass generated hash of Result.
+        return hash(self._key())
+
+    def __repr__(self):
+        return (
+            f"CompactResult(acronym={self.acronym!r}, full={self.full!r}, "
+            f"comment={self.comment!r}, source={self.source!r}, tags={self.tags!r})"
+        )
+
+    @classmethod
+    def from_result(cls, result: Result) -> "CompactResult":
+        return cls(
+            result.acronym, result.full, result.comment, result.source, result.tags
+        )
+
+    def to_result(self) -> Result:
+        return Result(self.acronym, self.full, self.comment, self.source, list(self.tags))
+
+    def compact(self) -> "CompactResult":
+        return self
+
+    def pretty(self):
+        return self.to_result().pretty()
+
+
+def _tag_list(tags) -> List[str]:
+    # A single tag given as a string is one tag, not one per character.
+    if isinstance(tags, str):
+        return [tags]
+    return list(tags)
+
+
+def decode_results(items: List[Dict], strict: bool = False) -> List[Result]:
+    """Builds Results from their JSON representation.
+
+    By default Results are constructed directly from the known fields. With
+    strict set every field is validated by the dataclasses_json schema, which
+    is considerably slower.
+
+    Raises:
+        ValidationError: If an item is missing a required field.
+    """
+    if strict:
+        try:
+            return Result.schema().load(items, many=True)
+        except marshmallow.ValidationError as e:
+            raise ValidationError(f"Invalid result entry, {e.messages}")
+
+    try:
+        results = [
+            Result(
+                item["acronym"],
+                item["full"],
+                item.get("comment", ""),
+                item.get("source", ""),
+                _tag_list(item.get("tags", ())),
+            )
+            for item in items
+        ]
+    except (KeyError, TypeError, AttributeError) as e:
+        raise ValidationError(f"Invalid result entry, missing {e}")
+
+    for r in results:
+        if not isinstance(r.acronym, str) or not isinstance(r.full, str):
+            raise ValidationError(f"Invalid result entry {r}")
+    return results
+
 
 class EnhancedJSONEncoder(json.JSONEncoder):
     def default(self, o):
@@ -95,82 +244,248 @@ class EnhancedJSONEncoder(json.JSONEncoder):
         return super().default(o)
 
 
+COMPACT_THRESHOLD = 1 << 18
+
+
+def encode_result(result: Result) -> Dict:
+    return {
+        "acronym": result.acronym,
+        "full": result.full,
+        "comment": result.comment,
+        "source": result.source,
+        "tags": list(result.tags),
+    }
+
+
+def read_journal(
+    path: str, start: int = 0, end: int = None, strict: bool = False
+) -> List[Result]:
+    """Decodes the results a cache journal holds between two offsets,
+    skipping lines torn by a crashed writer."""
+    try:
+        with open(path, "rb") as f:
+            f.seek(start)
+            data = f.read() if end is None else f.read(max(end - start, 0))
+    except OSError:
+        return []
+
+    results = []
+    for line in data.split(b"\n"):
+        if not line.strip():
+            continue
+        try:
+            results += decode_results([json.loads(line)], strict)
+        except (ValueError, ValidationError):
+            continue
+    return results
+
+
 class ResultCache:
-    """Caches results and saves/loads to a file."""
+    """Caches results and saves/loads to a file.
 
-    def __init__(self, path: str = ""):
-        self.cache_: Dict[str, Result] = DefaultDict(list)
+    New results are appended to a journal next to the cache file, the journal
+    is folded back into the cache file once it grows past the size of the
+    cache (or COMPACT_THRESHOLD). All file access is serialised with an
+    advisory lock so concurrent processes merge their entries.
+
+    Entries are held as CompactResult, lookups hand out plain Results.
+    """
+
+    def __init__(self, path: str = "", strict: bool = False):
+        self.cache_: Dict[str, List[CompactResult]] = DefaultDict(list)
+        # Companion sets for O(1) membership checks, built on first add to a key.
+        self.seen_: Dict[str, Set[CompactResult]] = {}
+        # Results added since the last save.
+        self.pending_: List[CompactResult] = []
         self.path = path
-        self.md5 = None
+        self.strict = strict
         self.load()
 
     def __del__(self):
         self.save()
 
+    def journal_path(self, path=None) -> str:
+        return f"{path or self.path}.journal"
+
     def load(self, path=None):
         if not path:
             path = self.path
 
-        if os.path.isfile(path) and path.endswith(".json"):
-            with click.open_file(path) as f:
-                # json_data = json.load(f)
-                raw = f.read()
-                dhash = hashlib.md5()
-                dhash.update(raw.encode())
+        if not (path and path.endswith(".json")):
+            return
+
+        with locked(path, exclusive=False):
+            loaded = self._read(path)
+            if loaded is None:
+                return
+            self.cache_.update(loaded)
+            self._replay(path)
 
-                try:
-                    json_data = json.loads(raw)
-                    validate(instance=json_data, schema=CACHE_JSON_SCHEMA)
-                except ValidationError as e:
-                    print(e)
-                    return 
+    def _read(self, path) -> Optional[Dict[str, List[CompactResult]]]:
+        if not os.path.isfile(path):
+            return {}
 
-                self.md5 = dhash.digest()
-                for key, items in json_data.items():
-                    self.cache_[key.casefold()] = Result.schema().load(items, many=True)
+        # Entries are validated and decoded one at a time as the file
+        # streams in, nothing is kept if any of them is invalid.
+        loaded = {}
+        try:
+            for key, items in iter_json_file(path):
+                if self.strict:
+                    _cache_validator().validate({key: items})
+                loaded[key.casefold()] = [
+                    r.compact() for r in decode_results(items, self.strict)
+                ]
+        except ValidationError as e:
+            print(e)
+            return None
+        return loaded
+
+    def _replay(self, path):
+        self._add(read_journal(self.journal_path(path), strict=self.strict))
 
     def save(self, path=None):
-        """ Writes Lookup data to cache file """
-        if not self.cache_:
-            # empty, nothing to do
+        """ Appends results added since the last save to the journal. """
+        if not self.pending_:
+            # nothing new, nothing to do
             return
-            
+
         if not path:
             path = self.path
 
-        encoded = json.dumps(
-            self.cache_, cls=EnhancedJSONEncoder, sort_keys=True
+        if not path:
+            return
+
+        encoded = "".join(
+            json.dumps(encode_result(item)) + "\n" for item in self.pending_
         ).encode()
-        dhash = hashlib.md5()
-        dhash.update(encoded)
 
-        if self.md5 == dhash.digest():
-            # hash unchanged, skip
-            return
+        with locked(path):
+            journal = self.journal_path(path)
+            with open(journal, "a+b") as f:
+                if f.seek(0, os.SEEK_END):
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        # A crashed writer left a torn line, start a new one
+                        # so only that line is lost on replay.
+                        encoded = b"\n" + encoded
+                f.write(encoded)
+            self.pending_ = []
 
-        directory = os.path.dirname(path)
-        if not os.path.exists(directory):
-            os.makedirs(directory)
+            base_size = os.path.getsize(path) if os.path.isfile(path) else 0
+            if os.path.getsize(journal) > max(COMPACT_THRESHOLD, base_size):
+                self._compact(path)
 
-        with click.open_file(path, mode="bw+") as f:
-            f.write(encoded)
+    def compact(self, path=None):
+        """ Folds the journal and any unsaved results into the cache file. """
+        if not path:
+            path = self.path
 
-    def add(self, items):
+        with locked(path):
+            self._compact(path)
+
+    def _compact(self, path):
+        # Merge with what is on disk, other processes may have added entries.
+        merged = ResultCache(strict=self.strict)
+        merged.cache_.update(self._read(path) or {})
+        merged._replay(path)
+        for items in self.cache_.values():
+            merged._add(items)
+        self.pending_ = []
+
+        encoded = json.dumps(
+            {
+                key: [encode_result(item) for item in items]
+                for key, items in merged.cache_.items()
+                if items
+            },
+            sort_keys=True,
+        ).encode()
+        write_atomic(path, [encoded])
+
+        with open(self.journal_path(path), "w"):
+            pass
+
+    def _seen(self, key: str) -> Set[CompactResult]:
+        seen = self.seen_.get(key)
+        if seen is None:
+            seen = self.seen_[key] = set(self.cache_[key])
+        return seen
+
+    def _add(self, items: Iterable[Result]) -> List[CompactResult]:
+        added = []
         for item in items:
             key = item.acronym.casefold()
-            if item not in self.cache_[key]:
+            seen = self._seen(key)
+            if item not in seen:
+                item = item.compact()
+                seen.add(item)
                 self.cache_[key].append(item)
+                added.append(item)
+        return added
+
+    def _extend(self, key: str, items: Iterable[Result]) -> List[CompactResult]:
+        """Adds results under key, whatever their acronym."""
+        seen = self._seen(key)
+        added = []
+        for item in items:
+            if item not in seen:
+                item = item.compact()
+                seen.add(item)
+                added.append(item)
+        self.cache_[key] += added
+        return added
+
+    def get(self, key: str, tags: Collection[str] = None) -> List[Result]:
+        """ Results for key, only those carrying one of `tags` if given. """
+        if key not in self.cache_:
+            return []
+        if not tags:
+            return self[key]
+
+        tags = set(tags)
+        return [
+            item.to_result()
+            for item in self.cache_[key]
+            if not tags.isdisjoint(item.tags)
+        ]
+
+    def add(self, items: Iterable[Result]):
+        """Appends new results, keeping insertion order and skipping duplicates."""
+        self.pending_ += self._add(items)
+
+    def ingest(self, entries: Iterable[Tuple[str, Iterable[Result]]]):
+        """Bulk adds whole datasets given as (key, results) pairs.
+
+        Keys not cached yet are stored directly, without building their
+        companion sets, which makes loading a full dictionary linear.
+        """
+        for key, items in entries:
+            key = key.casefold()
+            if key in self.cache_:
+                self.pending_ += self._extend(key, items)
+            else:
+                # dict preserves order and drops duplicates
+                self.cache_[key] = [item.compact() for item in dict.fromkeys(items)]
+                self.pending_ += self.cache_[key]
+
+    def __contains__(self, key):
+        return key in self.cache_
 
     def __iter__(self):
         """ Returns the Iterator object """
         return iter(self.cache_)
 
-    def __getitem__(self, key):
-        return self.cache_[key]
+    def __getitem__(self, key) -> List[Result]:
+        return [item.to_result() for item in self.cache_[key]]
 
     def keys(self):
         return self.cache_.keys()
 
+    def items(self) -> Iterator[Tuple[str, List[CompactResult]]]:
+        """ Keys with their entries as stored, for readers that only
+        serialise them. """
+        return iter(self.cache_.items())
+
     @classmethod
-    def from_file(cls, path):
-        return cls(path=path)
\ No newline at end of file
+    def from_file(cls, path, strict: bool = False):
+        return cls(path=path, strict=strict)
\ No newline at end of file
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+import heapq
+import math
+import os
+import re
+import struct
+
+from .index import MappedIndex, write_table, pack_results, unpack_results
+from .result import Result
+from .util import *
+
+from typing import (
+    Any,
+    Callable,
+    Collection,
+    Dict,
+    Generator,
+    Generic,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Pattern,
+    Sequence,
+    Set,
+    Sized,
+    Tuple,
+    Type,
+    TypeVar,
+    Union,
+    cast,
+    TYPE_CHECKING,
+)
+
+TOKEN_REGEX = re.compile(r"[^\W_]+", re.UNICODE)
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Terms of the expansion count this many times more than terms of the comment.
+FULL_WEIGHT = 2
+
+# Keys of the two kinds of entries in the table.
+TERM_PREFIX = b"t:"
+DOC_PREFIX = b"d:"
+
+# doc id, term frequency, doc length
+_POSTING = struct.Struct("<IHH")
+_DOC_ID = struct.Struct(">I")
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_REGEX.findall(text.casefold())
+
+
+def document_terms(result: Result) -> List[str]:
+    return tokenize(result.full) * FULL_WEIGHT + tokenize(result.comment or "")
+
+
+class SearchIndex(MappedIndex):
+    """Inverted index over the expansions and comments of every source.
+
+    Postings are stored in a memory mapped sorted table so a query only reads
+    the postings of its own terms and decodes the best ranked documents.
+    Like PrefixIndex, `decronym search` builds it once for a set of sources
+    and `decronym compile` refreshes it, searches never rebuild it.
+    """
+
+    FILENAME = "search.bin"
+
+    def build(self, luts):
+        """Indexes the cached and local results of the given lookups."""
+        self.close()
+        fingerprint = self.fingerprint(luts)
+
+        docs = []
+        postings: Dict[str, List[Tuple[int, int, int]]] = {}
+        total_length = 0
+        for source_id, lut in enumerate(luts):
+            results = [r for _, items in lut.load_cache().items() for r in items]
+            try:
+                results += lut.local_results() or []
+            except (OSError, ValueError):
+                pass
+
+            for r in dict.fromkeys(results):
+                terms = document_terms(r)
+                if not terms:
+                    continue
+
+                doc_id = len(docs)
+                docs.append((source_id, r))
+                length = min(len(terms), 0xFFFF)
+                total_length += length
+                counts = {}
+                for term in terms:
+                    counts[term] = counts.get(term, 0) + 1
+                for term, count in counts.items():
+                    postings.setdefault(term, []).append(
+                        (doc_id, min(count, 0xFFFF), length)
+                    )
+
+        items = [
+            (TERM_PREFIX + term.encode(), b"".join(_POSTING.pack(*p) for p in plist))
+            for term, plist in postings.items()
+        ]
+        items += [
+            (DOC_PREFIX + _DOC_ID.pack(doc_id), pack_results([doc]))
+            for doc_id, doc in enumerate(docs)
+        ]
+        write_table(
+            self.path,
+            items,
+            meta={
+                "sources": [lut.uid() for lut in luts],
+                "fingerprint": fingerprint,
+                "documents": len(docs),
+                "average_length": total_length / len(docs) if docs else 0,
+            },
+        )
+
+    def search(self, phrase: str, limit: int = 10) -> List[Tuple[float, Result]]:
+        """Returns up to `limit` (score, result) pairs, best match first."""
+        if not self.open():
+            return []
+
+        count = self.table.meta["documents"]
+        average = self.table.meta["average_length"] or 1
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(phrase)):
+            raw = self.table.get(TERM_PREFIX + term.encode())
+            if raw is None:
+                continue
+
+            frequency = len(raw) // _POSTING.size
+            idf = math.log((count - frequency + 0.5) / (frequency + 0.5) + 1)
+            for doc_id, tf, length in _POSTING.iter_unpack(raw):
+                norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * length / average)
+                scores[doc_id] = scores.get(doc_id, 0) + idf * tf * (BM25_K1 + 1) / norm
+
+        best = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+        results = []
+        for doc_id, score in best:
+            raw = self.table.get(DOC_PREFIX + _DOC_ID.pack(doc_id))
+            _, result = unpack_results(raw)[0]
+            results.append((score, result))
+        return results
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import json
+import os
+from collections import defaultdict
+from urllib.parse import quote
+
+from .jsonstream import iter_json_file
+from .util import write_atomic
+
+from typing import (
+    Any,
+    Callable,
+    Collection,
+    Dict,
+    Generator,
+    Generic,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Pattern,
+    Sequence,
+    Set,
+    Sized,
+    Tuple,
+    Type,
+    TypeVar,
+    Union,
+    cast,
+    TYPE_CHECKING,
+)
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+# File of the shard with the empty prefix, "@" is always quoted in others.
+ROOT_SHARD = "@.json"
+
+
+def shard_file(prefix: str) -> str:
+    return f"{quote(prefix, safe='')}.json" if prefix else ROOT_SHARD
+
+
+def partition(keys: Iterable[str], max_entries: int) -> Dict[str, List[str]]:
+    """Splits keys into prefix groups of at most max_entries keys.
+
+    A group which is too large is split by the next character, a key equal
+    to the group's prefix stays in the group itself. Every key then lives in
+    the group with the longest prefix of it, see `shard_prefix`.
+    """
+    shards = {}
+    stack = [("", sorted(set(keys)))]
+    while stack:
+        prefix, group = stack.pop()
+        if len(group) <= max_entries:
+            if group:
+                shards[prefix] = group
+            continue
+
+        depth = len(prefix) + 1
+        children = defaultdict(list)
+        for key in group:
+            if len(key) < depth:
+                shards[prefix] = [key]
+            else:
+                children[key[:depth]].append(key)
+        stack.extend(children.items())
+    return shards
+
+
+def shard_prefix(shards: Collection[str], key: str) -> Optional[str]:
+    """The longest shard prefix of key, None if no shard can hold it."""
+    for end in range(len(key), -1, -1):
+        if key[:end] in shards:
+            return key[:end]
+    return None
+
+
+def encode_shard(entries: Dict[str, Any]) -> bytes:
+    return json.dumps(
+        entries, sort_keys=True, ensure_ascii=False, separators=(",", ":")
+    ).encode()
+
+
+def write_shards(entries: Dict[str, List[Dict]], outdir: str, max_entries: int) -> Dict:
+    """Writes entries as prefix shards plus a manifest into outdir."""
+    shards = {}
+    for prefix, keys in partition(entries, max_entries).items():
+        raw = encode_shard({key: entries[key] for key in keys})
+        path = shard_file(prefix)
+        write_atomic(os.path.join(outdir, path), [raw])
+        shards[prefix] = {
+            "path": path,
+            "sha256": hashlib.sha256(raw).hexdigest(),
+            "entries": len(keys),
+            "size": len(raw),
+        }
+
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "entries": len(entries),
+        "max_entries": max_entries,
+        "shards": shards,
+    }
+    write_atomic(
+        os.path.join(outdir, MANIFEST_NAME),
+        [json.dumps(manifest, sort_keys=True, separators=(",", ":")).encode()],
+    )
+    return manifest
+
+
+def shard_dictionary(path: str, outdir: str, max_entries: int) -> Dict:
+    """Shards the JSON dictionary at path, keys are case folded."""
+    entries: Dict[str, List[Dict]] = {}
+    for key, items in iter_json_file(path):
+        entries.setdefault(key.casefold(), []).extend(items)
+    return write_shards(entries, outdir, max_entries)
@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+import email.utils
+import multiprocessing as mp
+import time
+import click
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+from typing import (
+    Any,
+    Callable,
+    Collection,
+    Dict,
+    Generator,
+    Generic,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Pattern,
+    Sequence,
+    Set,
+    Sized,
+    Tuple,
+    Type,
+    TypeVar,
+    Union,
+    cast,
+    TYPE_CHECKING,
+)
+
+# Pause after a 429 which did not say for how long.
+DEFAULT_BACKOFF = 1.0
+# Longest single sleep while waiting, so deadlines are checked regularly.
+MAX_SLEEP = 0.25
+# Longest Retry-After waited out. Hosts asking for a longer pause fail the
+# request instead of blocking it.
+MAX_RETRY_AFTER = 5.0
+
+# Indices into HostLimiter.state
+_TOKENS, _UPDATED, _BLOCKED_UNTIL = range(3)
+
+
+class HostLimiter(object):
+    """Token bucket and in-flight cap for one host.
+
+    State lives in multiprocessing primitives so every worker process of a
+    pool, and every thread, shares one budget per host. `rate` is in requests
+    per second, None for no limit.
+    """
+
+    def __init__(self, rate: float = None, burst: int = None, max_in_flight: int = None):
+        self.limits = (rate, burst, max_in_flight)
+        self.rate = rate
+        self.burst = burst or max(1, int(rate or 1))
+        self.lock = mp.Lock()
+        self.state = mp.RawArray("d", [float(self.burst), time.time(), 0.0])
+        self.slots = mp.BoundedSemaphore(max_in_flight) if max_in_flight else None
+
+    def _reserve(self) -> float:
+        """Takes a token, returns 0, or the seconds to wait before retrying."""
+        with self.lock:
+            now = time.time()
+            state = self.state
+            if now < state[_BLOCKED_UNTIL]:
+                return state[_BLOCKED_UNTIL] - now
+            if self.rate is None:
+                return 0
+
+            state[_TOKENS] = min(
+                self.burst, state[_TOKENS] + (now - state[_UPDATED]) * self.rate
+            )
+            state[_UPDATED] = now
+            if state[_TOKENS] >= 1:
+                state[_TOKENS] -= 1
+                return 0
+            return (1 - state[_TOKENS]) / self.rate
+
+    def wait(self, deadline: Optional[float] = None) -> bool:
+        """Blocks until a request may be sent, False if the deadline passes
+        first or the host backed off for longer than MAX_RETRY_AFTER."""
+        while True:
+            delay = self._reserve()
+            if delay <= 0:
+                return True
+            if self.blocked_for() > MAX_RETRY_AFTER:
+                return False
+            if deadline is not None and time.time() + delay > deadline:
+                return False
+            time.sleep(min(delay, MAX_SLEEP))
+
+    def blocked_for(self) -> float:
+        """Seconds left of the current back off."""
+        with self.lock:
+            return max(self.state[_BLOCKED_UNTIL] - time.time(), 0)
+
+    def back_off(self, seconds: float):
+        """Sends nothing to the host for `seconds`."""
+        with self.lock:
+            self.state[_BLOCKED_UNTIL] = max(
+                self.state[_BLOCKED_UNTIL], time.time() + seconds
+            )
+
+    @contextmanager
+    def slot(self, deadline: Optional[float] = None):
+        """Holds one of the host's in-flight slots and a token, yields False
+        instead if the deadline passes while waiting."""
+        if self.slots is not None:
+            timeout = None if deadline is None else max(deadline - time.time(), 0)
+            if not self.slots.acquire(timeout=timeout):
+                yield False
+                return
+        try:
+            yield self.wait(deadline)
+        finally:
+            if self.slots is not None:
+                self.slots.release()
+
+
+_limiters: Dict[str, HostLimiter] = {}
+
+
+def host_of(url: str) -> Optional[str]:
+    return urlparse(url).hostname
+
+
+def _check_limit(lut, name: str, value):
+    # bool is an int, but "rate_limit": true is a mistake.
+    if name == "rate_limit":
+        valid = isinstance(value, (int, float)) and not isinstance(value, bool)
+        kind = "a positive number"
+    else:
+        valid = isinstance(value, int) and not isinstance(value, bool)
+        kind = "a positive integer"
+    if not valid or value <= 0:
+        raise click.UsageError(
+            f"Invalid \"{name}\" for {lut.source}: {value!r}, it must be {kind}."
+        )
+
+
+def configure(luts) -> Dict[str, HostLimiter]:
+    """Creates one limiter per host of the given lookups and installs them.
+
+    Limits come from "rate_limit" (requests per second), "burst" and
+    "max_in_flight" in a source's extra config. Sources sharing a host share
+    the strictest limits. Must run before worker processes are started, the
+    result is passed to them with `install`.
+
+    Raises:
+        click.UsageError: If a limit is not a positive number.
+    """
+    limits: Dict[str, Dict[str, Any]] = {}
+    for lut in luts:
+        for name in ("rate_limit", "burst", "max_in_flight"):
+            if lut.extra.get(name) is not None:
+                _check_limit(lut, name, lut.extra[name])
+        for url in (lut.source, lut.extra.get("fallback")):
+            host = host_of(url) if url else None
+            if not host:
+                continue
+            merged = limits.setdefault(host, {})
+            for name in ("rate_limit", "burst", "max_in_flight"):
+                value = lut.extra.get(name)
+                if value is not None:
+                    merged[name] = min(value, merged.get(name, value))
+
+    limiters = {}
+    for host, merged in limits.items():
+        wanted = tuple(merged.get(name) for name in ("rate_limit", "burst", "max_in_flight"))
+        limiter = _limiters.get(host)
+        # Keep existing limiters, and any back off they are in, if unchanged.
+        if limiter is None or limiter.limits != wanted:
+            limiter = HostLimiter(*wanted)
+        limiters[host] = limiter
+    install(limiters)
+    return limiters
+
+
+def install(limiters: Dict[str, HostLimiter]):
+    """Pool initializer, makes the limiters of the parent process current."""
+    _limiters.update(limiters)
+
+
+def renew(limiters: Dict[str, HostLimiter]):
+    """Replaces limiters shared with terminated workers, which may have been
+    killed holding their lock or an in-flight slot. Back offs carry over."""
+    for host, old in limiters.items():
+        if _limiters.get(host) is not old:
+            continue
+        limiter = HostLimiter(*old.limits)
+        # Read without the lock, a dead worker may still hold it.
+        limiter.state[_BLOCKED_UNTIL] = old.state[_BLOCKED_UNTIL]
+        _limiters[host] = limiter
+
+
+def limiter_for(url: str) -> Optional[HostLimiter]:
+    return _limiters.get(host_of(url))
+
+
+def retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds from a Retry-After header, given as seconds or an HTTP date."""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(when.timestamp() - time.time(), 0)
@@ -3,7 +3,10 @@ from typing import DefaultDict
 import requests
 import hashlib
 import os
+import fcntl
+import tempfile
 import click
+from contextlib import contextmanager
 from functools import partial
 from typing import (
     Any,
@@ -78,10 +81,66 @@ def is_url_online(input)-> bool:
         return False
 
 
+DURATION_REGEX = re.compile(r"^\s*(\d+(?:\.\d*)?|\.\d+)\s*(ms|s|m)?\s*$")
+_duration_units = {"ms": 0.001, "s": 1, "m": 60, None: 1}
+def parse_duration(value) -> float:
+    """Converts "800ms", "2s", "1.5m" or a plain number of seconds to seconds."""
+    if isinstance(value, (int, float)):
+        return float(value)
+
+    match = DURATION_REGEX.match(str(value))
+    if not match:
+        raise ValueError(f"Invalid duration '{value}'")
+    return float(match.group(1)) * _duration_units[match.group(2)]
+
+
 def get_cache_dir():
     return os.path.join(os.environ["HOME"], ".config/decronym", "cache")
 
 
+def write_atomic(path: str, data: Iterable[bytes]):
+    """Writes chunks to a temp file next to `path` and renames it into place.
+
+    Readers either see the old file or the new one, never a partial write.
+    """
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for chunk in data:
+                f.write(chunk)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+@contextmanager
+def locked(path: str, exclusive: bool = True):
+    """Holds an advisory lock on `path`.lock for the duration of the block.
+
+    Shared locks are for reading, if the directory of `path` does not exist
+    there is nothing to read and no lock is taken.
+    """
+    lock_path = f"{path}.lock"
+    directory = os.path.dirname(lock_path)
+    if directory and not os.path.exists(directory):
+        if not exclusive:
+            yield
+            return
+        os.makedirs(directory, exist_ok=True)
+
+    with open(lock_path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
 ACRONYM_REGEX = re.compile("^[a-zA-Z0-9\-]+$", re.UNICODE)
 def is_acronym_valid(input) -> bool:
     return bool(ACRONYM_REGEX.match(input))
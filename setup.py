@@ -24,6 +24,7 @@ setup(
     package_data={
         "decronym": [
             "config.json",
+            "tz_abbreviations.json",
         ]
     },
     classifiers=[
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+
+from .context import *
+from decronym.api import Decronym
+from decronym.breaker import CircuitBreaker
+from decronym.fetch import SourceOffline, SourceSkipped, SourceUnavailable
+from decronym.lookup.base import Lookup
+from decronym.lookup.planner import LatencyStats
+
+import asyncio
+import os
+import tempfile
+import time
+
+import unittest
+
+
+class BatchLookup(Lookup):
+    """Answers from a dict and counts how it was asked."""
+
+    def __init__(self, source, entries, tmp, extra=None):
+        super().__init__(source, extra=extra)
+        self.entries = entries
+        self.tmp = tmp
+        self.calls = []
+
+    def validate(self):
+        self.valid = True
+
+    def cache_path(self):
+        return os.path.join(self.tmp, f"{self.uid()}.json")
+
+    def bloom_path(self):
+        return os.path.join(self.tmp, f"{self.uid()}.bloom")
+
+    def find_direct_many(self, keys):
+        # Stands in for a network fetch, see fetch.get.
+        if not self.allow_network():
+            raise SourceSkipped(f"{self.source}: skipped")
+        self.calls.append(sorted(keys))
+        if "error" in self.extra:
+            raise self.extra["error"]
+        return {key: list(self.entries.get(key, [])) for key in keys}
+
+
+class ApiTestSuite(unittest.TestCase):
+    """Tests the asynchronous library interface """
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.a = BatchLookup("a", {
+            "dma": [Result("DMA", "Direct Memory Access", source="a", tags=["hw"])],
+        }, self.tmp.name)
+        self.b = BatchLookup("b", {
+            "dma": [
+                Result("DMA", "Digital Media Arts", source="b"),
+                Result("DMA", "Direct Memory Access", source="b", tags=["computing"]),
+            ],
+            "gmt": [Result("GMT", "Greenwich Mean Time", source="b")],
+        }, self.tmp.name)
+        self.api = self.decronym([self.a, self.b])
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def decronym(self, luts):
+        return Decronym(
+            luts=luts,
+            stats=LatencyStats(os.path.join(self.tmp.name, "latency.json")),
+            breaker=CircuitBreaker(os.path.join(self.tmp.name, "breaker.json")),
+        )
+
+    def test_lookup_many_batches_and_merges(self):
+        answers = asyncio.run(self.api.lookup_many(["DMA", "gmt", "xyz"]))
+        self.assertEqual(self.a.calls, [["dma", "gmt", "xyz"]])
+        self.assertEqual(self.b.calls, [["dma", "gmt", "xyz"]])
+
+        dma = answers["DMA"].results
+        self.assertEqual([r.full for r in dma], ["Direct Memory Access", "Digital Media Arts"])
+        self.assertEqual(dma[0].source, "a, b")
+        self.assertEqual(answers["gmt"].results[0].full, "Greenwich Mean Time")
+        self.assertEqual(answers["xyz"].results, [])
+
+        # answered from the caches the second time
+        asyncio.run(self.api.lookup_many(["dma"]))
+        self.assertEqual(len(self.a.calls), 1)
+
+    def test_tags(self):
+        answer = asyncio.run(self.api.lookup("dma", tags=["hw"]))
+        self.assertEqual([r.full for r in answer.results], ["Direct Memory Access"])
+        self.assertEqual([r.full for r in answer.filtered], ["Digital Media Arts"])
+
+    def test_reports_sources_like_the_cli(self):
+        down = BatchLookup("down", {}, self.tmp.name, extra={"error": SourceUnavailable("down")})
+        offline = BatchLookup("offline", {}, self.tmp.name, extra={"error": SourceOffline("offline")})
+        api = self.decronym([self.a, down, offline])
+
+        answer = asyncio.run(api.lookup("dma"))
+        self.assertEqual(answer.results[0].full, "Direct Memory Access")
+        self.assertEqual(answer.unavailable, ["down"])
+        self.assertEqual(answer.uncached, ["offline"])
+        self.assertEqual(answer.failed, [])
+        self.assertIsNotNone(api.stats.get(self.a.uid()))
+
+        # failing sources open their breaker and are skipped
+        for _ in range(2):
+            asyncio.run(api.lookup("gmt"))
+        self.assertEqual(len(down.calls), 3)
+        answer = asyncio.run(api.lookup("xyz"))
+        self.assertEqual(len(down.calls), 3)
+        self.assertEqual(answer.unavailable, ["down"])
+        self.assertEqual(api.breaker.state[down.uid()]["failures"], 3)
+
+    def test_failure_keeps_cached_hits(self):
+        asyncio.run(self.api.lookup("dma"))
+        self.b.extra["error"] = SourceUnavailable("down")
+
+        answers = asyncio.run(self.api.lookup_many(["dma", "gmt"]))
+        self.assertEqual(len(answers["dma"].results), 2)
+        self.assertEqual(answers["dma"].unavailable, [])
+        # only the key which needed the source itself reports the failure
+        self.assertEqual(answers["gmt"].results, [])
+        self.assertEqual(answers["gmt"].unavailable, ["b"])
+        self.assertEqual(self.b.calls[-1], ["gmt"])
+
+    def test_open_breaker_still_answers_from_cache(self):
+        asyncio.run(self.api.lookup("dma"))
+        for _ in range(3):
+            self.api.breaker.record_failure(self.b.uid())
+
+        answer = asyncio.run(self.api.lookup("dma"))
+        self.assertEqual(len(answer.results), 2)
+        self.assertEqual(answer.unavailable, [])
+        answer = asyncio.run(self.api.lookup("gmt"))
+        self.assertEqual(answer.results, [])
+        self.assertEqual(answer.unavailable, ["b"])
+        self.assertEqual(len(self.b.calls), 1)
+
+    def test_deadline(self):
+        answer = asyncio.run(self.api.lookup("dma", deadline=time.time() - 1))
+        self.assertEqual(answer.results, [])
+        self.assertEqual(answer.timed_out, ["a", "b"])
+        self.assertEqual(self.a.calls, [])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+
+from .context import *
+from decronym.bloom import BloomFilter
+
+import os
+import tempfile
+
+import unittest
+class BloomTestSuite(unittest.TestCase):
+    """Tests the bloom filter membership summaries """
+
+    def test_no_false_negatives(self):
+        keys = [f"k{i}" for i in range(1000)]
+        bloom = BloomFilter.from_keys(keys)
+        for key in keys:
+            self.assertIn(key, bloom)
+
+    def test_false_positive_rate(self):
+        bloom = BloomFilter.from_keys(f"k{i}" for i in range(1000))
+        false_positives = sum(f"x{i}" in bloom for i in range(10000))
+        self.assertLess(false_positives, 300)
+
+    def test_case_folded(self):
+        bloom = BloomFilter.from_keys(["DMA"])
+        self.assertIn("dma", bloom)
+
+    def test_save_load(self):
+        bloom = BloomFilter.from_keys(["dma", "gmt"])
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "x.bloom")
+            bloom.save(path, meta={"fingerprint": [1, 2]})
+            loaded, meta = BloomFilter.load(path)
+            self.assertEqual(meta, {"fingerprint": [1, 2]})
+            self.assertEqual(loaded.data, bloom.data)
+            self.assertIn("gmt", loaded)
+
+            self.assertEqual(BloomFilter.load(os.path.join(tmp, "missing")), (None, {}))
+
+if __name__ == "__main__":
+    unittest.main()
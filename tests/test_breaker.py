@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+
+from .context import *
+from decronym import breaker
+from decronym.breaker import CircuitBreaker
+
+import os
+import tempfile
+from unittest import mock
+
+import unittest
+
+
+class CircuitBreakerTestSuite(unittest.TestCase):
+    """Tests opening, probing and closing the breaker of a source """
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "breaker.json")
+        self.now = 1000.0
+        patcher = mock.patch.object(breaker.time, "time", lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def open_breaker(self):
+        b = CircuitBreaker(self.path)
+        for _ in range(3):
+            self.assertTrue(b.allow("a", threshold=3, cooldown=60))
+            b.record_failure("a")
+        return b
+
+    def test_opens_after_threshold(self):
+        b = self.open_breaker()
+        self.assertTrue(b.is_open("a", threshold=3))
+        self.assertFalse(b.allow("a", threshold=3, cooldown=60))
+        self.assertTrue(b.allow("other", threshold=3, cooldown=60))
+
+    def test_half_open_probe_success_closes(self):
+        b = self.open_breaker()
+        self.now += 61
+        # one probe, the next query waits for its outcome
+        self.assertTrue(b.allow("a", threshold=3, cooldown=60))
+        self.assertFalse(b.allow("a", threshold=3, cooldown=60))
+        b.record_success("a")
+        self.assertFalse(b.is_open("a", threshold=3))
+        self.assertTrue(b.allow("a", threshold=3, cooldown=60))
+
+    def test_one_probe_across_processes(self):
+        self.open_breaker()
+        self.now += 61
+        first, second = CircuitBreaker(self.path), CircuitBreaker(self.path)
+        self.assertTrue(first.allow("a", threshold=3, cooldown=60))
+        self.assertFalse(second.allow("a", threshold=3, cooldown=60))
+
+    def test_half_open_probe_failure_reopens(self):
+        b = self.open_breaker()
+        self.now += 61
+        self.assertTrue(b.allow("a", threshold=3, cooldown=60))
+        b.record_failure("a")
+        self.now += 30
+        self.assertFalse(b.allow("a", threshold=3, cooldown=60))
+        self.now += 31
+        self.assertTrue(b.allow("a", threshold=3, cooldown=60))
+
+    def test_state_persists(self):
+        self.open_breaker()
+        self.assertFalse(CircuitBreaker(self.path).allow("a", threshold=3, cooldown=60))
+
+        # updates merge with what other processes recorded
+        other = CircuitBreaker(self.path)
+        b = CircuitBreaker(self.path)
+        other.record_failure("b")
+        b.record_success("a")
+        state = CircuitBreaker(self.path).state
+        self.assertNotIn("a", state)
+        self.assertEqual(state["b"]["failures"], 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+
+from .context import *
+from decronym.result import CompactResult, ResultCache, decode_results
+
+import os
+import json
+import tempfile
+from jsonschema import ValidationError
+
+import unittest
+class ResultCacheTestSuite(unittest.TestCase):
+    """Tests decoding and persisting cached results """
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "cache.json")
+        self.items = [
+            {"acronym": "DMA", "full": "Direct Memory Access", "tags": ["hw"]},
+            {"acronym": "DMA", "full": "Digital Media Arts", "comment": "c", "source": "s"},
+        ]
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_fast_decode_matches_strict(self):
+        fast = decode_results(self.items)
+        strict = decode_results(self.items, strict=True)
+        self.assertEqual(fast, strict)
+        for a, b in zip(fast, strict):
+            self.assertEqual((a.source, a.tags, a.comment), (b.source, b.tags, b.comment))
+
+    def test_decode_missing_field(self):
+        with self.assertRaises(ValidationError):
+            decode_results([{"acronym": "DMA"}])
+        with self.assertRaises(ValidationError):
+            decode_results([{"acronym": 1, "full": "x"}])
+        # strict failures are reported as the same ValidationError
+        with self.assertRaises(ValidationError):
+            decode_results([{"acronym": "DMA"}], strict=True)
+
+    def test_decode_string_tags(self):
+        decoded = decode_results([{"acronym": "DMA", "full": "x", "tags": "hw"}])
+        self.assertEqual(decoded[0].tags, ["hw"])
+
+    def test_load(self):
+        with open(self.path, "w") as f:
+            json.dump({"DMA": self.items}, f)
+
+        for strict in (False, True):
+            with self.subTest(strict=strict):
+                cache = ResultCache(self.path, strict=strict)
+                self.assertIn("dma", cache)
+                self.assertEqual(len(cache["dma"]), 2)
+                self.assertEqual(cache["dma"][0].tags, ["hw"])
+    def test_add_dedupes_in_order(self):
+        cache = ResultCache(self.path)
+        results = decode_results(self.items)
+        cache.add(results + results[::-1])
+        cache.add([Result("DMA", "Direct Memory Access", source="other")])
+        self.assertEqual(cache["dma"], results)
+
+    def test_ingest(self):
+        cache = ResultCache(self.path)
+        a, b = decode_results(self.items)
+        cache.ingest([("DMA", [a, b, a]), ("GMT", [Result("GMT", "Greenwich Mean Time")])])
+        cache.ingest([("dma", [b, Result("DMA", "Dynamic Mechanical Analysis")])])
+        self.assertEqual(len(cache["dma"]), 3)
+        self.assertEqual(cache["dma"][:2], [a, b])
+        self.assertIn("gmt", cache)
+
+        # results are filed under the entry key, not under their acronym
+        alias = Result("D.M.A.", "Direct Memory Access Alias")
+        cache.ingest([("dma", [alias])])
+        self.assertEqual(cache["dma"][-1], alias)
+        self.assertNotIn("d.m.a.", cache)
+    def test_concurrent_writers_merge(self):
+        a = ResultCache(self.path)
+        b = ResultCache(self.path)
+        a.add([Result("DMA", "Direct Memory Access")])
+        b.add([Result("GMT", "Greenwich Mean Time")])
+        a.save()
+        b.save()
+        self.assertTrue(os.path.isfile(self.path + ".journal"))
+
+        c = ResultCache(self.path)
+        self.assertEqual(sorted(c.keys()), ["dma", "gmt"])
+
+        b.compact()
+        self.assertEqual(os.path.getsize(self.path + ".journal"), 0)
+        d = ResultCache(self.path)
+        self.assertEqual(sorted(d.keys()), ["dma", "gmt"])
+
+    def test_torn_journal_line(self):
+        a = ResultCache(self.path)
+        a.add([Result("DMA", "Direct Memory Access")])
+        a.save()
+        with open(self.path + ".journal", "ab") as f:
+            f.write('{"acronym": "GMT", "full": "Gr\u00fc'.encode()[:-1])
+
+        b = ResultCache(self.path)
+        b.add([Result("CET", "Central European Time")])
+        b.save()
+        c = ResultCache(self.path)
+        self.assertEqual(sorted(c.keys()), ["cet", "dma"])
+
+    def test_shared_load_creates_nothing(self):
+        path = os.path.join(self.tmp.name, "missing", "cache.json")
+        cache = ResultCache(path)
+        self.assertEqual(list(cache.keys()), [])
+        self.assertFalse(os.path.exists(os.path.dirname(path)))
+
+    def test_save_only_new_entries(self):
+        a = ResultCache(self.path)
+        a.add([Result("DMA", "Direct Memory Access")])
+        a.save()
+        size = os.path.getsize(self.path + ".journal")
+        a.save()
+        a.add([Result("DMA", "Direct Memory Access")])
+        a.save()
+        self.assertEqual(os.path.getsize(self.path + ".journal"), size)
+
+    def test_get_by_tags(self):
+        cache = ResultCache(self.path)
+        a, b = decode_results(self.items)
+        cache.add([a, b])
+        self.assertEqual(cache.get("dma"), [a, b])
+        self.assertEqual(cache.get("dma", ["hw", "x"]), [a])
+        self.assertEqual(cache.get("dma", ["x"]), [])
+        self.assertEqual(cache.get("gmt", ["hw"]), [])
+
+        # results added later are filtered the same way
+        c = Result("DMA", "Direct Mapped Access", tags=["hw"])
+        cache.add([c])
+        self.assertEqual(cache.get("dma", ["hw"]), [a, c])
+
+    def test_stored_compact(self):
+        with open(self.path, "w") as f:
+            json.dump({"dma": self.items[:1]}, f)
+        cache = ResultCache(self.path)
+        cache.add(decode_results(self.items[1:]))
+        cache.ingest([("GMT", [Result("GMT", "Greenwich Mean Time", tags=["tz"])])])
+
+        for key, items in cache.items():
+            for item in items:
+                self.assertIsInstance(item, CompactResult)
+        dma = cache["dma"]
+        self.assertEqual([type(r) for r in dma], [Result, Result])
+        self.assertEqual(dma[0].tags, ["hw"])
+        self.assertEqual(cache.get("gmt", ["tz"])[0].tags, ["tz"])
+
+if __name__ == "__main__":
+    unittest.main()
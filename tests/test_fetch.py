@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+
+from .context import *
+from decronym import fetch, throttle
+from decronym.fetch import SourceTimeout, SourceUnavailable
+from decronym.httpcache import HttpCache
+from decronym.util import parse_duration
+
+import http.server
+import os
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+
+import unittest
+
+
+class TrickleHandler(http.server.BaseHTTPRequestHandler):
+    """Sends a 20 byte body one byte every 50ms."""
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "20")
+        self.send_header("Cache-Control", "max-age=60")
+        self.end_headers()
+        try:
+            for _ in range(20):
+                self.wfile.write(b"x")
+                self.wfile.flush()
+                time.sleep(0.05)
+        except OSError:
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+class ThrottledHandler(http.server.BaseHTTPRequestHandler):
+    """Answers 429 with the Retry-After given in the path, counts requests."""
+
+    requests = 0
+
+    def do_GET(self):
+        ThrottledHandler.requests += 1
+        self.send_response(429)
+        self.send_header("Retry-After", self.path.strip("/"))
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class FetchTestSuite(unittest.TestCase):
+    """Tests deadlines of requests """
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), TrickleHandler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}/"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmp.cleanup()
+
+    def test_parse_duration(self):
+        self.assertEqual(parse_duration("800ms"), 0.8)
+        self.assertEqual(parse_duration("2s"), 2)
+        self.assertEqual(parse_duration("1.5m"), 90)
+        self.assertEqual(parse_duration(" .5 "), 0.5)
+        self.assertEqual(parse_duration("3"), 3)
+        self.assertEqual(parse_duration(3), 3.0)
+        for value in ("", "fast", "-1s", "2h", "1.2.3"):
+            with self.subTest(value=value):
+                with self.assertRaises(ValueError):
+                    parse_duration(value)
+
+    def test_deadline_bounds_body(self):
+        cache = HttpCache(os.path.join(self.tmp.name, "http"))
+        for kwargs in ({}, {"stream": True}, {"cache": cache}):
+            with self.subTest(**{k: bool(v) for k, v in kwargs.items()}):
+                start = time.time()
+                with self.assertRaises(SourceTimeout):
+                    r = fetch.get(self.url, deadline=start + 0.3, **kwargs)
+                    for _ in fetch.iter_body(r, start + 0.3):
+                        pass
+                self.assertLess(time.time() - start, 0.8)
+        # nothing half read was stored
+        self.assertIsNone(cache.lookup(self.url))
+
+    def test_body_within_deadline(self):
+        r = fetch.get(self.url, deadline=time.time() + 5)
+        self.assertEqual(r.content, b"x" * 20)
+
+    def test_long_retry_after_fails_fast(self):
+        server = http.server.HTTPServer(("127.0.0.1", 0), ThrottledHandler)
+        threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.addCleanup(throttle._limiters.clear)
+        url = f"http://127.0.0.1:{server.server_port}/"
+        throttle.configure([SimpleNamespace(source=url, extra={"rate_limit": 100})])
+
+        # short pauses are waited out and retried
+        ThrottledHandler.requests = 0
+        with self.assertRaises(SourceUnavailable):
+            fetch.get(url + "0")
+        self.assertEqual(ThrottledHandler.requests, fetch.MAX_RETRIES + 1)
+
+        # an hour is not, and later requests fail without waiting either
+        ThrottledHandler.requests = 0
+        start = time.time()
+        with self.assertRaises(SourceUnavailable):
+            fetch.get(url + "3600")
+        with self.assertRaises(SourceUnavailable):
+            fetch.get(url + "0")
+        self.assertEqual(ThrottledHandler.requests, 1)
+        self.assertLess(time.time() - start, 2)
+
+if __name__ == "__main__":
+    unittest.main()
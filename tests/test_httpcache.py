@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+
+from .context import *
+from decronym import fetch
+from decronym.fetch import SourceOffline, SourceSkipped
+from decronym.httpcache import HttpCache, CacheEntry
+
+import http.server
+import os
+import tempfile
+import threading
+import time
+
+import unittest
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    body = b'{"dma": []}'
+
+    def do_GET(self):
+        self.server.hits.append(self.path)
+        cache_control = "max-age=60" if self.path.startswith("/fresh") else "no-cache"
+        if self.headers.get("If-None-Match") == '"v1"':
+            self.send_response(304)
+            self.send_header("ETag", '"v1"')
+            self.end_headers()
+            return
+        self.send_response(200)
+        if not self.path.endswith("unsized"):
+            self.send_header("Content-Length", str(len(self.body)))
+        self.send_header("Cache-Control", cache_control)
+        self.send_header("ETag", '"v1"')
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    def log_message(self, *args):
+        pass
+
+
+class HttpCacheTestSuite(unittest.TestCase):
+    """Tests the on disk HTTP cache """
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = HttpCache(os.path.join(self.tmp.name, "http"))
+        self.server = http.server.HTTPServer(("127.0.0.1", 0), Handler)
+        self.server.hits = []
+        threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmp.cleanup()
+
+    def get(self, path, **kwargs):
+        r = fetch.get(self.url + path, cache=self.cache, **kwargs)
+        with r:
+            return r.content
+
+    def test_fresh_entry_skips_network(self):
+        self.assertEqual(self.get("/fresh"), Handler.body)
+        self.assertEqual(self.get("/fresh"), Handler.body)
+        self.assertEqual(self.server.hits, ["/fresh"])
+
+    def test_revalidates_stale_entry(self):
+        self.assertEqual(self.get("/stale"), Handler.body)
+        self.assertEqual(self.get("/stale", stream=True), Handler.body)
+        self.assertEqual(len(self.server.hits), 2)
+
+    def test_offline_serves_stale(self):
+        self.get("/stale")
+        self.assertEqual(self.get("/stale", offline=True), Handler.body)
+        self.assertTrue(fetch.get(self.url + "/stale", offline=True, cache=self.cache).stale)
+        self.get("/fresh")
+        self.assertFalse(fetch.get(self.url + "/fresh", offline=True, cache=self.cache).stale)
+        with self.assertRaises(SourceOffline):
+            self.get("/other", offline=True)
+
+    def test_closed_gate_only_blocks_the_network(self):
+        self.get("/fresh")
+        self.assertEqual(self.get("/fresh", allow=lambda: False), Handler.body)
+        with self.assertRaises(SourceSkipped):
+            self.get("/stale", allow=lambda: False)
+        self.assertEqual(self.server.hits, ["/fresh"])
+
+    def test_freshness(self):
+        now = time.time()
+        meta = {
+            "url": "u", "status": 200, "body": "", "size": 0,
+            "request_time": now - 100, "response_time": now - 100,
+            "headers": {"Cache-Control": "max-age=300", "Age": "250"},
+        }
+        self.assertFalse(CacheEntry(meta, "").is_fresh(now))
+        meta["headers"] = {"Cache-Control": "max-age=300"}
+        self.assertTrue(CacheEntry(meta, "").is_fresh(now))
+        meta["headers"] = {"Expires": "0"}
+        self.assertFalse(CacheEntry(meta, "").is_fresh(now))
+
+    def entry_path(self, path):
+        return self.cache._entry_path(self.url + path)
+
+    def test_eviction(self):
+        self.cache.max_size = len(Handler.body)
+        self.get("/fresh")
+        os.utime(self.entry_path("/fresh"), (1, 1))
+        Handler.body, body = b'{"gmt": []}', Handler.body
+        try:
+            self.get("/fresh?2")
+        finally:
+            Handler.body = body
+        self.assertIsNone(self.cache.lookup(self.url + "/fresh"))
+        self.assertIsNotNone(self.cache.lookup(self.url + "/fresh?2"))
+
+    def test_eviction_keeps_stored_entry(self):
+        self.cache.max_size = len(Handler.body)
+        self.get("/fresh")
+        # the entry already there looks more recent than the one stored next
+        future = time.time() + 3600
+        os.utime(self.entry_path("/fresh"), (future, future))
+        Handler.body, body = b'{"gmt": []}', Handler.body
+        try:
+            self.assertEqual(self.get("/fresh?2"), b'{"gmt": []}')
+        finally:
+            Handler.body = body
+        self.assertIsNone(self.cache.lookup(self.url + "/fresh"))
+        self.assertIsNotNone(self.cache.lookup(self.url + "/fresh?2"))
+
+    def test_oversized_body_passes_through(self):
+        self.cache.max_size = len(Handler.body) - 1
+        for path in ("/fresh", "/fresh-unsized"):
+            with self.subTest(path=path):
+                self.assertEqual(self.get(path), Handler.body)
+                self.assertIsNone(self.cache.lookup(self.url + path))
+        objects = os.path.join(self.cache.path, "objects")
+        self.assertEqual(
+            [name for _, _, names in os.walk(objects) for name in names], []
+        )
+
+if __name__ == "__main__":
+    unittest.main()
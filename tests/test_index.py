@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+
+from .context import *
+from decronym.index import SortedTable, PrefixIndex, write_table, pack_results, unpack_results
+
+import os
+import tempfile
+
+import unittest
+class IndexTestSuite(unittest.TestCase):
+    """Tests the sorted table and packed result records """
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "index.bin")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_sorted_lookup(self):
+        items = [(k.encode(), k.upper().encode()) for k in ("gmt", "dma", "cet", "dmac")]
+        write_table(self.path, items, meta={"sources": ["a"]})
+
+        table = SortedTable(self.path)
+        self.assertEqual(len(table), 4)
+        self.assertEqual(table.meta, {"sources": ["a"]})
+        self.assertEqual(table.get(b"dma"), b"DMA")
+        self.assertEqual(table.get(b"gmt"), b"GMT")
+        self.assertIsNone(table.get(b"abc"))
+        self.assertIsNone(table.get(b"zzz"))
+        self.assertEqual([table.key(i) for i in table.prefixed(b"dm")], [b"dma", b"dmac"])
+        table.close()
+
+    def test_empty_table(self):
+        write_table(self.path, [])
+        table = SortedTable(self.path)
+        self.assertEqual(len(table), 0)
+        self.assertIsNone(table.get(b"dma"))
+        table.close()
+
+    def test_pack_results(self):
+        results = [
+            (0, Result("DMA", "Direct Memory Access", source="a", tags=["computing", "hw"])),
+            (3, Result("DMA", "Digital Media Arts", comment="Ünïcode")),
+        ]
+        unpacked = unpack_results(pack_results(results))
+        self.assertEqual(unpacked, results)
+        self.assertEqual(unpacked[0][1].tags, ["computing", "hw"])
+        self.assertEqual(unpacked[0][1].source, "a")
+        self.assertEqual(unpacked[1][1].tags, [])
+
+    def test_prefix_index(self):
+        class FakeLookup(object):
+            def __init__(self, uid, cache, keys):
+                self.id, self.cache, self.keys = uid, cache, keys
+
+            def uid(self):
+                return self.id
+
+            def cache_fingerprint(self):
+                return [0, 0]
+
+            def source_fingerprint(self):
+                return None
+
+            def load_cache(self):
+                return self.cache
+
+            def known_keys(self):
+                return self.keys
+
+            def local_results(self):
+                return [Result("GHz", "Gigahertz")]
+
+        luts = [
+            FakeLookup("a", {"dma": [Result("DMA", "Direct Memory Access")]}, ["dma", "dmac"]),
+            FakeLookup("b", {}, None),
+        ]
+        index = PrefixIndex(self.path)
+        self.assertFalse(index.covers(luts))
+        index.build(luts)
+        self.assertTrue(index.covers(luts))
+        self.assertTrue(index.is_fresh(luts))
+        self.assertEqual(index.complete("DM"), ["DMA", "dmac"])
+        self.assertEqual(index.complete("dm", limit=1), ["DMA"])
+        self.assertEqual(index.complete("gh"), ["GHz"])
+        self.assertEqual(index.complete("x"), [])
+        self.assertFalse(index.covers(luts[:1]))
+        index.close()
+
+if __name__ == "__main__":
+    unittest.main()
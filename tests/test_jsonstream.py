@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+
+from .context import *
+from decronym import jsonstream
+from decronym.jsonstream import iter_json_items
+
+import json
+from unittest import mock
+
+import unittest
+class JsonStreamTestSuite(unittest.TestCase):
+    """Tests the incremental JSON object reader """
+
+    doc = {
+        "dma": [{"acronym": "DMA", "full": "Direct Memory Access", "tags": ["hw"]}],
+        "n": 12345,
+        "t": True,
+        "nested": {"a": [1, 2, {"b": None}]},
+        "utf": "zażółć gęślą jaźń",
+        "f": -1.5e3,
+        "tricky": ["}]\\\"{", "a\\\\", {"[": "{"}],
+    }
+
+    def chunked(self, text, size):
+        return [text[i : i + size] for i in range(0, len(text), size)]
+
+    def test_matches_json_load(self):
+        for indent in (None, 4):
+            text = json.dumps(self.doc, indent=indent, ensure_ascii=False)
+            for size in (1, 2, 7, 1 << 16):
+                with self.subTest(indent=indent, size=size):
+                    items = list(iter_json_items(self.chunked(text, size)))
+                    self.assertEqual(dict(items), self.doc)
+
+    def test_byte_chunks(self):
+        raw = json.dumps(self.doc, ensure_ascii=False).encode()
+        # single byte chunks split multi byte characters
+        items = list(iter_json_items(self.chunked(raw, 1)))
+        self.assertEqual(dict(items), self.doc)
+
+    def test_empty_object(self):
+        self.assertEqual(list(iter_json_items([" { } "])), [])
+
+    def test_number_at_chunk_boundary(self):
+        items = list(iter_json_items(['{"a": 12', '34}']))
+        self.assertEqual(items, [("a", 1234)])
+
+    def test_large_member_decoded_once(self):
+        value = [{"acronym": f"A{i}", "full": "x" * 50} for i in range(2000)]
+        text = json.dumps({"big": value, "n": 1})
+        decoder = mock.Mock(wraps=jsonstream._decoder)
+        with mock.patch.object(jsonstream, "_decoder", decoder):
+            items = list(iter_json_items(self.chunked(text, 256)))
+        self.assertEqual(items, [("big", value), ("n", 1)])
+        # key, first attempt and the final decode of "big", then "n" and 1
+        self.assertLessEqual(decoder.raw_decode.call_count, 6)
+
+    def test_lazy(self):
+        def chunks():
+            yield '{"a": 1, '
+            yield '"b": 2}'
+            raise AssertionError("read past the end")
+
+        stream = iter_json_items(chunks())
+        self.assertEqual(next(stream), ("a", 1))
+
+    def test_bad_json(self):
+        for text in ('{"a": 1', '{"a" 1}', '[1, 2]', '{"a": 1,}', ''):
+            with self.subTest(text=text):
+                with self.assertRaises(json.JSONDecodeError):
+                    list(iter_json_items(self.chunked(text, 3)))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,384 @@
+# -*- coding: utf-8 -*-
+
+from .context import *
+from decronym.config import Config
+from decronym.lookup import LookupAggregate, LookupFactory
+from decronym.lookup.base import Lookup
+from decronym.index import CompiledIndex, PrefixIndex
+from decronym.search import SearchIndex
+from decronym.lookup.planner import LatencyStats
+from decronym.breaker import CircuitBreaker
+from decronym.fetch import SourceSkipped
+
+import contextlib
+import io
+import json
+import os
+import pickle
+import tempfile
+import time
+from unittest import mock
+
+import unittest
+
+
+class DictLookup(Lookup):
+    """Answers from a dict, logs every key it is asked for to a file so
+    calls made in pool workers can be counted."""
+
+    def __init__(self, source, entries, tmp, extra=None, config=None):
+        super().__init__(source, extra=extra, config=config)
+        self.entries = entries
+        self.tmp = tmp
+
+    def validate(self):
+        self.valid = True
+
+    def cache_path(self):
+        return os.path.join(self.tmp, f"{self.uid()}.json")
+
+    def bloom_path(self):
+        return os.path.join(self.tmp, f"{self.uid()}.bloom")
+
+    def calls_path(self):
+        return os.path.join(self.tmp, f"{self.uid()}.calls")
+
+    def calls(self):
+        try:
+            with open(self.calls_path()) as f:
+                return f.read().split()
+        except OSError:
+            return []
+
+    def find_tagged(self, key, tags=None):
+        with open(self.calls_path(), "a") as f:
+            f.write(f"{key}\n")
+        return super().find_tagged(key, tags)
+
+    def find_similar(self, key):
+        with open(self.calls_path() + ".similar", "a") as f:
+            f.write(f"{key}\n")
+        return super().find_similar(key)
+
+    def find_direct(self, key):
+        # Stands in for a network fetch, see fetch.get.
+        if not self.allow_network():
+            raise SourceSkipped(f"{self.source}: skipped")
+        time.sleep(self.extra.get("delay", 0))
+        return list(self.entries.get(key.casefold(), []))
+
+
+def aggregate(luts, tmp, **kwargs):
+    """LookupAggregate keeping all of its state under tmp."""
+    return LookupAggregate(
+        luts,
+        index=CompiledIndex(os.path.join(tmp, "index.bin")),
+        keys=PrefixIndex(os.path.join(tmp, "keys.bin")),
+        search=SearchIndex(os.path.join(tmp, "search.bin")),
+        stats=LatencyStats(os.path.join(tmp, "latency.json")),
+        breaker=CircuitBreaker(os.path.join(tmp, "breaker.json")),
+        **kwargs,
+    )
+
+
+class LookupAggregateTestSuite(unittest.TestCase):
+    """Tests querying sources through LookupAggregate """
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dma = Result("DMA", "Direct Memory Access", source="a")
+        self.gmt = Result("GMT", "Greenwich Mean Time", source="a")
+        self.a = DictLookup("a", {"dma": [self.dma], "gmt": [self.gmt]}, self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_compiled_index_staleness(self):
+        self.a.cache.add([self.dma])
+        self.a.cache.save()
+        index = CompiledIndex(os.path.join(self.tmp.name, "index.bin"))
+        self.assertFalse(index.is_fresh([self.a]))
+        self.assertEqual(index.fresh_sources([self.a]), set())
+
+        index.compile([self.a])
+        self.assertTrue(index.is_fresh([self.a]))
+        self.assertEqual(index.fresh_sources([self.a]), {self.a.uid()})
+        self.assertEqual(index.find("DMA"), {self.a.uid(): [self.dma]})
+
+        # another source being added only makes that one stale
+        b = DictLookup("b", {}, self.tmp.name)
+        self.assertFalse(index.is_fresh([self.a, b]))
+        self.assertEqual(index.fresh_sources([self.a, b]), {self.a.uid()})
+
+        self.a.cache.add([self.gmt])
+        self.a.cache.save()
+        self.assertFalse(index.is_fresh([self.a]))
+        self.assertEqual(index.fresh_sources([self.a]), set())
+        index.close()
+
+    def test_find_answers_from_index(self):
+        lookups = aggregate([self.a], self.tmp.name)
+        lookups.request(["dma"])
+        self.assertEqual(lookups.matches["dma"], [self.dma])
+        self.assertEqual(self.a.calls(), ["dma"])
+        # finds do not compile the index
+        self.assertFalse(os.path.exists(lookups.index.path))
+
+        lookups.compile()
+        lookups = aggregate([self.a], self.tmp.name)
+        lookups.request(["dma", "gmt"])
+        self.assertEqual(lookups.matches["dma"], [self.dma])
+        self.assertEqual(lookups.matches["gmt"], [self.gmt])
+        # only the key missing from the index reached the source
+        self.assertEqual(self.a.calls(), ["dma", "gmt"])
+
+    def test_compile_refreshes_search_index(self):
+        self.a.cache.add([self.dma])
+        self.a.cache.save()
+        lookups = aggregate([self.a], self.tmp.name)
+        lookups.compile()
+        self.assertEqual(lookups.search.search("memory")[0][1], self.dma)
+
+        # finds leave it alone, the next compile picks their results up
+        lookups.request(["gmt"])
+        self.assertEqual(lookups.search.search("greenwich"), [])
+        self.assertTrue(lookups.search.covers([self.a]))
+        lookups.compile()
+        self.assertEqual(lookups.search.search("greenwich")[0][1], self.gmt)
+        lookups.search.close()
+
+    def test_miss_then_hit_from_index(self):
+        self.a.cache.add([self.dma])
+        self.a.cache.save()
+        aggregate([self.a], self.tmp.name).compile()
+
+        lookups = aggregate([self.a], self.tmp.name)
+        with mock.patch.object(CompiledIndex, "compile") as compile:
+            lookups.request(["gmt"])
+        compile.assert_not_called()
+        self.assertEqual(self.a.calls(), ["gmt"])
+        # the journal lines the miss added were merged into the index
+        self.assertTrue(lookups.index.is_fresh([self.a]))
+        self.assertEqual(lookups.index.find("GMT"), {self.a.uid(): [self.gmt]})
+        self.assertEqual(lookups.index.find("DMA"), {self.a.uid(): [self.dma]})
+
+        lookups = aggregate([self.a], self.tmp.name)
+        lookups.request(["gmt"])
+        self.assertEqual(lookups.matches["gmt"], [self.gmt])
+        self.assertEqual(self.a.calls(), ["gmt"])
+
+        # a rewritten cache rebuilds the index
+        cache = self.a.load_cache()
+        cache.add([Result("UTC", "Coordinated Universal Time", source="a")])
+        cache.compact()
+        lookups.index.update([self.a])
+        self.assertTrue(lookups.index.is_fresh([self.a]))
+        self.assertEqual(len(lookups.index.find("UTC")[self.a.uid()]), 1)
+        lookups.index.close()
+
+    def test_first_stops_at_cheapest_tier(self):
+        b = DictLookup("b", {"dma": [Result("DMA", "Digital Media Arts")]},
+                       self.tmp.name, extra={"tier": "remote"})
+        self.a.extra["tier"] = "memory"
+        lookups = aggregate([b, self.a], self.tmp.name)
+        lookups.request(["dma", "xyz"], first=True)
+        self.assertEqual(lookups.matches["dma"], [self.dma])
+        self.assertEqual(sorted(self.a.calls()), ["dma", "xyz"])
+        # only the key the cheap tier did not answer goes to the next tier
+        self.assertEqual(b.calls(), ["xyz"])
+
+    def test_first_keeps_fetched_results(self):
+        slow = DictLookup("slow", {}, self.tmp.name, extra={"delay": 5})
+        lookups = aggregate([self.a, slow], self.tmp.name)
+        start = time.time()
+        lookups.request(["dma"], first=True)
+        self.assertLess(time.time() - start, 4)
+        self.assertEqual(lookups.matches["dma"], [self.dma])
+        # the source was stopped, what it fetched was saved before
+        self.assertIn("dma", self.a.load_cache())
+
+    def test_cache_hits_do_not_count_as_latency(self):
+        lookups = aggregate([self.a], self.tmp.name)
+        lookups.request(["dma"])
+        measured = lookups.stats.get(self.a.uid())
+        self.assertIsNotNone(measured)
+
+        lookups = aggregate([self.a], self.tmp.name)
+        lookups.request(["dma"])
+        self.assertEqual(lookups.stats.get(self.a.uid()), measured)
+
+    def test_suggestions_only_for_overall_misses(self):
+        b = DictLookup("b", {}, self.tmp.name)
+        b.cache.add([Result("DMX", "Digital Multiplex")])
+        b.cache.save()
+        # b's filter rules "dma" out, it is skipped rather than asked
+        b.save_membership(["dmx", "dmz"])
+        lookups = aggregate([self.a, b], self.tmp.name)
+        lookups.request(["dma", "dmz"])
+        self.assertEqual(b.calls(), ["dmz"])
+        self.assertEqual(lookups.skipped["dma"], [b])
+        self.assertFalse(os.path.exists(b.calls_path() + ".similar"))
+
+        # answered by a, nothing to suggest
+        self.assertEqual(lookups.suggestions("dma"), [])
+        stderr = io.StringIO()
+        with contextlib.redirect_stderr(stderr), contextlib.redirect_stdout(io.StringIO()):
+            lookups.show("dmz")
+        self.assertIn("No entires for 'dmz' found!", stderr.getvalue())
+        self.assertIn("Suggested: ", stderr.getvalue())
+        # asked once per source, not once per source and miss
+        self.assertEqual(sorted(lookups.suggestions("dmz")), ["dma", "dmx"])
+        with open(b.calls_path() + ".similar") as f:
+            self.assertEqual(f.read().split(), ["dmz"])
+
+    def test_deadline_reports_timed_out_sources(self):
+        slow = DictLookup("slow", {"dma": [Result("DMA", "Dynamic Mechanical Analysis")]},
+                          self.tmp.name, extra={"delay": 5})
+        lookups = aggregate([self.a, slow], self.tmp.name)
+        start = time.time()
+        lookups.request(["dma"], deadline=start + 0.5)
+        self.assertLess(time.time() - start, 4)
+        self.assertEqual(lookups.matches["dma"], [self.dma])
+        self.assertEqual(lookups.timed_out["dma"], [slow])
+
+        stderr = io.StringIO()
+        with contextlib.redirect_stderr(stderr), contextlib.redirect_stdout(io.StringIO()):
+            lookups.show("dma")
+        self.assertIn("Timed out: slow", stderr.getvalue())
+
+        # past the deadline nothing is submitted at all
+        lookups = aggregate([self.a], self.tmp.name)
+        lookups.request(["gmt"], deadline=time.time() - 1)
+        self.assertEqual(lookups.timed_out["gmt"], [self.a])
+        self.assertNotIn("gmt", self.a.calls())
+
+    def test_cache_hit_does_not_close_breaker(self):
+        self.a.cache.add([self.dma])
+        self.a.cache.save()
+        lookups = aggregate([self.a], self.tmp.name)
+        for _ in range(3):
+            lookups.breaker.record_failure(self.a.uid())
+        lookups.breaker.state[self.a.uid()]["opened"] = 0
+        self.assertTrue(lookups.breaker.is_open(self.a.uid()))
+
+        # the half open probe is answered from the cache
+        lookups.request(["dma"])
+        self.assertEqual(lookups.matches["dma"], [self.dma])
+        self.assertTrue(lookups.breaker.is_open(self.a.uid()))
+
+    def test_open_breaker_still_answers_from_cache(self):
+        self.a.cache.add([self.dma])
+        self.a.cache.save()
+        lookups = aggregate([self.a], self.tmp.name)
+        for _ in range(3):
+            lookups.breaker.record_failure(self.a.uid())
+
+        lookups.request(["dma", "gmt"])
+        self.assertEqual(lookups.matches["dma"], [self.dma])
+        self.assertEqual(lookups.unavailable["dma"], [])
+        # only the key which needed the source itself is skipped
+        self.assertEqual(lookups.matches["gmt"], [])
+        self.assertEqual(lookups.unavailable["gmt"], [self.a])
+        self.assertEqual(lookups.breaker.state[self.a.uid()]["failures"], 3)
+
+    def test_ranked_with_and_without_limit(self):
+        dma = Result("DMA", "Dynamic Mechanical Analysis", source="a")
+        self.a.entries["dma"].append(dma)
+        lookups = aggregate([self.a], self.tmp.name)
+        lookups.request(["dma"])
+        self.assertEqual(lookups.ranked("dma"), [self.dma, dma])
+
+        lookups = aggregate([self.a], self.tmp.name)
+        lookups.request(["gmt"], limit=1)
+        self.assertEqual(lookups.ranked("gmt"), [self.gmt])
+        lookups.request(["dma"], limit=1)
+        self.assertEqual(lookups.ranked("dma"), [self.dma])
+        # the source still cached every result, only the output is cut
+        self.assertEqual(self.a.load_cache()["dma"], [self.dma, dma])
+
+    def test_unordered_emits_keys_as_they_complete(self):
+        # gmt is answered from the index, dma has to be asked for
+        self.a.cache.add([self.gmt])
+        self.a.cache.save()
+        aggregate([self.a], self.tmp.name).compile()
+
+        done = []
+        lookups = aggregate([self.a], self.tmp.name)
+        lookups.request(["dma", "gmt"], on_done=done.append, ordered=False)
+        self.assertEqual(done, ["gmt", "dma"])
+
+    def test_ordered_releases_keys_in_request_order(self):
+        self.a.cache.add([self.gmt])
+        self.a.cache.save()
+        aggregate([self.a], self.tmp.name).compile()
+
+        done = []
+        lookups = aggregate([self.a], self.tmp.name)
+        # gmt is complete first but waits for dma
+        lookups.request(
+            ["dma", "gmt"], on_done=lambda key: done.append((key, sorted(lookups.complete)))
+        )
+        self.assertEqual(done, [("dma", ["dma", "gmt"]), ("gmt", ["dma", "gmt"])])
+        self.assertEqual(lookups.matches["gmt"], [self.gmt])
+
+    def test_dropped_and_timed_out_keys_resolve(self):
+        slow = DictLookup("slow", {}, self.tmp.name, extra={"delay": 5})
+        done = []
+        lookups = aggregate([self.a, slow], self.tmp.name)
+        lookups.request(["dma"], first=True, on_done=done.append)
+        self.assertEqual(done, ["dma"])
+
+        done = []
+        lookups = aggregate([slow], self.tmp.name)
+        lookups.request(["gmt", "xyz"], deadline=time.time() + 0.5, on_done=done.append)
+        self.assertEqual(done, ["gmt", "xyz"])
+        self.assertEqual(lookups.timed_out["gmt"], [slow])
+
+        # sources skipped by the breaker resolve their keys too
+        done = []
+        lookups = aggregate([slow], self.tmp.name)
+        for _ in range(3):
+            lookups.breaker.record_failure(slow.uid())
+        lookups.request(["dma"], on_done=done.append)
+        self.assertEqual(done, ["dma"])
+        self.assertEqual(lookups.unavailable["dma"], [slow])
+
+class LookupTestSuite(unittest.TestCase):
+    """Tests creating lookups and loading their caches """
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_cache_loaded_lazily(self):
+        lut = DictLookup("a", {}, self.tmp.name)
+        self.assertIsNone(lut._cache)
+        lut.cache.add([Result("DMA", "Direct Memory Access")])
+        lut.cache.save()
+
+        # sent to workers without the cache
+        copy = pickle.loads(pickle.dumps(lut))
+        self.assertIsNone(copy._cache)
+        self.assertIn("dma", copy.cache)
+
+        # tasks of one worker share a single copy
+        first = pickle.loads(pickle.dumps(lut))
+        second = pickle.loads(pickle.dumps(lut))
+        first.use_worker_cache()
+        second.use_worker_cache()
+        self.assertIs(first.cache, second.cache)
+        self.assertIn("dma", first.cache)
+
+    def test_from_config_skips_disabled_sources(self):
+        path = os.path.join(self.tmp.name, "config.json")
+        with open(path, "w") as f:
+            json.dump({"sources": [
+                {"type": "json_file", "source": "/on.json", "enabled": True},
+                {"type": "json_file", "source": "/off.json", "enabled": False},
+            ]}, f)
+        luts = LookupFactory.from_config(Config(path))
+        self.assertEqual([lut.source for lut in luts], ["/on.json"])
+        self.assertIsNone(luts[0]._cache)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+
+from .context import *
+from .test_lookup import aggregate
+from decronym.config import Config
+from decronym.lookup.base import Lookup
+
+import contextlib
+import http.server
+import io
+import json
+import os
+import tempfile
+import threading
+from unittest import mock
+
+import unittest
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = self.path.strip("/").upper().encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class UrlLookup(Lookup):
+    """Answers every key with the body served for it."""
+
+    def validate(self):
+        self.valid = True
+
+    def find_direct(self, key):
+        r = self.get(f"{self.source}{key}")
+        return [Result(key.upper(), r.text, source=self.source)]
+
+
+class OfflineTestSuite(unittest.TestCase):
+    """Tests answering from caches only with --offline """
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        env = mock.patch.dict(os.environ, {"HOME": self.tmp.name})
+        env.start()
+        self.addCleanup(env.stop)
+
+        self.path = os.path.join(self.tmp.name, "config.json")
+        with open(self.path, "w") as f:
+            json.dump({"sources": [], "offline": False}, f)
+
+        self.server = http.server.HTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}/"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmp.cleanup()
+
+    def config(self, offline):
+        config = Config(self.path)
+        if offline:
+            config.set_override("offline", True)
+        return config
+
+    def test_override(self):
+        config = self.config(offline=True)
+        self.assertTrue(config.get_option("offline"))
+        self.assertTrue(UrlLookup(self.url, config=config).offline)
+        self.assertFalse(UrlLookup(self.url, config=self.config(offline=False)).offline)
+
+        # overrides are never saved
+        config.save()
+        with open(self.path) as f:
+            self.assertFalse(json.load(f)["offline"])
+
+    def test_uncached_sources_reported(self):
+        lut = UrlLookup(self.url, config=self.config(offline=True))
+        lookups = aggregate([lut], self.tmp.name)
+        lookups.request(["dma"])
+        self.assertEqual(lookups.matches["dma"], [])
+        self.assertEqual(lookups.uncached["dma"], [lut])
+
+        stderr = io.StringIO()
+        with contextlib.redirect_stderr(stderr), contextlib.redirect_stdout(io.StringIO()):
+            lookups.show("dma")
+        self.assertIn(f"Not cached (offline): {self.url}", stderr.getvalue())
+
+    def test_stale_copy_served_offline(self):
+        online = UrlLookup(self.url, config=self.config(offline=False))
+        self.assertEqual(online.find_direct("dma")[0].full, "DMA")
+
+        # the response must be revalidated online, offline it is used as is
+        offline = UrlLookup(self.url, config=self.config(offline=True))
+        self.server.shutdown()
+        self.assertEqual(offline.find_direct("dma")[0].full, "DMA")
+        self.assertTrue(offline.stale)
+
+        # and is reported as such
+        lookups = aggregate([offline], self.tmp.name)
+        lookups.request(["dma"])
+        self.assertEqual(lookups.matches["dma"][0].full, "DMA")
+        self.assertEqual(lookups.stale["dma"], [offline])
+        self.assertEqual(lookups.uncached["dma"], [])
+
+        stderr = io.StringIO()
+        with contextlib.redirect_stderr(stderr), contextlib.redirect_stdout(io.StringIO()):
+            lookups.show("dma")
+        self.assertIn(f"Stale (offline): {self.url}", stderr.getvalue())
+
+if __name__ == "__main__":
+    unittest.main()
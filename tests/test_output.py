@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+
+from .context import *
+from decronym.output import get_formatter
+
+import io
+import json
+
+import unittest
+
+
+class OutputTestSuite(unittest.TestCase):
+    """Tests the find output formats """
+    results = [
+        Result("DMA", "Direct Memory Access", comment="tab\there", tags=["hw", "x"]),
+        Result("DMA", "Digital Media Arts", source="s"),
+    ]
+
+    def render(self, name, keys):
+        stream = io.StringIO()
+        formatter = get_formatter(name, stream)
+        for key, results in keys:
+            formatter.write(key, results)
+        formatter.close()
+        return stream.getvalue()
+
+    def test_json(self):
+        text = self.render("json", [("dma", self.results), ("xyz", [])])
+        data = json.loads(text)
+        self.assertEqual(list(data), ["dma", "xyz"])
+        self.assertEqual(data["dma"][0]["tags"], ["hw", "x"])
+        self.assertEqual(data["xyz"], [])
+        self.assertEqual(json.loads(self.render("json", [])), {})
+
+    def test_ndjson(self):
+        lines = self.render("ndjson", [("dma", self.results), ("xyz", [])]).splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(json.loads(lines[1])["query"], "dma")
+        self.assertEqual(json.loads(lines[1])["source"], "s")
+
+    def test_tsv(self):
+        lines = self.render("tsv", [("dma", self.results)]).splitlines()
+        self.assertEqual(lines[0].split("\t"), ["dma", "DMA", "Direct Memory Access", "tab here", "", "hw,x"])
+        self.assertNotIn("\x1b", "".join(lines))
+
+if __name__ == "__main__":
+    unittest.main()
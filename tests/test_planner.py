@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+
+from .context import *
+from decronym.lookup.base import Lookup
+from decronym.lookup.type import CostTier
+from decronym.lookup.planner import QueryPlanner, LatencyStats
+
+import json
+import os
+import tempfile
+
+import unittest
+
+
+class TierLookup(Lookup):
+    def __init__(self, source, extra=None, tags=None):
+        super().__init__(source, extra=extra)
+        if tags is not None:
+            self.static_tags = frozenset(tags)
+
+
+class PlannerTestSuite(unittest.TestCase):
+    """Tests latency tracking and planning queries by cost tier """
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "latency.json")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_latency_moving_average(self):
+        stats = LatencyStats(self.path)
+        self.assertIsNone(stats.get("a"))
+        stats.record("a", 1.0)
+        self.assertEqual(stats.get("a"), 1.0)
+        stats.record("a", 0.0)
+        self.assertAlmostEqual(stats.get("a"), 0.7)
+
+        # samples of other processes are kept on save
+        with open(self.path, "w") as f:
+            json.dump({"b": 0.5}, f)
+        stats.save()
+        self.assertFalse(stats.changed)
+        reloaded = LatencyStats(self.path)
+        self.assertAlmostEqual(reloaded.get("a"), 0.7)
+        self.assertEqual(reloaded.get("b"), 0.5)
+
+    def test_tier(self):
+        stats = LatencyStats(self.path)
+        planner = QueryPlanner(stats)
+        measured = TierLookup("measured")
+        stats.record(measured.uid(), 0.0001)
+
+        self.assertEqual(planner.tier(TierLookup("default")), CostTier.REMOTE)
+        self.assertEqual(planner.tier(measured), CostTier.MEMORY)
+        self.assertEqual(planner.tier(TierLookup("c", {"tier": "local_dir"})), CostTier.LOCAL_DIR)
+        self.assertEqual(planner.tier(TierLookup("c", {"tier": 1})), CostTier.LOCAL_FILE)
+
+        # an unknown tier falls back to the measured one
+        measured.extra["tier"] = "cheap"
+        self.assertEqual(planner.tier(measured), CostTier.MEMORY)
+
+    def test_plan_orders_tiers(self):
+        planner = QueryPlanner(LatencyStats(self.path))
+        remote = TierLookup("remote")
+        memory = TierLookup("memory", {"tier": "memory"})
+        local = TierLookup("local", {"tier": "local_file"}, tags=["timezone"])
+        tasks = [(0, remote, "dma"), (1, memory, "dma"), (2, local, "dma")]
+
+        tiers = planner.plan(tasks)
+        self.assertEqual([[t[0] for t in tier] for tier in tiers], [[1], [2], [0]])
+
+        # sources declaring other tags are not queried
+        tiers = planner.plan(tasks, tags=["computing"])
+        self.assertEqual([[t[0] for t in tier] for tier in tiers], [[1], [0]])
+
+if __name__ == "__main__":
+    unittest.main()
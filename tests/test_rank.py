@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+
+from .context import *
+from decronym.rank import top_k, merge_sources
+
+import unittest
+
+
+class RankTestSuite(unittest.TestCase):
+    """Tests top k ranking of results """
+    def setUp(self):
+        self.results = [
+            Result("DMA", "Direct Memory Access", tags=["computing"]),
+            Result("DMA", "Digital Media Arts", tags=["art"]),
+            Result("DMA", "Dimethylamine", tags=["chemistry"]),
+        ]
+
+    def test_keeps_order_without_scores(self):
+        self.assertEqual(top_k(self.results, 2), self.results[:2])
+        self.assertEqual(top_k(self.results, 10), self.results)
+
+    def test_tags_and_priority(self):
+        a, b, c = self.results
+        self.assertEqual(top_k(self.results, 1, tags=["chemistry"]), [c])
+        priority = {a: 0, b: 5, c: 1}
+        self.assertEqual(top_k(self.results, 2, priority=priority.get), [b, c])
+
+    def test_merge_sources(self):
+        a, b, c = self.results
+        local = [Result("DMA", "Direct Memory Access", source="local", tags=["hw"]), c]
+        remote = [b, Result("DMA", "Direct Memory Access", source="remote", tags=["computing"])]
+        merged, origin = merge_sources([(1, local), (0, remote)])
+        self.assertEqual(merged, [a, c, b])
+        self.assertEqual(merged[0].source, "local, remote")
+        self.assertEqual(merged[0].tags, ["hw", "computing"])
+        self.assertEqual(origin, {a: 1, b: 0, c: 1})
+        # inputs are left untouched
+        self.assertEqual(local[0].source, "local")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -45,5 +45,41 @@ class ResultTestSuite(unittest.TestCase):
             with self.subTest(i=i):
                 self.assertIsInstance(item, Result)
 
+class CompactResultTestSuite(unittest.TestCase):
+    """Tests the slotted Result representation """
+    def setUp(self):
+        self.result = Result("DMA", "Direct Memory Access", "c", "src", ["hw", "computing"])
+
+    def test_round_trip(self):
+        compact = self.result.compact()
+        back = compact.to_result()
+        self.assertEqual(back, self.result)
+        self.assertEqual(back.tags, self.result.tags)
+        self.assertEqual(back.source, self.result.source)
+
+    def test_dedupes_with_result(self):
+        compact = self.result.compact()
+        self.assertEqual(compact, self.result)
+        self.assertEqual(self.result, compact)
+        self.assertEqual(hash(compact), hash(self.result))
+        self.assertEqual(len({compact, self.result}), 1)
+        self.assertNotEqual(compact, Result("DMA", "Direct Memory Access"))
+
+    def test_immutable_and_shared(self):
+        a = self.result.compact()
+        b = Result("GMT", "Greenwich Mean Time", source="src", tags=["hw", "computing"]).compact()
+        self.assertIs(a.tags, b.tags)
+        self.assertIs(a.source, b.source)
+        self.assertFalse(hasattr(a, "__dict__"))
+        with self.assertRaises(AttributeError):
+            a.full = "x"
+
+    def test_pickle(self):
+        import pickle
+        compact = self.result.compact()
+        loaded = pickle.loads(pickle.dumps(compact))
+        self.assertEqual(loaded, compact)
+        self.assertEqual(loaded.tags, compact.tags)
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+
+from .context import *
+from decronym.search import SearchIndex, tokenize
+
+import os
+import tempfile
+
+import unittest
+
+
+class FakeLookup(object):
+    def __init__(self, results):
+        self.results = results
+
+    def uid(self):
+        return "fake"
+
+    def cache_fingerprint(self):
+        return [0, 0]
+
+    def source_fingerprint(self):
+        return None
+
+    def load_cache(self):
+        return {}
+
+    def local_results(self):
+        return self.results
+
+
+class SearchTestSuite(unittest.TestCase):
+    """Tests the full text reverse lookup """
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.index = SearchIndex(os.path.join(self.tmp.name, "search.bin"))
+        self.lut = FakeLookup([
+            Result("TZDB", "Time Zone Database", comment="Also known as tz or zoneinfo"),
+            Result("GMT", "Greenwich Mean Time"),
+            Result("DMA", "Direct Memory Access"),
+            Result("DMA", "Direct Memory Access"),
+        ])
+        self.index.build([self.lut])
+
+    def tearDown(self):
+        self.index.close()
+        self.tmp.cleanup()
+
+    def test_tokenize(self):
+        self.assertEqual(tokenize("Time-Zone database_x (TZ)"), ["time", "zone", "database", "x", "tz"])
+
+    def test_ranking(self):
+        hits = self.index.search("what do we call the time zone database")
+        self.assertEqual(hits[0][1].acronym, "TZDB")
+        self.assertEqual(hits[1][1].acronym, "GMT")
+        self.assertGreater(hits[0][0], hits[1][0])
+
+    def test_comment_and_dedupe(self):
+        self.assertEqual([r.acronym for _, r in self.index.search("zoneinfo")], ["TZDB"])
+        self.assertEqual(len(self.index.search("memory")), 1)
+        self.assertEqual(self.index.search("nothing here"), [])
+
+    def test_freshness(self):
+        self.assertTrue(self.index.is_fresh([self.lut]))
+        self.assertFalse(self.index.is_fresh([]))
+
+if __name__ == "__main__":
+    unittest.main()
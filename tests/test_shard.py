@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+
+from .context import *
+from decronym.shard import partition, shard_prefix, write_shards, MANIFEST_NAME
+from decronym.lookup.jsonsharded import LookupShardedRemote
+
+import functools
+import hashlib
+import http.server
+import os
+import tempfile
+import threading
+import time
+
+import unittest
+
+
+class Handler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class ShardTestSuite(unittest.TestCase):
+    """Tests prefix sharded dictionaries """
+    keys = ["a", "ab", "abc", "abd", "b", "ba", "c/d", "dma"]
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.home = os.environ["HOME"]
+        os.environ["HOME"] = self.tmp.name
+
+    def tearDown(self):
+        os.environ["HOME"] = self.home
+        self.tmp.cleanup()
+
+    def test_partition(self):
+        shards = partition(self.keys, 2)
+        self.assertTrue(all(len(keys) <= 2 for keys in shards.values()))
+        self.assertEqual(sorted(k for keys in shards.values() for k in keys), self.keys)
+        for key in self.keys + ["abx", "zz", ""]:
+            prefix = shard_prefix(shards, key)
+            holder = [p for p, keys in shards.items() if key in keys]
+            self.assertEqual([prefix] if holder else [], holder, key)
+        self.assertEqual(partition(self.keys, 100), {"": self.keys})
+
+    def test_write_and_lookup(self):
+        outdir = os.path.join(self.tmp.name, "shards")
+        entries = {
+            key: [{"acronym": key.upper(), "full": f"Full {key}"}] for key in self.keys
+        }
+        manifest = write_shards(entries, outdir, 2)
+        for shard in manifest["shards"].values():
+            with open(os.path.join(outdir, shard["path"]), "rb") as f:
+                self.assertEqual(hashlib.sha256(f.read()).hexdigest(), shard["sha256"])
+
+        server = http.server.HTTPServer(
+            ("127.0.0.1", 0), functools.partial(Handler, directory=outdir)
+        )
+        threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+        try:
+            lut = LookupShardedRemote(
+                f"http://127.0.0.1:{server.server_port}/{MANIFEST_NAME}",
+                extra={"http_cache": False},
+            )
+            lut.valid = True
+            self.assertEqual(lut.find("ABC")[0].full, "Full abc")
+            self.assertEqual(lut.find("c/d")[0].full, "Full c/d")
+            found = lut.find_many(["abd", "dma", "x"])
+            self.assertEqual(found["dma"][0].acronym, "DMA")
+            self.assertEqual(found["x"], [])
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def serve(self, outdir):
+        server = http.server.HTTPServer(
+            ("127.0.0.1", 0), functools.partial(Handler, directory=outdir)
+        )
+        threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return f"http://127.0.0.1:{server.server_port}/{MANIFEST_NAME}"
+
+    def write(self, outdir, full, mtime=None):
+        entries = {key: [{"acronym": key.upper(), "full": f"{full} {key}"}] for key in self.keys}
+        manifest = write_shards(entries, outdir, 2)
+        if mtime is not None:
+            for name in os.listdir(outdir):
+                os.utime(os.path.join(outdir, name), (mtime, mtime))
+        return manifest
+
+    def test_updates_and_bad_copies_through_http_cache(self):
+        outdir = os.path.join(self.tmp.name, "shards")
+        self.write(outdir, "Full")
+        lut = LookupShardedRemote(self.serve(outdir))
+        lut.valid = True
+        self.assertEqual(lut.find_direct("abc")[0].full, "Full abc")
+
+        # the manifest is not kept past what the HTTP cache allows
+        # newer than the copies cached, even within the same second
+        manifest = self.write(outdir, "New", mtime=time.time() + 10)
+        self.assertEqual(lut.find_direct("abc")[0].full, "New abc")
+
+        # a cached shard not matching its hash is dropped and fetched again
+        shard = manifest["shards"][shard_prefix(manifest["shards"], "abc")]
+        cache = lut.http_cache()
+        entry = cache.lookup(lut.shard_url(shard))
+        with open(entry.body_path, "wb") as f:
+            f.write(b'{"abc": []}')
+        self.assertEqual(lut.find_direct("abc")[0].full, "New abc")
+        with open(cache.lookup(lut.shard_url(shard)).body_path, "rb") as f:
+            self.assertEqual(hashlib.sha256(f.read()).hexdigest(), shard["sha256"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+
+from .context import *
+from decronym import throttle
+from decronym.throttle import HostLimiter, retry_after
+from decronym.lookup.base import Lookup
+
+import click
+import multiprocessing as mp
+import time
+
+import unittest
+
+
+def _take(limiter, count):
+    for _ in range(count):
+        limiter.wait()
+
+
+class ThrottleTestSuite(unittest.TestCase):
+    """Tests per host rate limiting """
+
+    def test_retry_after(self):
+        self.assertEqual(retry_after("3"), 3)
+        self.assertIsNone(retry_after(None))
+        self.assertIsNone(retry_after("soon"))
+        self.assertEqual(retry_after("Wed, 21 Oct 2015 07:28:00 GMT"), 0)
+
+    def test_token_bucket(self):
+        limiter = HostLimiter(rate=50, burst=2)
+        start = time.time()
+        _take(limiter, 6)
+        # two from the burst, four more at 50 per second
+        self.assertGreaterEqual(time.time() - start, 0.07)
+
+    def test_shared_between_processes(self):
+        limiter = HostLimiter(rate=50, burst=1)
+        start = time.time()
+        workers = [mp.Process(target=_take, args=(limiter, 3)) for _ in range(2)]
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+        self.assertGreaterEqual(time.time() - start, 0.09)
+
+    def test_back_off_and_deadline(self):
+        limiter = HostLimiter()
+        self.assertTrue(limiter.wait())
+        limiter.back_off(5)
+        self.assertFalse(limiter.wait(deadline=time.time() + 0.05))
+
+    def test_in_flight_cap(self):
+        limiter = HostLimiter(max_in_flight=1)
+        with limiter.slot() as first:
+            self.assertTrue(first)
+            with limiter.slot(deadline=time.time() + 0.05) as second:
+                self.assertFalse(second)
+        with limiter.slot() as again:
+            self.assertTrue(again)
+
+    def test_renew_after_terminate(self):
+        self.addCleanup(throttle._limiters.clear)
+        limiter = HostLimiter(max_in_flight=1)
+        throttle.install({"example.org": limiter})
+        # a worker killed while holding the only slot
+        limiter.slots.acquire()
+        limiter.back_off(3)
+
+        throttle.renew({"example.org": limiter})
+        renewed = throttle.limiter_for("https://example.org/")
+        self.assertIsNot(renewed, limiter)
+        self.assertGreater(renewed.blocked_for(), 2)
+        self.assertTrue(renewed.slots.acquire(timeout=0))
+
+    def test_configure_rejects_bad_limits(self):
+        self.addCleanup(throttle._limiters.clear)
+        for name, value in [
+            ("rate_limit", 0),
+            ("rate_limit", -1.5),
+            ("rate_limit", "10"),
+            ("burst", 0),
+            ("max_in_flight", 2.5),
+            ("max_in_flight", True),
+        ]:
+            with self.subTest(name=name, value=value):
+                lut = Lookup("https://example.org/", extra={name: value})
+                with self.assertRaises(click.UsageError) as e:
+                    throttle.configure([lut])
+                self.assertIn(name, str(e.exception))
+                self.assertIn("https://example.org/", str(e.exception))
+
+        lut = Lookup("https://example.org/", extra={"rate_limit": 0.5, "burst": 2})
+        limiter = throttle.configure([lut])["example.org"]
+        self.assertEqual(limiter.limits, (0.5, 2, None))
+
+if __name__ == "__main__":
+    unittest.main()
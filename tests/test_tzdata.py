@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+
+from .context import *
+from decronym.lookup import tzdata
+from decronym.lookup.tzdata import LookupTzData
+from decronym.lookup.timezone import LookupTimeAndDate
+from decronym.fetch import SourceUnavailable
+
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+import unittest
+
+SYSTEM_TZPATH = "/usr/share/zoneinfo"
+FALLBACK = "https://www.timeanddate.com/time/zones/"
+
+
+class TzDataTestSuite(unittest.TestCase):
+    """Tests the tz database time zone source """
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        env = mock.patch.dict(os.environ, {"HOME": self.tmp.name})
+        env.start()
+        self.addCleanup(env.stop)
+        table = mock.patch.object(tzdata, "tz_abbreviation_table", lambda: {
+            "GMT": ["Greenwich Mean Time"],
+            "BST": ["British Summer Time"],
+            "CET": ["Central European Time"],
+        })
+        table.start()
+        self.addCleanup(table.stop)
+
+        self.tzpath = os.path.join(self.tmp.name, "zoneinfo")
+        os.makedirs(os.path.join(self.tzpath, "Europe"))
+        os.makedirs(os.path.join(self.tzpath, "Asia"))
+        for zone in ("Europe/London", "Asia/Manila"):
+            source = os.path.join(SYSTEM_TZPATH, zone)
+            if os.path.isfile(source):
+                shutil.copy(source, os.path.join(self.tzpath, zone))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    @unittest.skipIf(tzdata.zoneinfo is None, "zoneinfo is not available")
+    @unittest.skipUnless(os.path.isfile(os.path.join(SYSTEM_TZPATH, "Europe/London")),
+                         "no system tz database")
+    def test_build_index(self):
+        lut = LookupTzData(self.tzpath)
+        self.assertTrue(lut.is_valid())
+        index = lut.index()
+        gmt = index["gmt"][0]
+        self.assertEqual((gmt.acronym, gmt.full), ("GMT", "Greenwich Mean Time"))
+        self.assertEqual(gmt.comment, "Used by Europe/London")
+        self.assertEqual(gmt.tags, ["timezone"])
+        # curated names without a zone are kept, zones without a name are not
+        self.assertEqual(index["cet"][0].comment, "")
+        self.assertNotIn("pst", index)
+        self.assertEqual(sorted(lut.known_keys()), ["bst", "cet", "gmt"])
+
+        # stored and reused until the tz database changes
+        self.assertTrue(os.path.isfile(lut.index_path()))
+        with mock.patch.object(tzdata, "tz_abbreviations") as rebuild:
+            self.assertEqual(LookupTzData(self.tzpath).index(), index)
+            rebuild.assert_not_called()
+
+    @unittest.skipIf(tzdata.zoneinfo is None, "zoneinfo is not available")
+    def test_miss_goes_to_fallback(self):
+        lut = LookupTzData(self.tzpath, extra={"fallback": FALLBACK})
+        pht = Result("PHT", "Philippine Time", tags=["timezone"])
+        with mock.patch.object(LookupTimeAndDate, "find_direct_many",
+                               return_value={"pht": [pht]}) as fallback:
+            found = lut.find_direct_many(["GMT", "PHT"])
+        fallback.assert_called_once_with(["pht"])
+        self.assertEqual(found["pht"], [pht])
+        self.assertIsNone(lut.known_keys())
+
+    @unittest.skipIf(tzdata.zoneinfo is None, "zoneinfo is not available")
+    def test_failing_fallback_keeps_indexed_results(self):
+        lut = LookupTzData(self.tzpath, extra={"fallback": FALLBACK})
+        with mock.patch.object(LookupTimeAndDate, "find_direct_many",
+                               side_effect=SourceUnavailable("down")):
+            with contextlib.redirect_stderr(io.StringIO()):
+                found = lut.find_direct_many(["CET", "PHT"])
+            self.assertEqual(found["cet"][0].full, "Central European Time")
+            self.assertEqual(found["pht"], [])
+
+            # with nothing indexed the failure is the answer
+            with self.assertRaises(SourceUnavailable):
+                lut.find_direct_many(["PHT"])
+
+    def test_without_zoneinfo(self):
+        with mock.patch.object(tzdata, "zoneinfo", None):
+            self.assertFalse(LookupTzData("system").is_valid())
+
+            lut = LookupTzData("system", extra={"fallback": FALLBACK})
+            self.assertTrue(lut.is_valid())
+            self.assertEqual(lut.index(), {})
+            gmt = Result("GMT", "Greenwich Mean Time", tags=["timezone"])
+            with mock.patch.object(LookupTimeAndDate, "find_direct_many",
+                                   return_value={"gmt": [gmt]}) as fallback:
+                self.assertEqual(lut.find("GMT"), [gmt])
+            fallback.assert_called_once_with(["gmt"])
+
+if __name__ == "__main__":
+    unittest.main()